@@ -1,9 +1,8 @@
 # g_sheets/api.py
 import logging
 import gspread
-from config import (GOOGLE_SHEET_ID, GOOGLE_SERVICE_ACCOUNT_JSON_PATH,
-                    DOWNTIME_WORKSHEET_NAME, RESPONSIBLE_GROUPS_WORKSHEET_NAME,
-                    USER_ROLES_WORKSHEET_NAME, SHEET_HEADERS, GROUP_NAME_COLUMN,
+from config import (GOOGLE_SERVICE_ACCOUNT_JSON_PATH,
+                    DOWNTIME_WORKSHEET_NAME, SHEET_HEADERS, GROUP_NAME_COLUMN,
                     GROUP_ID_COLUMN, USER_ID_COLUMN, USER_ROLE_COLUMN)
 
 def get_gspread_client():
@@ -17,62 +16,58 @@ def get_gspread_client():
         logging.error(f"Критическая ошибка: Не удалось инициализировать gspread клиент: {e}")
         return None
 
-def get_worksheet(gc: gspread.Client, worksheet_name: str, headers_list: list = None):
-    """Получает или создает лист в Google Таблице."""
-    if not gc:
-        logging.error("gspread клиент не инициализирован.")
-        return None
+def open_or_create_worksheet(spreadsheet: gspread.Spreadsheet, worksheet_name: str, headers_list: list = None):
+    """Открывает лист уже открытой таблицы или создает его (с заголовками, если они заданы)."""
     try:
-        spreadsheet = gc.open_by_key(GOOGLE_SHEET_ID)
-        try:
-            worksheet = spreadsheet.worksheet(worksheet_name)
-        except gspread.exceptions.WorksheetNotFound:
-            logging.info(f"Лист '{worksheet_name}' не найден. Создаю новый...")
-            cols = len(headers_list) + 5 if headers_list else 20
-            rows = "100" if worksheet_name != DOWNTIME_WORKSHEET_NAME else "2000"
-            worksheet = spreadsheet.add_worksheet(title=worksheet_name, rows=rows, cols=cols)
-            if headers_list:
-                worksheet.append_row(headers_list)
-                logging.info(f"Добавлены заголовки {headers_list} в '{worksheet_name}'.")
+        return spreadsheet.worksheet(worksheet_name)
+    except gspread.exceptions.WorksheetNotFound:
+        logging.info(f"Лист '{worksheet_name}' не найден. Создаю новый...")
+        cols = len(headers_list) + 5 if headers_list else 20
+        rows = "100" if worksheet_name != DOWNTIME_WORKSHEET_NAME else "2000"
+        worksheet = spreadsheet.add_worksheet(title=worksheet_name, rows=rows, cols=cols)
+        if headers_list:
+            worksheet.append_row(headers_list)
+            logging.info(f"Добавлены заголовки {headers_list} в '{worksheet_name}'.")
         return worksheet
+
+def next_sequence_number(col_a_values: list) -> int:
+    """Следующий порядковый номер по значениям столбца A (первая строка — заголовок)."""
+    # Фильтруем только числовые значения, пропуская заголовок (первую строку)
+    numeric_values = [int(v) for v in col_a_values[1:] if v and v.isdigit()]
+    # Если чисел нет (только заголовок или пустой лист), начинаем с 1, иначе максимум + 1
+    return max(numeric_values) + 1 if numeric_values else 1
+
+def get_next_sequence_number(worksheet: gspread.Worksheet):
+    """Определяет следующий порядковый номер в столбце A. None при ошибке чтения."""
+    try:
+        return next_sequence_number(worksheet.col_values(1))
     except Exception as e:
-        logging.error(f"Ошибка в get_worksheet для '{worksheet_name}': {e}")
+        logging.error(f"Не удалось определить следующий порядковый номер: {e}")
+        # Номер 1 нельзя подставлять: счетчик засеялся бы им и выдавал номера, которые уже есть в листе
         return None
 
-def get_next_sequence_number(worksheet: gspread.Worksheet) -> int:
-    """Определяет следующий порядковый номер в столбце A."""
+def fetch_sequence_numbers(gs_worksheet: gspread.Worksheet):
+    """Значения столбца A (порядковые номера) листа простоев — для сверки перед повторной записью. None при ошибке."""
+    if not gs_worksheet:
+        return None
     try:
-        # Получаем все значения из первого столбца (A)
-        col_a_values = worksheet.col_values(1)
-        # Фильтруем только числовые значения, пропуская заголовок (первую строку)
-        numeric_values = [int(v) for v in col_a_values[1:] if v and v.isdigit()]
-        
-        if not numeric_values:
-            # Если чисел нет (только заголовок или пустой лист), начинаем с 1
-            return 1
-        else:
-            # Иначе берем максимальное значение и прибавляем 1
-            return max(numeric_values) + 1
-            
+        return {value.strip() for value in gs_worksheet.col_values(1)[1:] if value}
     except Exception as e:
-        logging.error(f"Не удалось определить следующий порядковый номер: {e}")
-        # В случае любой ошибки, чтобы не останавливать работу, возвращаем 1
-        # Можно заменить на более сложную логику, если требуется
-        return 1
+        logging.error(f"Не удалось прочитать порядковые номера с листа '{gs_worksheet.title}': {e}")
+        return None
 
-def append_downtime_record(gs_worksheet: gspread.Worksheet, data_dict: dict):
-    """Добавляет запись о простое в Google Таблицу."""
+def append_downtime_records(gs_worksheet: gspread.Worksheet, records: list):
+    """Добавляет пачку записей о простоях одним запросом append_rows."""
     if not gs_worksheet:
         logging.error("Лист Простои не доступен для записи.")
         return False
     try:
-        # Собираем строку в правильном порядке на основе заголовков из config.py
-        row = [data_dict.get(h, "") for h in SHEET_HEADERS]
-        gs_worksheet.append_row(row, value_input_option='USER_ENTERED')
-        logging.info(f"Данные успешно добавлены в '{gs_worksheet.title}'.")
+        rows = [[data_dict.get(h, "") for h in SHEET_HEADERS] for data_dict in records]
+        gs_worksheet.append_rows(rows, value_input_option='USER_ENTERED')
+        logging.info(f"{len(rows)} записей успешно добавлено в '{gs_worksheet.title}'.")
         return True
     except Exception as e:
-        logging.error(f"Ошибка append_downtime_record: {e}")
+        logging.error(f"Ошибка append_downtime_records: {e}")
         return False
 
 def fetch_all_rows(gs_worksheet: gspread.Worksheet):
@@ -87,46 +82,147 @@ def fetch_all_rows(gs_worksheet: gspread.Worksheet):
         logging.error(f"Непредвиденная ошибка при получении данных с листа '{gs_worksheet.title}': {e}")
     return None
 
-def load_responsible_groups(gc: gspread.Client):
+def fetch_rows_from(gs_worksheet: gspread.Worksheet, start_row: int, num_cols: int):
+    """Получает строки листа начиная с start_row (нумерация как в таблице) для инкрементального обновления кэша."""
+    if not gs_worksheet:
+        return None
+    try:
+        last_col = gspread.utils.rowcol_to_a1(1, max(num_cols, 1)).rstrip("0123456789")
+        return gs_worksheet.get_values(f"A{start_row}:{last_col}")
+    except gspread.exceptions.APIError as e:
+        logging.error(f"Google Sheets API error при получении новых строк: {e}")
+    except Exception as e:
+        logging.error(f"Непредвиденная ошибка при получении новых строк с листа '{gs_worksheet.title}': {e}")
+    return None
+
+def parse_responsible_groups(values: list):
+    """Разбирает значения листа групп: ({ключ кнопки: название}, {название: ID чата})."""
+    header = values[0] if values else []
+    name_idx = header.index(GROUP_NAME_COLUMN) if GROUP_NAME_COLUMN in header else None
+    id_idx = header.index(GROUP_ID_COLUMN) if GROUP_ID_COLUMN in header else None
+    groups_by_name, ids_by_name = {}, {}
+    if name_idx is None:
+        return groups_by_name, ids_by_name
+    for idx, row in enumerate(values[1:]):
+        name_str = row[name_idx].strip() if name_idx < len(row) else ""
+        group_id = row[id_idx].strip() if id_idx is not None and id_idx < len(row) else ""
+        if name_str:
+            groups_by_name[f"grp_idx_{idx}"] = name_str
+            if group_id:
+                try:
+                    ids_by_name[name_str] = int(group_id)
+                except ValueError:
+                    logging.error(f"Некорректный ID '{group_id}' для группы '{name_str}'.")
+    logging.info(f"[GS] Загружено {len(groups_by_name)} ответственных групп.")
+    return groups_by_name, ids_by_name
+
+def load_responsible_groups(groups_ws: gspread.Worksheet):
     """Загружает словарь ответственных групп и их ID."""
-    groups_ws = get_worksheet(gc, RESPONSIBLE_GROUPS_WORKSHEET_NAME, [GROUP_NAME_COLUMN, GROUP_ID_COLUMN])
     if not groups_ws:
         return {}, {}
     try:
-        records = groups_ws.get_all_records()
-        groups_by_name, ids_by_name = {}, {}
-        for idx, record in enumerate(records):
-            name = record.get(GROUP_NAME_COLUMN)
-            group_id = str(record.get(GROUP_ID_COLUMN, "")).strip()
-            if name and str(name).strip():
-                name_str = str(name).strip()
-                groups_by_name[f"grp_idx_{idx}"] = name_str
-                if group_id:
-                    try:
-                        ids_by_name[name_str] = int(group_id)
-                    except ValueError:
-                        logging.error(f"Некорректный ID '{group_id}' для группы '{name_str}'.")
-        logging.info(f"[GS] Загружено {len(groups_by_name)} ответственных групп.")
-        return groups_by_name, ids_by_name
+        return parse_responsible_groups(groups_ws.get_all_values())
     except Exception as e:
         logging.error(f"Ошибка загрузки ответственных групп: {e}")
         return {}, {}
 
-def load_user_roles(gc: gspread.Client):
-    """Загружает словарь ролей пользователей."""
-    roles_ws = get_worksheet(gc, USER_ROLES_WORKSHEET_NAME, [USER_ID_COLUMN, USER_ROLE_COLUMN])
-    if not roles_ws:
-        return {}
+def load_user_roles_indexed(gs_worksheet: gspread.Worksheet):
+    """
+    Загружает роли вместе с номерами строк листа, чтобы менять роль без поиска ячейки.
+    Возвращает то же, что parse_user_roles, или None при ошибке.
+    """
+    if not gs_worksheet:
+        return None
     try:
-        records = roles_ws.get_all_records()
-        roles = {}
-        for record in records:
-            user_id = str(record.get(USER_ID_COLUMN, "")).strip()
-            role = str(record.get(USER_ROLE_COLUMN, "")).strip()
-            if user_id and role:
-                roles[user_id] = role
-        logging.info(f"[GS] Загружено {len(roles)} ролей пользователей.")
-        return roles
+        values = gs_worksheet.get_all_values()
     except Exception as e:
         logging.error(f"Ошибка загрузки ролей: {e}")
-        return {}
\ No newline at end of file
+        return None
+    return parse_user_roles(values)
+
+def parse_user_roles(values: list):
+    """
+    Разбирает значения листа ролей:
+    ({user_id: роль}, {user_id: номер строки}, номер столбца роли, номер столбца ID).
+    """
+    header = values[0] if values else []
+    id_idx = header.index(USER_ID_COLUMN) if USER_ID_COLUMN in header else 0
+    role_idx = header.index(USER_ROLE_COLUMN) if USER_ROLE_COLUMN in header else 1
+    roles, row_by_user = {}, {}
+    for row_number, row in enumerate(values[1:], start=2):
+        user_id = row[id_idx].strip() if id_idx < len(row) else ""
+        role = row[role_idx].strip() if role_idx < len(row) else ""
+        if user_id:
+            row_by_user[user_id] = row_number
+            if role:
+                roles[user_id] = role
+    logging.info(f"[GS] Загружено {len(roles)} ролей пользователей.")
+    return roles, row_by_user, role_idx + 1, id_idx + 1
+
+def fetch_column_cells(gs_worksheet: gspread.Worksheet, rows: list, column: int):
+    """
+    Значения одного столбца в указанных строках одним batchGet: {номер строки: значение}.
+    Нужно, чтобы перед записью по запомненным номерам строк убедиться, что строки не сдвинулись. None при ошибке.
+    """
+    try:
+        ranges = [gspread.utils.rowcol_to_a1(row, column) for row in rows]
+        value_ranges = gs_worksheet.batch_get(ranges)
+        return {row: (value_range[0][0].strip() if value_range and value_range[0] else "")
+                for row, value_range in zip(rows, value_ranges)}
+    except Exception as e:
+        logging.error(f"Ошибка чтения ячеек столбца {column}: {e}")
+        return None
+
+def update_user_role_cells(gs_worksheet: gspread.Worksheet, updates: list, role_column: int):
+    """Меняет роли в известных строках одним batch_update. updates: [(номер строки, роль)]."""
+    try:
+        gs_worksheet.batch_update([{"range": gspread.utils.rowcol_to_a1(row, role_column), "values": [[role]]}
+                                   for row, role in updates])
+        return True
+    except Exception as e:
+        logging.error(f"Ошибка обновления ролей: {e}")
+        return False
+
+def append_user_roles(gs_worksheet: gspread.Worksheet, rows: list):
+    """
+    Добавляет строки [user_id, роль] одним append_rows.
+    Возвращает номер первой добавленной строки (0, если его не удалось определить) или None при ошибке.
+    """
+    try:
+        response = gs_worksheet.append_rows(rows)
+    except Exception as e:
+        logging.error(f"Ошибка добавления ролей: {e}")
+        return None
+    try:
+        # updatedRange вида "'Пользователи_Роли'!A15:B17"
+        first_cell = response["updates"]["updatedRange"].rsplit("!", 1)[-1].split(":")[0]
+        return gspread.utils.a1_to_rowcol(first_cell)[0]
+    except (KeyError, TypeError, IndexError, gspread.exceptions.IncorrectCellLabel):
+        return 0
+
+def delete_user_role_row(gs_worksheet: gspread.Worksheet, row: int):
+    try:
+        gs_worksheet.delete_rows(row)
+        return True
+    except Exception as e:
+        logging.error(f"Ошибка удаления строки роли {row}: {e}")
+        return False
+
+def fetch_sheets_values(spreadsheet: gspread.Spreadsheet, worksheet_names: list):
+    """
+    Все значения нескольких листов одним запросом values.batchGet, в порядке worksheet_names.
+    Строки дополняются до прямоугольника, как в get_all_values. None при ошибке.
+    """
+    if not spreadsheet:
+        return None
+    try:
+        ranges = ["'{}'".format(name.replace("'", "''")) for name in worksheet_names]
+        response = spreadsheet.values_batch_get(ranges)
+        value_ranges = response.get("valueRanges", [])
+        if len(value_ranges) != len(worksheet_names):
+            logging.error(f"batchGet вернул {len(value_ranges)} диапазонов вместо {len(worksheet_names)}.")
+            return None
+        return [gspread.utils.fill_gaps(value_range.get("values", [])) for value_range in value_ranges]
+    except Exception as e:
+        logging.error(f"Ошибка пакетного чтения листов: {e}")
+        return None
@@ -0,0 +1,108 @@
+# utils/backends.py
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class StorageBackend:
+    """
+    Где DataStorage хранит свои данные: записи о простоях, роли, ответственные группы
+    и откуда берется следующий номер заявки. Реализации:
+    SheetsBackend — режим по умолчанию, все данные живут в Google Таблице и читаются из нее;
+    LocalStore — локальное хранилище (LOCAL_STORE=1), таблица получает копию.
+    Методы синхронные — обработчики пишут в хранилище напрямую.
+    Записи — словари заголовок -> значение, как record_data в обработчиках.
+    """
+
+    # --- Записи о простоях ---
+
+    def load_records(self) -> Optional[List[Dict[str, Any]]]:
+        """Сохраненные записи в порядке добавления. None — записи не хранятся, их источник — лист простоев."""
+        raise NotImplementedError
+
+    def reads_records_from_sheet(self) -> bool:
+        """Нужно ли читать записи из листа простоев при загрузке и обновлении кэша."""
+        raise NotImplementedError
+
+    def import_sheet_values(self, all_values: List[List[str]]) -> bool:
+        """
+        Принимает значения листа простоев (со строкой заголовков).
+        False — записи не сохранены, кэш строится прямо по этим значениям.
+        """
+        raise NotImplementedError
+
+    # --- Роли ---
+
+    def load_roles(self) -> Dict[str, str]:
+        raise NotImplementedError
+
+    def load_pending_roles(self) -> Dict[str, Optional[str]]:
+        """Изменения ролей, еще не записанные в лист (None — удаление)."""
+        raise NotImplementedError
+
+    def save_role(self, user_id: str, role: Optional[str]):
+        """Сохраняет роль пользователя (None — удалить) и ставит изменение в очередь записи в лист."""
+        raise NotImplementedError
+
+    def clear_pending_role(self, user_id: str, role: Optional[str]):
+        raise NotImplementedError
+
+    def replace_roles(self, roles: Dict[str, str]):
+        raise NotImplementedError
+
+    # --- Ответственные группы ---
+
+    def load_groups(self) -> Tuple[Dict[str, str], Dict[str, int]]:
+        """({ключ кнопки: название}, {название: ID чата}) — как parse_responsible_groups."""
+        raise NotImplementedError
+
+    def replace_groups(self, groups: Dict[str, str], group_ids: Dict[str, int]):
+        raise NotImplementedError
+
+    # --- Номера заявок ---
+
+    def next_sequence_number(self) -> Optional[int]:
+        """Следующий номер по сохраненным записям. None — его можно узнать только по листу простоев."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class SheetsBackend(StorageBackend):
+    """
+    Источник данных — Google Таблица (режим по умолчанию): локально ничего не сохраняется,
+    записи, роли и группы читаются из листов, номер заявки — по столбцу A листа простоев.
+    Новые записи переживают перезапуск в журнале DowntimeWriteQueue, изменения ролей — только в памяти.
+    """
+
+    def load_records(self) -> Optional[List[Dict[str, Any]]]:
+        return None
+
+    def reads_records_from_sheet(self) -> bool:
+        return True
+
+    def import_sheet_values(self, all_values: List[List[str]]) -> bool:
+        return False
+
+    def load_roles(self) -> Dict[str, str]:
+        return {}
+
+    def load_pending_roles(self) -> Dict[str, Optional[str]]:
+        return {}
+
+    def save_role(self, user_id: str, role: Optional[str]):
+        pass
+
+    def clear_pending_role(self, user_id: str, role: Optional[str]):
+        pass
+
+    def replace_roles(self, roles: Dict[str, str]):
+        pass
+
+    def load_groups(self) -> Tuple[Dict[str, str], Dict[str, int]]:
+        return {}, {}
+
+    def replace_groups(self, groups: Dict[str, str], group_ids: Dict[str, int]):
+        pass
+
+    def next_sequence_number(self) -> Optional[int]:
+        return None
@@ -0,0 +1,283 @@
+# benchmarks/bench_bot_load.py
+"""
+Нагрузочный бенчмарк бота без обращения к боевым Google Sheets и Telegram.
+Лист простоев (по умолчанию 50 000 строк) живет в поддельной таблице, Bot API — локальный сервер.
+Сценарии: загрузка данных при старте, сеансы DowntimeForm от множества операторов одновременно,
+отчеты по смене, цикл напоминаний. Для каждого сценария печатаются пропускная способность,
+p50/p99 задержки и количество вызовов API.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_bot_load --rows 50000 --operators 200 --sheets-latency 0.2 --sheets-429 0.01
+"""
+import argparse
+import os
+import tempfile
+
+# Состояние бота (SQLite, журнал очереди) пишется во временный каталог, а не в data/ —
+# переменная должна быть задана до импорта config
+os.environ.setdefault("BOT_DATA_DIR", tempfile.mkdtemp(prefix="bot_bench_"))
+
+import asyncio
+import logging
+import random
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import List
+
+from aiogram import Bot, Dispatcher, types
+from aiogram.bot.api import TelegramAPIServer
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+import config
+from benchmarks.fakes import FakeSheetsBackend, FakeSheetsClient, FakeTelegramAPI
+from handlers.downtime_handlers import register_downtime_handlers
+from main_bot import scheduled_shift_report
+from utils.fsm_storage import SQLiteStorage
+from utils.outbox import MessageDispatcher
+from utils.reminders import send_request_reminder
+from utils.reports import get_downtime_report_pages, scheduled_line_status_report
+from utils.shifts import get_shift_time_range
+from utils.storage import DataStorage
+from utils.update_dispatch import ChatOrderedDispatcher
+
+START_TEXT = "📊 Внести запись о Простое"
+GROUPS_COUNT = 20
+ADMINS_COUNT = 3
+
+
+def make_downtime_rows(count: int) -> List[List[str]]:
+    """Лист простоев: заголовки и count строк, последние — в текущей смене."""
+    rng = random.Random(42)
+    sites = list(config.PRODUCTION_SITES)
+    reasons = list(config.DOWNTIME_REASONS.values())
+    now = datetime.now()
+    rows = [list(config.SHEET_HEADERS)]
+    for i in range(count):
+        site_key = rng.choice(sites)
+        record = {
+            "Порядковый номер заявки": str(i + 1),
+            "Timestamp_записи": (now - timedelta(minutes=10 * (count - i))).strftime("%Y-%m-%d %H:%M:%S"),
+            "Площадка": config.PRODUCTION_SITES[site_key],
+            "Линия_Секция": rng.choice(list(config.LINES_SECTIONS[site_key].values())),
+            "Направление_простоя": rng.choice(reasons),
+            "Время_простоя_минут": str(rng.randint(1, 90)),
+            "Причина_простоя_описание": f"Описание {i}",
+            "Ответственная_группа": f"Группа {i % GROUPS_COUNT}",
+            "Дополнительный_комментарий_инициатора": "Без доп. комментария" if i % 3 else f"Комментарий {i}",
+        }
+        rows.append([record.get(header, "") for header in config.SHEET_HEADERS])
+    return rows
+
+
+def make_client(backend: FakeSheetsBackend, rows: int) -> FakeSheetsClient:
+    client = FakeSheetsClient(backend)
+    spreadsheet = client.spreadsheet
+    spreadsheet.add_sheet(config.DOWNTIME_WORKSHEET_NAME, make_downtime_rows(rows))
+    spreadsheet.add_sheet(config.USER_ROLES_WORKSHEET_NAME,
+                          [[config.USER_ID_COLUMN, config.USER_ROLE_COLUMN]]
+                          + [[str(900 + i), config.ADMIN_ROLE] for i in range(ADMINS_COUNT)])
+    spreadsheet.add_sheet(config.RESPONSIBLE_GROUPS_WORKSHEET_NAME,
+                          [[config.GROUP_NAME_COLUMN, config.GROUP_ID_COLUMN]]
+                          + [[f"Группа {i}", str(-1000 - i)] for i in range(GROUPS_COUNT)])
+    return client
+
+
+class Scenario:
+    """Замеры одного сценария: задержки операций и прирост вызовов API."""
+
+    def __init__(self, name: str, backend: FakeSheetsBackend, telegram: FakeTelegramAPI):
+        self.name = name
+        self.backend = backend
+        self.telegram = telegram
+        self.latencies: List[float] = []
+        self.errors = 0
+
+    def __enter__(self):
+        self._sheets_calls = Counter(self.backend.calls)
+        self._telegram_calls = Counter(self.telegram.calls)
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self._started
+        self.sheets_calls = Counter(self.backend.calls) - self._sheets_calls
+        self.telegram_calls = Counter(self.telegram.calls) - self._telegram_calls
+
+    async def timed(self, coro):
+        started = time.perf_counter()
+        try:
+            return await coro
+        finally:
+            self.latencies.append(time.perf_counter() - started)
+
+    def report(self):
+        latencies = sorted(self.latencies)
+
+        def percentile(q: float) -> float:
+            return latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000 if latencies else 0.0
+
+        throughput = len(latencies) / self.elapsed if self.elapsed else 0.0
+        print(f"\n--- {self.name} ---")
+        print(f"операций: {len(latencies)}, ошибок: {self.errors}, время: {self.elapsed:.2f} с, {throughput:.1f} оп/с")
+        print(f"задержка: p50 {percentile(0.5):.1f} мс, p99 {percentile(0.99):.1f} мс")
+        print(f"Sheets API: {sum(self.sheets_calls.values())} {dict(self.sheets_calls)}")
+        print(f"Bot API: {sum(self.telegram_calls.values())} {dict(self.telegram_calls)}")
+
+
+def _user(user_id: int) -> dict:
+    return {"id": user_id, "is_bot": False, "first_name": f"Оператор {user_id}"}
+
+
+class Operator:
+    """Оператор, проходящий DowntimeForm: каждый шаг — апдейт, переданный диспетчеру."""
+
+    def __init__(self, dp: Dispatcher, user_id: int, update_ids):
+        self.dp = dp
+        self.user_id = user_id
+        self.update_ids = update_ids
+        self.message_id = 0
+
+    def _message(self, text: str) -> dict:
+        self.message_id += 1
+        return {"message_id": self.message_id, "date": int(time.time()), "from": _user(self.user_id),
+                "chat": {"id": self.user_id, "type": "private"}, "text": text}
+
+    async def _deliver(self, update: types.Update):
+        # Как при polling, каждый апдейт — отдельная задача: aiogram кэширует состояние FSM в контексте задачи
+        await asyncio.create_task(self.dp.updates_handler.notify(update))
+
+    async def send_text(self, text: str):
+        await self._deliver(types.Update(update_id=next(self.update_ids), message=self._message(text)))
+
+    async def press(self, data: str):
+        message = self._message("")
+        message["from"] = {"id": 1, "is_bot": True, "first_name": "bench_bot"}
+        await self._deliver(types.Update(update_id=next(self.update_ids), callback_query={
+            "id": str(next(self.update_ids)), "chat_instance": str(self.user_id),
+            "from": _user(self.user_id), "message": message, "data": data,
+        }))
+
+
+async def run_operator(scenario: Scenario, operator: Operator, group_key: str, rng: random.Random):
+    site_key = rng.choice(list(config.PRODUCTION_SITES))
+    steps = [
+        (operator.send_text, START_TEXT),
+        (operator.press, f"site_{site_key}"),
+        (operator.press, f"ls_{rng.choice(list(config.LINES_SECTIONS[site_key]))}"),
+        (operator.press, f"reason_{rng.choice(list(config.DOWNTIME_REASONS))}"),
+        (operator.send_text, "Остановка линии, бенчмарк"),
+    ]
+    if group_key:
+        # Заявка уходит в группу и ждет принятия — из таких заявок набираются напоминания
+        steps.append((operator.press, f"group_{group_key}"))
+    else:
+        steps += [(operator.press, "skip_group_selection"), (operator.press, "end_downtime_without_comment")]
+    for step, arg in steps:
+        try:
+            await scenario.timed(step(arg))
+        except Exception as e:
+            # При polling aiogram только залогировал бы ошибку обработчика; сеанс оператора на этом обрывается
+            logging.warning(f"Оператор {operator.user_id}: ошибка на шаге '{arg}': {e!r}")
+            scenario.errors += 1
+            return
+
+
+async def main(args):
+    # main_bot при импорте включает INFO; для бенчмарка оставляем только предупреждения и ошибки
+    logging.getLogger().setLevel(logging.WARNING)
+    backend = FakeSheetsBackend(latency=args.sheets_latency, error_rate=args.sheets_429)
+    telegram = FakeTelegramAPI(latency=args.telegram_latency, error_rate=args.telegram_429)
+    await telegram.start()
+
+    bot = Bot(token="123456:bench", server=TelegramAPIServer.from_base(telegram.base_url))
+    dp = ChatOrderedDispatcher(bot, storage=SQLiteStorage())
+    Bot.set_current(bot)
+    Dispatcher.set_current(dp)
+    outbox = MessageDispatcher(bot)
+    dp['outbox'] = outbox
+    scheduler = AsyncIOScheduler(timezone=config.SCHEDULER_TIMEZONE)
+    scheduler.start()
+    dp['scheduler'] = scheduler
+    register_downtime_handlers(dp)
+
+    print(f"Строк в листе простоев: {args.rows}, операторов: {args.operators}, локальное хранилище: {args.local_store}, "
+          f"задержка Sheets: {args.sheets_latency} с, доля 429 Sheets: {args.sheets_429}")
+    client = make_client(backend, args.rows)
+
+    # 1. Старт: открытие таблицы и загрузка всех листов (с локальным хранилищем — перенос истории в него)
+    with Scenario("Загрузка данных при старте", backend, telegram) as scenario:
+        storage = DataStorage(client, args.local_store)
+        dp['storage'] = storage
+        await scenario.timed(storage.initialize())
+    scenario.report()
+
+    if storage.local_store:
+        # 1а. Перезапуск: данные уже в локальном хранилище, из таблицы читаются только роли и группы
+        storage.sheets.shutdown()
+        storage.state_db.close()
+        storage.backend.close()
+        with Scenario("Повторный старт из локального хранилища", backend, telegram) as scenario:
+            storage = DataStorage(client, args.local_store)
+            dp['storage'] = storage
+            await scenario.timed(storage.initialize())
+        scenario.report()
+
+    # 2. Операторы одновременно вносят простои; половина — с отправкой заявки в группу
+    rng = random.Random(7)
+    group_keys = list(storage.responsible_groups)
+    update_ids = iter(range(1, 10 ** 9))
+    with Scenario(f"Сеансы DowntimeForm ({args.operators} операторов)", backend, telegram) as scenario:
+        await asyncio.gather(*(
+            run_operator(scenario, Operator(dp, 10_000 + i, update_ids),
+                         group_keys[i % len(group_keys)] if i % 2 and group_keys else "", rng)
+            for i in range(args.operators)
+        ))
+        await storage.flush_write_queue(force=True)
+    scenario.report()
+
+    # 3. Отчеты: админская сводка за смену и страницы отчета, повторно — из кэша страниц
+    start_dt, end_dt = get_shift_time_range("current")
+    with Scenario("Отчеты по смене", backend, telegram) as scenario:
+        await scenario.timed(scheduled_shift_report(outbox, storage, "current", "Текущая смена"))
+        await scenario.timed(scheduled_line_status_report(outbox, storage))
+        for _ in range(args.report_repeats):
+            await scenario.timed(get_downtime_report_pages(start_dt, end_dt, storage))
+    scenario.report()
+
+    # 4. Напоминания по всем непринятым заявкам сразу (как если бы у всех наступил срок)
+    request_ids = storage.pending_requests.ids_by_status("pending_acceptance")
+    with Scenario(f"Напоминания ({len(request_ids)} заявок)", backend, telegram) as scenario:
+        await asyncio.gather(*(scenario.timed(send_request_reminder(outbox, storage, request_id))
+                               for request_id in request_ids))
+    scenario.report()
+
+    print(f"\nSheets: отклонено 429: {backend.throttled}, шлюз: {storage.sheets.metrics()}")
+    print(f"Telegram: отклонено 429: {telegram.throttled}, очередь отправки: {outbox.metrics()}")
+    print(f"Диспетчер: {dp.update_metrics()}")
+
+    scheduler.shutdown(wait=False)
+    storage.sheets.shutdown()
+    storage.state_db.close()
+    storage.backend.close()
+    await dp.storage.close()
+    await (await bot.get_session()).close()
+    await telegram.stop()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50_000, help="строк в листе простоев")
+    parser.add_argument("--operators", type=int, default=200, help="одновременных операторов")
+    parser.add_argument("--local-store", action="store_true", default=config.LOCAL_STORE_ENABLED,
+                        help="локальное хранилище SQLite (LOCAL_STORE=1), Google Таблица — копия")
+    parser.add_argument("--sheets-latency", type=float, default=0.1, help="задержка запроса к Sheets, с")
+    parser.add_argument("--sheets-429", type=float, default=0.0, help="доля ответов 429 от Sheets")
+    parser.add_argument("--telegram-latency", type=float, default=0.02, help="задержка запроса к Bot API, с")
+    parser.add_argument("--telegram-429", type=float, default=0.0, help="доля ответов 429 от Bot API")
+    parser.add_argument("--report-repeats", type=int, default=20, help="повторных запросов отчета")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
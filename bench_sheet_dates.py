@@ -0,0 +1,84 @@
+# benchmarks/bench_sheet_dates.py
+"""
+Микробенчмарк разбора дат из таблицы на синтетическом листе из 100 000 строк.
+Запуск из корня проекта: python -m benchmarks.bench_sheet_dates [кол-во строк]
+"""
+import logging
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from pytz import timezone
+
+from config import SCHEDULER_TIMEZONE, SHEET_HEADERS
+from utils.sheet_dates import SheetDatetimeParser, SHEET_DATETIME_FORMATS
+from utils.downtime_store import DowntimeStore
+
+
+def legacy_parse(dt_string: str, tz):
+    """Прежняя логика reports.py: перебор strptime и tz.localize на каждую строку."""
+    for fmt in SHEET_DATETIME_FORMATS:
+        try:
+            return tz.localize(datetime.strptime(dt_string, fmt))
+        except ValueError:
+            continue
+    return None
+
+
+def make_timestamps(count: int) -> list:
+    random.seed(42)
+    start = datetime(2024, 1, 1)
+    values = []
+    for i in range(count):
+        dt = start + timedelta(seconds=i * 600 + random.randint(0, 599))
+        # Примерно десятая часть строк переформатирована Google в формат ДД.ММ.ГГГГ
+        fmt = "%d.%m.%Y %H:%M:%S" if i % 10 == 0 else "%Y-%m-%d %H:%M:%S"
+        values.append(dt.strftime(fmt))
+    return values
+
+
+def make_rows(timestamps: list) -> list:
+    ts_idx = SHEET_HEADERS.index("Timestamp_записи")
+    min_idx = SHEET_HEADERS.index("Время_простоя_минут")
+    rows = []
+    for i, ts in enumerate(timestamps):
+        row = [""] * len(SHEET_HEADERS)
+        row[0] = str(i + 1)
+        row[ts_idx] = ts
+        row[min_idx] = str(i % 90 + 1)
+        rows.append(row)
+    return rows
+
+
+def measure(label: str, func, *args) -> float:
+    started = time.perf_counter()
+    func(*args)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<45} {elapsed * 1000:9.1f} мс")
+    return elapsed
+
+
+def main():
+    logging.disable(logging.WARNING)
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    tz = timezone(SCHEDULER_TIMEZONE)
+    timestamps = make_timestamps(count)
+    print(f"Строк: {count}")
+
+    legacy = measure("strptime + tz.localize (как раньше)", lambda: [legacy_parse(s, tz) for s in timestamps])
+    parser = SheetDatetimeParser(tz)
+    cold = measure("SheetDatetimeParser, холодный кэш", lambda: [parser.parse(s) for s in timestamps])
+    warm = measure("SheetDatetimeParser, повторный проход", lambda: [parser.parse(s) for s in timestamps])
+
+    check = SheetDatetimeParser(tz)
+    assert all(legacy_parse(s, tz) == check.parse(s) for s in timestamps[:5000]), "результаты парсеров расходятся"
+
+    rows = make_rows(timestamps)
+    measure("DowntimeStore.from_rows (полная пересборка)", DowntimeStore.from_rows, SHEET_HEADERS, rows)
+
+    print(f"\nУскорение: холодный кэш x{legacy / cold:.1f}, повторный проход x{legacy / warm:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+# g_sheets/breaker.py
+import logging
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+import requests
+
+from config import (SHEETS_REQUESTS_PER_MINUTE, SHEETS_BREAKER_FAILURE_THRESHOLD,
+                    SHEETS_BREAKER_BASE_DELAY_SECONDS, SHEETS_BREAKER_MAX_DELAY_SECONDS)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+BUDGET_WINDOW_SECONDS = 60
+
+
+class SheetsCircuitBreaker:
+    """
+    Бюджет запросов и автомат защиты для Google Sheets.
+    Ответы API видны через хук HTTP-сессии gspread: 429 размыкает автомат сразу,
+    ошибки 5xx и таймауты — после нескольких подряд. Пока автомат разомкнут, шлюз не ходит в API:
+    чтения обслуживаются из кэша, записи ждут в очередях. Пауза растет экспоненциально
+    со случайным разбросом, по ее окончании пропускается пробный запрос.
+    Хук вызывается из потоков пула, поэтому состояние защищено блокировкой.
+    """
+
+    def __init__(self, requests_per_minute: int = SHEETS_REQUESTS_PER_MINUTE,
+                 failure_threshold: int = SHEETS_BREAKER_FAILURE_THRESHOLD,
+                 base_delay: float = SHEETS_BREAKER_BASE_DELAY_SECONDS,
+                 max_delay: float = SHEETS_BREAKER_MAX_DELAY_SECONDS):
+        self.requests_per_minute = requests_per_minute
+        self.failure_threshold = failure_threshold
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self._reserved = deque()  # Моменты запланированных запросов за последнюю минуту
+
+        self.state = CLOSED
+        self.failures = 0            # Ошибок подряд
+        self.trips = 0               # Сколько раз автомат размыкался (растет и задержка)
+        self.consecutive_trips = 0   # Размыканий без успешного запроса между ними
+        self.open_until = 0.0
+        self.reopen_at: Optional[datetime] = None
+        self.last_error: Optional[str] = None
+        self.rejected_total = 0
+        self.throttled_total = 0     # Ответов 429
+
+    def observe(self, session: requests.Session):
+        """Подписывается на ответы HTTP-сессии клиента gspread."""
+        session.hooks["response"].append(self._on_response)
+
+    def _on_response(self, response: requests.Response, *args, **kwargs):
+        status = response.status_code
+        if status == 429:
+            with self._lock:
+                self.throttled_total += 1
+        if status == 429 or status >= 500:
+            retry_after = response.headers.get("Retry-After", "")
+            self.record_failure(f"HTTP {status}", retry_after=float(retry_after) if retry_after.isdigit() else 0.0,
+                                trip_now=status == 429)
+        elif status < 400:
+            self.record_success()
+
+    def record_success(self):
+        with self._lock:
+            if self.state != CLOSED:
+                logging.info("[SHEETS] Связь с Google Sheets восстановлена, автомат замкнут.")
+            self.state = CLOSED
+            self.failures = 0
+            self.consecutive_trips = 0
+
+    def record_failure(self, reason: str, retry_after: float = 0.0, trip_now: bool = False):
+        """Учитывает ошибку; при лимите запросов или серии ошибок размыкает автомат."""
+        with self._lock:
+            self.failures += 1
+            self.last_error = reason
+            if trip_now or self.failures >= self.failure_threshold or self.state == HALF_OPEN:
+                self._trip(retry_after)
+
+    def _trip(self, retry_after: float):
+        self.trips += 1
+        self.consecutive_trips += 1
+        delay = min(self.max_delay, self.base_delay * 2 ** (self.consecutive_trips - 1))
+        # Разброс, чтобы повторы не приходились ровно на одну секунду с другими клиентами квоты
+        delay = max(retry_after, delay / 2 + random.uniform(0, delay / 2))
+        self.state = OPEN
+        self.failures = 0
+        self.open_until = time.monotonic() + delay
+        self.reopen_at = datetime.now() + timedelta(seconds=delay)
+        logging.warning(f"[SHEETS] Автомат разомкнут ({self.last_error}): запросы к Google Sheets "
+                        f"приостановлены на {delay:.0f} с.")
+
+    def is_open(self) -> bool:
+        """True, пока пауза после размыкания не истекла."""
+        with self._lock:
+            return self.state == OPEN and time.monotonic() < self.open_until
+
+    def allow(self) -> bool:
+        """
+        Можно ли выполнить запрос. После паузы пропускается один пробный запрос,
+        остальные отклоняются, пока не станет известен его результат (или не пройдет еще base_delay).
+        """
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            now = time.monotonic()
+            if now < self.open_until:
+                self.rejected_total += 1
+                return False
+            self.state = HALF_OPEN
+            self.open_until = now + self.base_delay
+            return True
+
+    def reserve(self) -> float:
+        """Резервирует запрос в бюджете на минуту и возвращает, сколько секунд подождать."""
+        with self._lock:
+            now = time.monotonic()
+            while self._reserved and self._reserved[0] <= now - BUDGET_WINDOW_SECONDS:
+                self._reserved.popleft()
+            start = now
+            if len(self._reserved) >= self.requests_per_minute:
+                start = max(now, self._reserved[-self.requests_per_minute] + BUDGET_WINDOW_SECONDS)
+            self._reserved.append(start)
+            return start - now
+
+    def describe(self) -> Optional[str]:
+        """Описание деградированного режима для отчетов или None, если все в порядке."""
+        with self._lock:
+            if self.state == CLOSED:
+                return None
+            reopen = self.reopen_at.strftime('%H:%M:%S') if self.reopen_at else "?"
+            return (f"Google Таблица недоступна ({self.last_error}), запросы приостановлены до {reopen}. "
+                    f"Отчет построен по кэшу, новые записи ждут в очереди")
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            return {
+                "budget_used": sum(1 for moment in self._reserved if now - BUDGET_WINDOW_SECONDS < moment <= now),
+                "budget_per_minute": self.requests_per_minute,
+                "breaker_state": self.state,
+                "breaker_trips": self.trips,
+                "breaker_rejected_total": self.rejected_total,
+                "throttled_total": self.throttled_total,
+                "breaker_last_error": self.last_error,
+            }
@@ -10,6 +10,22 @@ load_dotenv()
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "8080782592:AAEfvF60b5LccOMLDNHnVbN2lSNhvRjyly0")
 BOT_VERSION = "8.1_With_Seq_Num"
 
+# --- Получение апдейтов ---
+BOT_MODE = os.getenv("BOT_MODE", "polling")  # "polling" или "webhook"
+# Пропускать накопившиеся апдейты при запуске (по умолчанию нажатия за время перезапуска обрабатываются)
+SKIP_UPDATES_ON_START = os.getenv("SKIP_UPDATES_ON_START", "0") == "1"
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "")  # Публичный адрес бота, например https://bot.example.com
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram/webhook")
+WEBHOOK_SECRET_TOKEN = os.getenv("WEBHOOK_SECRET_TOKEN", "")  # Пусто — генерируется при каждом запуске
+WEBAPP_HOST = os.getenv("WEBAPP_HOST", "127.0.0.1")  # Где слушает локальный aiohttp-сервер
+WEBAPP_PORT = int(os.getenv("WEBAPP_PORT", "8080"))
+WEBHOOK_DRAIN_TIMEOUT_SECONDS = 30   # Сколько ждать обрабатываемые апдейты при остановке
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")  # Локальный сервер /metrics
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))  # 0 — не запускать
+UPDATE_WORKERS = 16  # Сколько апдейтов разных чатов обрабатывается одновременно
+# Свой Bot API сервер (локальный telegram-bot-api или тестовая заглушка); пусто — api.telegram.org
+TELEGRAM_API_SERVER_URL = os.getenv("TELEGRAM_API_SERVER_URL", "")
+
 # --- Настройки Google Sheets ---
 GOOGLE_SHEET_ID = "1lD4lvJGQDia9zPVThUMR4Zh2_mjQF07FWH-5YTeDMIU"
 GOOGLE_SERVICE_ACCOUNT_JSON_PATH = "service_account.json"
@@ -26,6 +42,40 @@ TOP_N_REASONS_FOR_SUMMARY = 3
 # --- Кэш ---
 CACHE_REFRESH_INTERVAL_SECONDS = 300  # 5 минут
 CACHE_MAX_AGE_SECONDS = 900           # 15 минут
+REFERENCE_RELOAD_INTERVAL_MINUTES = 5  # Проверка изменений в листах ролей и групп
+
+# --- Локальные данные бота ---
+DATA_DIR = os.getenv("BOT_DATA_DIR", "data")
+# Локальное хранилище записей, ролей и групп (SQLite): при включении Google Таблица получает их копию,
+# а правки строк простоев прямо в таблице больше не подтягиваются. По умолчанию источник — Google Таблица
+LOCAL_STORE_ENABLED = os.getenv("LOCAL_STORE", "0") == "1"
+RECORDS_DB_PATH = os.path.join(DATA_DIR, "records.sqlite3")  # Записи о простоях, роли и группы (LOCAL_STORE=1)
+SEQUENCE_STATE_PATH = os.path.join(DATA_DIR, "sequence.json")  # Последний выданный порядковый номер заявки
+WRITE_QUEUE_JOURNAL_PATH = os.path.join(DATA_DIR, "downtime_queue.jsonl")  # Журнал еще не записанных в таблицу простоев
+STATE_DB_PATH = os.path.join(DATA_DIR, "bot_state.sqlite3")  # Открытые заявки и активные простои
+FSM_STORAGE_PATH = os.path.join(DATA_DIR, "fsm.sqlite3")  # Состояния незаконченных форм пользователей
+
+# --- Состояния форм (FSM) ---
+FSM_STATE_TTL_HOURS = 24                  # Брошенные формы старше этого срока удаляются
+FSM_CLEANUP_INTERVAL_MINUTES = 60         # Как часто искать брошенные формы
+
+# --- Отложенная запись простоев в таблицу ---
+WRITE_QUEUE_FLUSH_INTERVAL_SECONDS = 10   # Как часто отправлять накопленные записи
+WRITE_QUEUE_BATCH_SIZE = 100              # Максимум строк в одном append_rows
+WRITE_QUEUE_MAX_BACKOFF_SECONDS = 300     # Максимальная пауза между повторами после ошибок
+
+# --- Пул потоков для Google Sheets ---
+SHEETS_EXECUTOR_WORKERS = 4           # Сколько запросов к Google Sheets выполняется одновременно
+SHEETS_CALL_TIMEOUT_SECONDS = 30      # Таймаут одного запроса к Google Sheets
+SHEETS_REQUESTS_PER_MINUTE = 60       # Бюджет запросов в минуту (квота Sheets API на пользователя)
+SHEETS_BREAKER_FAILURE_THRESHOLD = 3  # Сколько ошибок 5xx/таймаутов подряд размыкают автомат
+SHEETS_BREAKER_BASE_DELAY_SECONDS = 10   # Первая пауза после размыкания
+SHEETS_BREAKER_MAX_DELAY_SECONDS = 600   # Максимальная пауза
+
+# --- Исходящие сообщения (лимиты Telegram) ---
+OUTBOX_GLOBAL_RATE_PER_SECOND = 25        # Всего сообщений в секунду (лимит Telegram ~30)
+OUTBOX_PER_CHAT_RATE_PER_SECOND = 1       # Сообщений в секунду в один чат
+OUTBOX_MAX_RETRIES = 3                    # Сколько раз повторять отправку после RetryAfter
 
 # --- Роли пользователей ---
 ADMIN_ROLE = "Администратор"
@@ -62,6 +112,7 @@ SHEET_HEADERS = [
     "Дополнительный_комментарий_инициатора",
     "ID_Фото"
 ]
+SEQUENCE_COLUMN = "Порядковый номер заявки"  # Столбец A листа простоев
 GROUP_NAME_COLUMN = "Название группы"
 GROUP_ID_COLUMN = "ID группы"
 USER_ID_COLUMN = "ID_пользователя_Telegram"
@@ -14,7 +14,7 @@ from utils.storage import DataStorage
 from config import (PRODUCTION_SITES, LINES_SECTIONS, DOWNTIME_REASONS, SCHEDULER_TIMEZONE)
 from keyboards import inline
 from utils.reports import calculate_shift_times
-from g_sheets.api import append_downtime_record, get_next_sequence_number
+from utils.reminders import schedule_request_reminder, cancel_request_reminder
 
 # --- Начало и навигация в FSM ---
 
@@ -198,6 +198,7 @@ async def process_group_choice(cb: types.CallbackQuery, state: FSMContext):
             "group_notification_text": notif_text,
             "ls_name": fsm_data.get('ls_name', '')
         }
+        schedule_request_reminder(dp.get('scheduler'), dp['outbox'], storage, request_id)
         
         await DowntimeForm.waiting_for_group_acceptance.set()
         await cb.message.edit_text(f"Группа: {group_name}.\nЗаявка отправлена, ожидайте принятия.")
@@ -245,7 +246,6 @@ async def save_downtime_record(update: types.Update, state: FSMContext):
         
     async with state.proxy() as data:
         request_id_to_clear = data.get('request_id')
-        next_seq_num = get_next_sequence_number(storage.downtime_ws)
         start_time_val = data.get('downtime_start_time')
         start_time = datetime.fromisoformat(start_time_val) if isinstance(start_time_val, str) else start_time_val
 
@@ -254,6 +254,14 @@ async def save_downtime_record(update: types.Update, state: FSMContext):
             await state.finish()
             return
         
+        next_seq_num = await storage.allocate_sequence_number()
+        if next_seq_num is None:
+            # Данные простоя остаются в состоянии: завершить его можно повторно, когда таблица станет доступна
+            await bot.send_message(chat_id, "❌ Номера заявок еще не сверены с таблицей, запись не сохранена. "
+                                            "Попробуйте завершить простой через минуту.",
+                                   reply_markup=inline.get_end_downtime_keyboard())
+            await DowntimeForm.waiting_for_downtime_end.set()
+            return
         tz = timezone(SCHEDULER_TIMEZONE)
         end_time = datetime.now(tz)
         duration_minutes = max(1, int((end_time - start_time).total_seconds() / 60))
@@ -274,7 +282,7 @@ async def save_downtime_record(update: types.Update, state: FSMContext):
             "ID_Фото": data.get('photo_file_id', '')
         }
 
-    if append_downtime_record(storage.downtime_ws, record_data):
+    if storage.queue_downtime_record(record_data):
         try:
             line_key = (record_data['Площадка'], record_data['Линия_Секция'])
             if line_key in storage.active_downtimes:
@@ -282,11 +290,10 @@ async def save_downtime_record(update: types.Update, state: FSMContext):
                 logging.info(f"Удален активный простой для {line_key[0]}/{line_key[1]}")
             if request_id_to_clear and request_id_to_clear in storage.pending_requests:
                 del storage.pending_requests[request_id_to_clear]
+                cancel_request_reminder(dp.get('scheduler'), request_id_to_clear)
                 logging.info(f"Заявка {request_id_to_clear} успешно закрыта и удалена из отслеживания.")
         except KeyError:
             pass
-
-        await storage.refresh_downtime_cache(bot)
         
         summary_lines = [f"✅ **Заявка №{next_seq_num} успешно сохранена!**\n"]
         summary_lines.append(f"**Площадка:** {record_data['Площадка']}")
@@ -310,7 +317,7 @@ async def save_downtime_record(update: types.Update, state: FSMContext):
         else:
             await bot.send_message(chat_id, summary_caption, parse_mode='Markdown')
     else:
-        await bot.send_message(chat_id, "❌ Ошибка сохранения в Google Sheets.")
+        await bot.send_message(chat_id, "❌ Ошибка сохранения записи.")
     
     await state.finish()
 
@@ -0,0 +1,140 @@
+# utils/downtime_store.py
+import itertools
+import logging
+import sys
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from pytz import timezone
+
+from config import SCHEDULER_TIMEZONE
+from utils.sheet_dates import SheetDatetimeParser
+from utils.rollups import ShiftRollup
+
+TIMESTAMP_COLUMN = "Timestamp_записи"
+MINUTES_COLUMN = "Время_простоя_минут"
+# Столбцы, которые раскладываются по колонкам хранилища (атрибут -> заголовок таблицы)
+TEXT_COLUMNS = {
+    "sites": "Площадка",
+    "lines": "Линия_Секция",
+    "reasons": "Направление_простоя",
+    "groups": "Ответственная_группа",
+    "descriptions": "Причина_простоя_описание",
+    "comments": "Дополнительный_комментарий_инициатора",
+}
+# Повторяющиеся значения храним в одном экземпляре
+INTERNED_COLUMNS = {"sites", "lines", "reasons", "groups"}
+
+# Общий для всех пересборок хранилища: кэш разобранных дат переживает полное обновление кэша
+_timestamp_parser = SheetDatetimeParser(timezone(SCHEDULER_TIMEZONE))
+# Сквозной счетчик версий: новая сборка хранилища не повторяет версию предыдущей
+_versions = itertools.count(1)
+
+
+class DowntimeStore:
+    """
+    Колоночное хранилище простоев для отчетов.
+    Строится один раз при обновлении кэша: даты уже распарсены и привязаны к часовому поясу,
+    минуты приведены к int, записи отсортированы по Timestamp_записи,
+    поэтому выборка за период — это бинарный поиск, а не проход по всей истории.
+    """
+
+    def __init__(self, headers: Optional[List[str]] = None):
+        self.timestamps: List[datetime] = []
+        self.minutes: List[int] = []
+        self.sites: List[str] = []
+        self.lines: List[str] = []
+        self.reasons: List[str] = []
+        self.groups: List[str] = []
+        self.descriptions: List[str] = []
+        self.comments: List[str] = []
+        self.rollup = ShiftRollup()
+
+        self.version = 0          # Меняется при каждом изменении данных (ключ кэшей отчетов)
+        self.skipped_rows = 0     # Строки, которые не удалось разобрать
+        self.missing_column: Optional[str] = None
+        self._idx: Dict[str, int] = {}
+        self._min_width = 0
+        self._set_headers(headers or [])
+
+    def _set_headers(self, headers: List[str]):
+        for column in (TIMESTAMP_COLUMN, MINUTES_COLUMN):
+            if column not in headers:
+                self.missing_column = column
+                return
+        self._idx = {TIMESTAMP_COLUMN: headers.index(TIMESTAMP_COLUMN), MINUTES_COLUMN: headers.index(MINUTES_COLUMN)}
+        for attr, column in TEXT_COLUMNS.items():
+            # Необязательные столбцы: при отсутствии в таблице значение будет пустым
+            self._idx[attr] = headers.index(column) if column in headers else None
+        self._min_width = max(self._idx[TIMESTAMP_COLUMN], self._idx[MINUTES_COLUMN]) + 1
+
+    @classmethod
+    def from_rows(cls, headers: List[str], rows: List[List[str]]) -> "DowntimeStore":
+        """Строит хранилище по заголовкам и строкам листа."""
+        store = cls(headers)
+        if store.missing_column:
+            return store
+        parsed = [record for record in (store._parse_row(row) for row in rows) if record]
+        parsed.sort(key=lambda record: record[0])
+        if parsed:
+            columns = list(zip(*parsed))
+            store.timestamps = list(columns[0])
+            store.minutes = list(columns[1])
+            for pos, attr in enumerate(TEXT_COLUMNS, start=2):
+                setattr(store, attr, list(columns[pos]))
+            for i in range(len(parsed)):
+                store.rollup.add(store.timestamps[i], store.sites[i], store.lines[i], store.reasons[i],
+                                 store.groups[i], store.minutes[i])
+        store.version = next(_versions)
+        if store.skipped_rows:
+            logging.warning(f"[STORE] Пропущено некорректных строк: {store.skipped_rows}.")
+        return store
+
+    def _parse_row(self, row: List[str]) -> Optional[tuple]:
+        if len(row) < self._min_width:
+            return None
+        timestamp_str = row[self._idx[TIMESTAMP_COLUMN]]
+        if not timestamp_str:
+            return None
+        record_dt = _timestamp_parser.parse(timestamp_str)
+        if not record_dt:
+            self.skipped_rows += 1
+            return None
+        try:
+            minutes = int(row[self._idx[MINUTES_COLUMN]] or 0)
+        except ValueError:
+            self.skipped_rows += 1
+            logging.warning(f"Пропущена строка с некорректной длительностью: {row}")
+            return None
+
+        values = [record_dt, minutes]
+        for attr in TEXT_COLUMNS:
+            idx = self._idx[attr]
+            value = row[idx] if idx is not None and idx < len(row) else ""
+            values.append(sys.intern(value) if attr in INTERNED_COLUMNS else value)
+        return tuple(values)
+
+    def add_row(self, row: List[str]) -> bool:
+        """Добавляет одну строку листа, сохраняя сортировку по времени."""
+        if self.missing_column:
+            return False
+        record = self._parse_row(row)
+        if not record:
+            return False
+        # Новые записи почти всегда самые поздние, поэтому вставка обычно происходит в конец
+        pos = bisect_right(self.timestamps, record[0])
+        self.timestamps.insert(pos, record[0])
+        self.minutes.insert(pos, record[1])
+        for offset, attr in enumerate(TEXT_COLUMNS, start=2):
+            getattr(self, attr).insert(pos, record[offset])
+        self.rollup.add(record[0], self.sites[pos], self.lines[pos], self.reasons[pos], self.groups[pos], record[1])
+        self.version = next(_versions)
+        return True
+
+    def window(self, start_dt: datetime, end_dt: datetime) -> range:
+        """Индексы записей с start_dt <= Timestamp_записи < end_dt."""
+        return range(bisect_left(self.timestamps, start_dt), bisect_left(self.timestamps, end_dt))
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
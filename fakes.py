@@ -0,0 +1,239 @@
+# benchmarks/fakes.py
+"""
+Поддельные Google Sheets и Telegram Bot API для бенчмарков.
+FakeSheetsClient повторяет ту часть интерфейса gspread, которой пользуется g_sheets/api.py,
+с настраиваемой задержкой и долей ответов 429. FakeTelegramAPI — локальный aiohttp-сервер
+с интерфейсом Bot API, на который бот направляется через TelegramAPIServer.
+"""
+import asyncio
+import random
+import re
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+import gspread
+import requests
+from aiohttp import web
+
+
+class FakeResponse:
+    """Ответ HTTP в том виде, в каком его видят хуки requests и gspread.exceptions.APIError."""
+
+    def __init__(self, status_code: int, retry_after: Optional[int] = None):
+        self.status_code = status_code
+        self.headers = {"Retry-After": str(retry_after)} if retry_after else {}
+        self.text = "Quota exceeded" if status_code == 429 else ""
+
+    def json(self):
+        return {"error": {"code": self.status_code, "message": self.text, "status": "RESOURCE_EXHAUSTED"}}
+
+
+class FakeSheetsBackend:
+    """Общие для всех листов задержка, доля 429 и счетчик запросов по методам."""
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, seed: int = 42):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.calls: Counter = Counter()
+        self.throttled = 0
+        self.session = requests.Session()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def request(self, method: str):
+        """Имитирует один запрос к API: задержка, учет и, возможно, 429 (как APIError gspread)."""
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.calls[method] += 1
+            failed = self._random.random() < self.error_rate
+            if failed:
+                self.throttled += 1
+        response = FakeResponse(429 if failed else 200)
+        for hook in self.session.hooks["response"]:
+            hook(response)
+        if failed:
+            raise gspread.exceptions.APIError(response)
+
+
+class FakeWorksheet:
+    def __init__(self, backend: FakeSheetsBackend, title: str, rows: List[List[str]] = None):
+        self.backend = backend
+        self.title = title
+        self.rows: List[List[str]] = rows or []
+        self._lock = threading.Lock()
+
+    def _values(self, rows: List[List[str]]) -> List[List[str]]:
+        return gspread.utils.fill_gaps([list(row) for row in rows])
+
+    def get_all_values(self) -> List[List[str]]:
+        self.backend.request("get_all_values")
+        with self._lock:
+            return self._values(self.rows)
+
+    def get_values(self, range_name: str) -> List[List[str]]:
+        self.backend.request("get_values")
+        start_row = int(re.match(r"[A-Z]+(\d+)", range_name).group(1))
+        with self._lock:
+            return self._values(self.rows[start_row - 1:])
+
+    def batch_get(self, ranges: List[str]) -> List[List[List[str]]]:
+        """Только одиночные ячейки вида "A5" — так их читает g_sheets/api.py."""
+        self.backend.request("batch_get")
+        result = []
+        with self._lock:
+            for range_name in ranges:
+                row, col = gspread.utils.a1_to_rowcol(range_name)
+                value = self.rows[row - 1][col - 1] if row <= len(self.rows) and col <= len(self.rows[row - 1]) else ""
+                result.append([[value]] if value else [])
+        return result
+
+    def col_values(self, col: int) -> List[str]:
+        self.backend.request("col_values")
+        with self._lock:
+            return [row[col - 1] if len(row) >= col else "" for row in self.rows]
+
+    def append_row(self, values: list, value_input_option: str = None) -> dict:
+        return self.append_rows([values], value_input_option)
+
+    def append_rows(self, values: List[list], value_input_option: str = None) -> dict:
+        self.backend.request("append_rows")
+        with self._lock:
+            first_row = len(self.rows) + 1
+            self.rows.extend([str(v) for v in row] for row in values)
+            last_row = len(self.rows)
+        return {"updates": {"updatedRange": f"'{self.title}'!A{first_row}:B{last_row}"}}
+
+    def batch_update(self, data: List[dict]):
+        self.backend.request("batch_update")
+        with self._lock:
+            for item in data:
+                row, col = gspread.utils.a1_to_rowcol(item["range"])
+                target = self.rows[row - 1]
+                target.extend([""] * (col - len(target)))
+                target[col - 1] = str(item["values"][0][0])
+
+    def delete_rows(self, row: int):
+        self.backend.request("delete_rows")
+        with self._lock:
+            del self.rows[row - 1]
+
+
+class FakeSpreadsheet:
+    def __init__(self, backend: FakeSheetsBackend):
+        self.backend = backend
+        self.sheets: Dict[str, FakeWorksheet] = {}
+
+    def add_sheet(self, title: str, rows: List[List[str]]) -> FakeWorksheet:
+        """Наполняет таблицу без учета в счетчике запросов (подготовка данных)."""
+        self.sheets[title] = FakeWorksheet(self.backend, title, rows)
+        return self.sheets[title]
+
+    def worksheets(self) -> List[FakeWorksheet]:
+        self.backend.request("worksheets")
+        return list(self.sheets.values())
+
+    def worksheet(self, title: str) -> FakeWorksheet:
+        self.backend.request("worksheet")
+        if title not in self.sheets:
+            raise gspread.WorksheetNotFound(title)
+        return self.sheets[title]
+
+    def add_worksheet(self, title: str, rows: int, cols: int) -> FakeWorksheet:
+        self.backend.request("add_worksheet")
+        return self.add_sheet(title, [])
+
+    def values_batch_get(self, ranges: List[str]) -> dict:
+        self.backend.request("values_batch_get")
+        value_ranges = []
+        for range_name in ranges:
+            title = range_name[1:-1].replace("''", "'") if range_name.startswith("'") else range_name
+            worksheet = self.sheets[title]
+            with worksheet._lock:
+                value_ranges.append({"range": range_name, "values": [list(row) for row in worksheet.rows]})
+        return {"valueRanges": value_ranges}
+
+
+class FakeSheetsClient:
+    """Замена gspread.Client: одна таблица, общая сессия для хуков автомата защиты."""
+
+    def __init__(self, backend: FakeSheetsBackend):
+        self.backend = backend
+        self.session = backend.session
+        self.spreadsheet = FakeSpreadsheet(backend)
+
+    def open_by_key(self, key: str) -> FakeSpreadsheet:
+        self.backend.request("open_by_key")
+        return self.spreadsheet
+
+
+class FakeTelegramAPI:
+    """
+    Локальный сервер с интерфейсом Bot API: /bot<token>/<method>.
+    Отвечает правдоподобными объектами Message, считает вызовы по методам,
+    умеет добавлять задержку и отвечать 429 (retry_after) с заданной вероятностью.
+    """
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, retry_after: int = 1, seed: int = 42):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.calls: Counter = Counter()
+        self.throttled = 0
+        self._random = random.Random(seed)
+        self._message_ids = 0
+        self._runner: Optional[web.AppRunner] = None
+        self.base_url = ""
+
+    def _message(self, params) -> dict:
+        self._message_ids += 1
+        chat_id = params.get("chat_id", "0")
+        try:
+            chat_id = int(chat_id)
+        except ValueError:
+            pass
+        return {
+            "message_id": self._message_ids,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private" if isinstance(chat_id, int) and chat_id > 0 else "group"},
+            "from": {"id": 1, "is_bot": True, "first_name": "bench_bot"},
+            "text": params.get("text") or params.get("caption") or "",
+        }
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        params = await request.post()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.calls[method] += 1
+        if method != "getMe" and self._random.random() < self.error_rate:
+            self.throttled += 1
+            return web.json_response({
+                "ok": False, "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after},
+            }, status=429)
+        if method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "bench_bot", "username": "bench_bot"}
+        elif method in ("sendMessage", "sendPhoto", "editMessageText", "editMessageReplyMarkup"):
+            result = self._message(params)
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://{host}:{port}"
+        return self.base_url
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
@@ -0,0 +1,181 @@
+# utils/fsm_storage.py
+import copy
+import json
+import logging
+import os
+import sqlite3
+import time
+import typing
+from datetime import datetime
+
+from aiogram.dispatcher.storage import BaseStorage
+
+from config import FSM_STORAGE_PATH
+
+_EMPTY_RECORD = {'state': None, 'data': {}, 'bucket': {}}
+
+
+def _encode(value: typing.Any) -> typing.Any:
+    # В данных форм бывают datetime (время начала простоя), JSON их не умеет
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    raise TypeError(f"Тип {type(value).__name__} не сериализуется в JSON")
+
+
+def _decode(obj: dict) -> typing.Any:
+    if len(obj) == 1 and "__datetime__" in obj:
+        return datetime.fromisoformat(obj["__datetime__"])
+    return obj
+
+
+def _dumps(value: dict) -> str:
+    return json.dumps(value, ensure_ascii=False, default=_encode)
+
+
+def _loads(value: str) -> dict:
+    return json.loads(value, object_hook=_decode) if value else {}
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    Хранилище состояний FSM в SQLite, аналог MemoryStorage, который переживает перезапуск.
+    Чтение идет из словаря в памяти, каждое изменение сразу записывается в базу (режим WAL).
+    Брошенные формы удаляются методом cleanup_expired().
+    """
+
+    def __init__(self, path: str = FSM_STORAGE_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS fsm_states (
+                chat       TEXT NOT NULL,
+                user       TEXT NOT NULL,
+                state      TEXT,
+                data       TEXT NOT NULL,
+                bucket     TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (chat, user)
+            );
+            CREATE INDEX IF NOT EXISTS idx_fsm_states_updated_at ON fsm_states (updated_at);
+        """)
+        self.data: typing.Dict[typing.Tuple[str, str], dict] = {}
+        for chat, user, state, data, bucket in self.conn.execute(
+                "SELECT chat, user, state, data, bucket FROM fsm_states"):
+            self.data[(chat, user)] = {'state': state, 'data': _loads(data), 'bucket': _loads(bucket)}
+        if self.data:
+            logging.info(f"[FSM] Восстановлено состояний форм: {len(self.data)}.")
+
+    async def close(self):
+        self.conn.close()
+
+    async def wait_closed(self):
+        pass
+
+    def resolve_address(self, chat, user) -> typing.Tuple[str, str]:
+        chat_id, user_id = map(str, self.check_address(chat=chat, user=user))
+        return chat_id, user_id
+
+    def _get(self, key: typing.Tuple[str, str]) -> dict:
+        return self.data.get(key, _EMPTY_RECORD)
+
+    def _save(self, key: typing.Tuple[str, str], record: dict):
+        """Записывает состояние пользователя; пустое состояние удаляется, как в MemoryStorage._cleanup."""
+        with self.conn:
+            if record == _EMPTY_RECORD:
+                self.data.pop(key, None)
+                self.conn.execute("DELETE FROM fsm_states WHERE chat = ? AND user = ?", key)
+                return
+            self.data[key] = record
+            self.conn.execute(
+                "INSERT OR REPLACE INTO fsm_states (chat, user, state, data, bucket, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (*key, record['state'], _dumps(record['data']), _dumps(record['bucket']), time.time()),
+            )
+
+    async def get_state(self, *,
+                        chat: typing.Union[str, int, None] = None,
+                        user: typing.Union[str, int, None] = None,
+                        default: typing.Optional[str] = None) -> typing.Optional[str]:
+        record = self.data.get(self.resolve_address(chat=chat, user=user))
+        return record['state'] if record else self.resolve_state(default)
+
+    async def get_data(self, *,
+                       chat: typing.Union[str, int, None] = None,
+                       user: typing.Union[str, int, None] = None,
+                       default: typing.Optional[dict] = None) -> typing.Dict:
+        return copy.deepcopy(self._get(self.resolve_address(chat=chat, user=user))['data'])
+
+    async def set_state(self, *,
+                        chat: typing.Union[str, int, None] = None,
+                        user: typing.Union[str, int, None] = None,
+                        state: typing.AnyStr = None):
+        key = self.resolve_address(chat=chat, user=user)
+        self._save(key, {**self._get(key), 'state': self.resolve_state(state)})
+
+    async def set_data(self, *,
+                       chat: typing.Union[str, int, None] = None,
+                       user: typing.Union[str, int, None] = None,
+                       data: typing.Dict = None):
+        key = self.resolve_address(chat=chat, user=user)
+        self._save(key, {**self._get(key), 'data': copy.deepcopy(data or {})})
+
+    async def update_data(self, *,
+                          chat: typing.Union[str, int, None] = None,
+                          user: typing.Union[str, int, None] = None,
+                          data: typing.Dict = None, **kwargs):
+        key = self.resolve_address(chat=chat, user=user)
+        record = self._get(key)
+        new_data = copy.deepcopy(record['data'])
+        new_data.update(data or {}, **kwargs)
+        self._save(key, {**record, 'data': new_data})
+
+    async def reset_state(self, *,
+                          chat: typing.Union[str, int, None] = None,
+                          user: typing.Union[str, int, None] = None,
+                          with_data: typing.Optional[bool] = True):
+        key = self.resolve_address(chat=chat, user=user)
+        record = {**self._get(key), 'state': None}
+        if with_data:
+            record['data'] = {}
+        self._save(key, record)
+
+    def has_bucket(self):
+        return True
+
+    async def get_bucket(self, *,
+                         chat: typing.Union[str, int, None] = None,
+                         user: typing.Union[str, int, None] = None,
+                         default: typing.Optional[dict] = None) -> typing.Dict:
+        return copy.deepcopy(self._get(self.resolve_address(chat=chat, user=user))['bucket'])
+
+    async def set_bucket(self, *,
+                         chat: typing.Union[str, int, None] = None,
+                         user: typing.Union[str, int, None] = None,
+                         bucket: typing.Dict = None):
+        key = self.resolve_address(chat=chat, user=user)
+        self._save(key, {**self._get(key), 'bucket': copy.deepcopy(bucket or {})})
+
+    async def update_bucket(self, *,
+                            chat: typing.Union[str, int, None] = None,
+                            user: typing.Union[str, int, None] = None,
+                            bucket: typing.Dict = None, **kwargs):
+        key = self.resolve_address(chat=chat, user=user)
+        record = self._get(key)
+        new_bucket = copy.deepcopy(record['bucket'])
+        new_bucket.update(bucket or {}, **kwargs)
+        self._save(key, {**record, 'bucket': new_bucket})
+
+    async def cleanup_expired(self, ttl_hours: float):
+        """Удаляет состояния форм, которые не менялись дольше ttl_hours."""
+        cutoff = time.time() - ttl_hours * 3600
+        with self.conn:
+            expired = self.conn.execute(
+                "SELECT chat, user FROM fsm_states WHERE updated_at < ?", (cutoff,)
+            ).fetchall()
+            self.conn.execute("DELETE FROM fsm_states WHERE updated_at < ?", (cutoff,))
+        for key in expired:
+            self.data.pop(tuple(key), None)
+        if expired:
+            logging.info(f"[FSM] Удалено брошенных форм: {len(expired)}.")
@@ -0,0 +1,117 @@
+# g_sheets/gateway.py
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from g_sheets.breaker import SheetsCircuitBreaker
+from utils.metrics import SHEETS_CALL_SECONDS
+from config import SHEETS_EXECUTOR_WORKERS, SHEETS_CALL_TIMEOUT_SECONDS
+
+
+class SheetsGateway:
+    """
+    Асинхронный шлюз к Google Sheets.
+    Все блокирующие вызовы gspread выполняются в ограниченном пуле потоков,
+    чтобы медленный ответ Google не останавливал обработку апдейтов бота.
+    Запросы укладываются в минутный бюджет, а при разомкнутом автомате (breaker)
+    сразу возвращают default, не обращаясь к API.
+    """
+
+    def __init__(self, max_workers: int = SHEETS_EXECUTOR_WORKERS,
+                 timeout: float = SHEETS_CALL_TIMEOUT_SECONDS):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sheets")
+        self._lock = threading.Lock()
+        self.breaker = SheetsCircuitBreaker()
+
+        # Метрики
+        self.queued = 0            # Ждут свободного потока
+        self.in_flight = 0         # Выполняются прямо сейчас
+        self.max_queue_depth = 0
+        self.calls_total = 0
+        self.errors_total = 0
+        self.timeouts_total = 0
+        self.last_call_seconds = 0.0
+
+    async def call(self, func: Callable, *args, timeout: Optional[float] = None,
+                   default: Any = None, **kwargs) -> Any:
+        """
+        Выполняет func(*args, **kwargs) в пуле потоков.
+        При превышении таймаута или разомкнутом автомате возвращает default,
+        исключения func пробрасываются вызывающему.
+        """
+        loop = asyncio.get_running_loop()
+        name = getattr(func, "__name__", repr(func))
+        if not self.breaker.allow():
+            logging.info(f"[SHEETS] Вызов '{name}' пропущен: автомат разомкнут.")
+            return default
+        delay = self.breaker.reserve()
+        if delay:
+            logging.info(f"[SHEETS] Бюджет запросов исчерпан, вызов '{name}' отложен на {delay:.1f} с.")
+            await asyncio.sleep(delay)
+        with self._lock:
+            self.queued += 1
+            self.calls_total += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.queued)
+
+        dequeued = [False]
+
+        def leave_queue():
+            # Вызывается либо из потока при старте, либо при отмене задачи, которая так и не стартовала
+            with self._lock:
+                if not dequeued[0]:
+                    dequeued[0] = True
+                    self.queued -= 1
+
+        def run():
+            leave_queue()
+            with self._lock:
+                self.in_flight += 1
+            started = time.monotonic()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.monotonic() - started
+                SHEETS_CALL_SECONDS.observe(name, elapsed)
+                with self._lock:
+                    self.in_flight -= 1
+                    self.last_call_seconds = elapsed
+
+        future = loop.run_in_executor(self._executor, run)
+        future.add_done_callback(lambda _: leave_queue())
+        try:
+            return await asyncio.wait_for(future, timeout or self.timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self.timeouts_total += 1
+            self.breaker.record_failure("таймаут")
+            logging.error(f"[SHEETS] Таймаут вызова '{name}' ({timeout or self.timeout} с). "
+                          f"В очереди: {self.queued}, выполняется: {self.in_flight}.")
+            return default
+        except Exception:
+            with self._lock:
+                self.errors_total += 1
+            raise
+
+    def metrics(self) -> Dict[str, Any]:
+        """Возвращает текущие метрики шлюза."""
+        with self._lock:
+            metrics = {
+                "queued": self.queued,
+                "in_flight": self.in_flight,
+                "max_queue_depth": self.max_queue_depth,
+                "calls_total": self.calls_total,
+                "errors_total": self.errors_total,
+                "timeouts_total": self.timeouts_total,
+                "last_call_seconds": round(self.last_call_seconds, 3),
+            }
+        metrics.update(self.breaker.metrics())
+        return metrics
+
+    def shutdown(self):
+        """Останавливает пул потоков, не дожидаясь зависших запросов."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
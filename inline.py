@@ -1,9 +1,23 @@
 # keyboards/inline.py
+from typing import Callable, Dict, Hashable
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from utils.storage import DataStorage
 from config import PRODUCTION_SITES, LINES_SECTIONS, DOWNTIME_REASONS, ADMIN_ROLE, EMPLOYEE_ROLE
 
+# Готовые клавиатуры: строятся один раз на версию содержимого.
+# Вызывающий код не должен изменять полученную разметку — она общая.
+_keyboard_cache: Dict[Hashable, InlineKeyboardMarkup] = {}
+
+def _cached_keyboard(key: Hashable, build: Callable[[], InlineKeyboardMarkup]) -> InlineKeyboardMarkup:
+    kb = _keyboard_cache.get(key)
+    if kb is None:
+        kb = _keyboard_cache[key] = build()
+    return kb
+
 def get_sites_keyboard() -> InlineKeyboardMarkup:
+    return _cached_keyboard("sites", _build_sites_keyboard)
+
+def _build_sites_keyboard() -> InlineKeyboardMarkup:
     kb = InlineKeyboardMarkup(row_width=2)
     buttons = [InlineKeyboardButton(text=f"🏭 {v}", callback_data=f"site_{k}") for k, v in PRODUCTION_SITES.items()]
     kb.add(*buttons)
@@ -11,6 +25,9 @@ def get_sites_keyboard() -> InlineKeyboardMarkup:
     return kb
 
 def get_lines_sections_keyboard(site_key: str) -> InlineKeyboardMarkup:
+    return _cached_keyboard(("lines_sections", site_key), lambda: _build_lines_sections_keyboard(site_key))
+
+def _build_lines_sections_keyboard(site_key: str) -> InlineKeyboardMarkup:
     kb = InlineKeyboardMarkup(row_width=2)
     if site_key in LINES_SECTIONS:
         buttons = [InlineKeyboardButton(text=f"➡️ {v}", callback_data=f"ls_{k}") for k, v in LINES_SECTIONS[site_key].items()]
@@ -20,6 +37,9 @@ def get_lines_sections_keyboard(site_key: str) -> InlineKeyboardMarkup:
     return kb
 
 def get_downtime_reasons_keyboard() -> InlineKeyboardMarkup:
+    return _cached_keyboard("downtime_reasons", _build_downtime_reasons_keyboard)
+
+def _build_downtime_reasons_keyboard() -> InlineKeyboardMarkup:
     kb = InlineKeyboardMarkup(row_width=2)
     buttons = [InlineKeyboardButton(text=f"⚙️ {v}", callback_data=f"reason_{k}") for k, v in DOWNTIME_REASONS.items()]
     kb.add(*buttons)
@@ -28,6 +48,14 @@ def get_downtime_reasons_keyboard() -> InlineKeyboardMarkup:
     return kb
 
 def get_responsible_groups_keyboard(storage: DataStorage) -> InlineKeyboardMarkup:
+    key = ("responsible_groups", storage.groups_version)
+    if key not in _keyboard_cache:
+        # Группы перезагрузились: клавиатуры прежних версий больше не нужны
+        for old_key in [k for k in _keyboard_cache if isinstance(k, tuple) and k[0] == "responsible_groups"]:
+            del _keyboard_cache[old_key]
+    return _cached_keyboard(key, lambda: _build_responsible_groups_keyboard(storage))
+
+def _build_responsible_groups_keyboard(storage: DataStorage) -> InlineKeyboardMarkup:
     kb = InlineKeyboardMarkup(row_width=2)
     if storage.responsible_groups:
         buttons = [InlineKeyboardButton(text=f"👥 {v}", callback_data=f"group_{k}") for k, v in storage.responsible_groups.items()]
@@ -37,6 +65,9 @@ def get_responsible_groups_keyboard(storage: DataStorage) -> InlineKeyboardMarku
     return kb
 
 def get_end_downtime_keyboard() -> InlineKeyboardMarkup:
+    return _cached_keyboard("end_downtime", _build_end_downtime_keyboard)
+
+def _build_end_downtime_keyboard() -> InlineKeyboardMarkup:
     kb = InlineKeyboardMarkup(row_width=1)
     kb.add(InlineKeyboardButton(text="✅ Завершить (с доп. комментарием)", callback_data="end_downtime_with_comment"))
     kb.add(InlineKeyboardButton(text="✅ Завершить (без комментария)", callback_data="end_downtime_without_comment"))
@@ -49,11 +80,14 @@ def get_group_work_completion_keyboard(request_id: str) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup().add(InlineKeyboardButton("✅ Завершить работу по заявке", callback_data=f"gw_simple_{request_id}"))
     
 def get_group_send_fail_keyboard() -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(row_width=1).add(
+    return _cached_keyboard("group_send_fail", lambda: InlineKeyboardMarkup(row_width=1).add(
         InlineKeyboardButton(text="➡️ Пропустить выбор группы", callback_data="skip_group_selection")
-    )
+    ))
 
 def get_admin_roles_keyboard() -> InlineKeyboardMarkup:
+    return _cached_keyboard("admin_roles", _build_admin_roles_keyboard)
+
+def _build_admin_roles_keyboard() -> InlineKeyboardMarkup:
     kb = InlineKeyboardMarkup(row_width=2)
     kb.add(InlineKeyboardButton(text=f"👑 {ADMIN_ROLE}", callback_data=f"setrole_{ADMIN_ROLE}"))
     kb.add(InlineKeyboardButton(text=f"👤 {EMPLOYEE_ROLE}", callback_data=f"setrole_{EMPLOYEE_ROLE}"))
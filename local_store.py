@@ -0,0 +1,215 @@
+# utils/local_store.py
+import json
+import logging
+import os
+import sqlite3
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.backends import StorageBackend
+from config import RECORDS_DB_PATH, SEQUENCE_COLUMN
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS downtime_records (
+    id         INTEGER PRIMARY KEY AUTOINCREMENT,
+    seq_number INTEGER,
+    data       TEXT NOT NULL,
+    exported   INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_downtime_records_unexported ON downtime_records (id) WHERE exported = 0;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_downtime_records_seq_number ON downtime_records (seq_number);
+
+CREATE TABLE IF NOT EXISTS user_roles (
+    user_id TEXT PRIMARY KEY,
+    role    TEXT NOT NULL
+);
+
+-- Изменения ролей, еще не записанные в лист (role IS NULL — удаление)
+CREATE TABLE IF NOT EXISTS pending_roles (
+    user_id TEXT PRIMARY KEY,
+    role    TEXT
+);
+
+CREATE TABLE IF NOT EXISTS responsible_groups (
+    key      TEXT PRIMARY KEY,
+    name     TEXT NOT NULL,
+    group_id INTEGER,
+    position INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def _sequence_number(record_data: Dict[str, Any]) -> Optional[int]:
+    value = str(record_data.get(SEQUENCE_COLUMN, "")).strip()
+    return int(value) if value.isdigit() else None
+
+
+def _dumps(record_data: Dict[str, Any]) -> str:
+    return json.dumps(record_data, ensure_ascii=False, default=str)
+
+
+class LocalStore(StorageBackend):
+    """
+    Локальное хранилище бота в SQLite-базе (режим WAL), как StateDB:
+    записи о простоях, роли и ответственные группы. Обработчики пишут в базу напрямую,
+    а Google Таблица получает копию асинхронно: записи о простоях через очередь выгрузки
+    (unexported_records/mark_exported), роли через отложенную запись RoleService.
+    История простоев один раз переносится из таблицы, после этого лист простоев не читается.
+    """
+
+    def __init__(self, path: str = RECORDS_DB_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._drop_duplicate_sequence_numbers()
+        self.conn.executescript(SCHEMA)
+
+    def _drop_duplicate_sequence_numbers(self):
+        """
+        Базы, созданные до уникального индекса по номеру, могли получить повторный перенос истории:
+        из повторов остается первая запись, иначе индекс не создать.
+        """
+        has_table = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'downtime_records'").fetchone()
+        has_index = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_downtime_records_seq_number'").fetchone()
+        if not has_table or has_index:
+            return
+        with self.conn:
+            removed = self.conn.execute(
+                "DELETE FROM downtime_records WHERE seq_number IS NOT NULL AND id NOT IN "
+                "(SELECT MIN(id) FROM downtime_records WHERE seq_number IS NOT NULL GROUP BY seq_number)"
+            ).rowcount
+        if removed:
+            logging.warning(f"[LOCAL] Удалено повторов записей с одинаковым порядковым номером: {removed}.")
+
+    def load_records(self) -> List[Dict[str, Any]]:
+        """Все записи о простоях в порядке добавления."""
+        rows = self.conn.execute("SELECT data FROM downtime_records ORDER BY id").fetchall()
+        return [json.loads(data) for (data,) in rows]
+
+    def add_record(self, record_data: Dict[str, Any]) -> bool:
+        """Сохраняет новую запись (еще не выгруженную в таблицу). False — запись не удалась."""
+        try:
+            with self.conn:
+                self.conn.execute("INSERT INTO downtime_records (seq_number, data, exported) VALUES (?, ?, 0)",
+                                  (_sequence_number(record_data), _dumps(record_data)))
+        except sqlite3.Error as e:
+            logging.error(f"[LOCAL] Не удалось сохранить запись о простое: {e}")
+            return False
+        return True
+
+    def add_records(self, records: List[Dict[str, Any]]) -> bool:
+        """
+        Сохраняет пачку невыгруженных записей одной транзакцией: либо все, либо ни одной.
+        Записи с номером, который уже есть в базе, пропускаются — повторный перенос не создает дублей.
+        """
+        try:
+            with self.conn:
+                self.conn.executemany("INSERT OR IGNORE INTO downtime_records (seq_number, data, exported) VALUES (?, ?, 0)",
+                                      [(_sequence_number(record), _dumps(record)) for record in records])
+        except sqlite3.Error as e:
+            logging.error(f"[LOCAL] Не удалось сохранить записи о простоях: {e}")
+            return False
+        return True
+
+    def reads_records_from_sheet(self) -> bool:
+        return self.needs_initial_import()
+
+    def import_sheet_values(self, all_values: List[List[str]]) -> bool:
+        headers = all_values[0] if all_values else []
+        records = [dict(zip(headers, row)) for row in all_values[1:] if any(str(cell).strip() for cell in row)]
+        imported = self.import_records(records)
+        logging.info(f"[LOCAL] Перенесено из таблицы записей: {imported} из {len(records)}.")
+        return True
+
+    def needs_initial_import(self) -> bool:
+        """True, пока история простоев не перенесена из Google Таблицы."""
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'sheets_imported'").fetchone()
+        return row is None
+
+    def import_records(self, records: List[Dict[str, Any]]) -> int:
+        """
+        Переносит записи, которые уже есть в таблице, и отмечает первичный перенос выполненным.
+        Записи с номером, который уже есть в базе (например, выгруженные до переноса), пропускаются.
+        Возвращает число добавленных записей.
+        """
+        with self.conn:
+            changes_before = self.conn.total_changes
+            self.conn.executemany("INSERT OR IGNORE INTO downtime_records (seq_number, data, exported) VALUES (?, ?, 1)",
+                                  [(_sequence_number(record), _dumps(record)) for record in records])
+            imported = self.conn.total_changes - changes_before
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('sheets_imported', '1')")
+        return imported
+
+    def unexported_records(self) -> List[Dict[str, Any]]:
+        """Записи, еще не выгруженные в таблицу, в порядке добавления."""
+        rows = self.conn.execute("SELECT data FROM downtime_records WHERE exported = 0 ORDER BY id").fetchall()
+        return [json.loads(data) for (data,) in rows]
+
+    def mark_exported(self, count: int):
+        """Отмечает выгруженными count самых старых невыгруженных записей."""
+        with self.conn:
+            self.conn.execute(
+                "UPDATE downtime_records SET exported = 1 WHERE id IN "
+                "(SELECT id FROM downtime_records WHERE exported = 0 ORDER BY id LIMIT ?)", (count,)
+            )
+
+    def max_sequence_number(self) -> int:
+        """Наибольший порядковый номер заявки среди записей (0 — записей нет)."""
+        (value,) = self.conn.execute("SELECT COALESCE(MAX(seq_number), 0) FROM downtime_records").fetchone()
+        return value
+
+    def next_sequence_number(self) -> Optional[int]:
+        # До переноса истории в базе нет номеров из таблицы
+        if self.needs_initial_import():
+            return None
+        return self.max_sequence_number() + 1
+
+    def load_roles(self) -> Dict[str, str]:
+        return dict(self.conn.execute("SELECT user_id, role FROM user_roles").fetchall())
+
+    def save_role(self, user_id: str, role: Optional[str]):
+        with self.conn:
+            if role is None:
+                self.conn.execute("DELETE FROM user_roles WHERE user_id = ?", (user_id,))
+            else:
+                self.conn.execute("INSERT OR REPLACE INTO user_roles (user_id, role) VALUES (?, ?)", (user_id, role))
+            self.conn.execute("INSERT OR REPLACE INTO pending_roles (user_id, role) VALUES (?, ?)", (user_id, role))
+
+    def load_pending_roles(self) -> Dict[str, Optional[str]]:
+        return dict(self.conn.execute("SELECT user_id, role FROM pending_roles").fetchall())
+
+    def clear_pending_role(self, user_id: str, role: Optional[str]):
+        """Снимает изменение с очереди, если оно не успело смениться более новым."""
+        with self.conn:
+            self.conn.execute("DELETE FROM pending_roles WHERE user_id = ? AND role IS ?", (user_id, role))
+
+    def replace_roles(self, roles: Dict[str, str]):
+        with self.conn:
+            self.conn.execute("DELETE FROM user_roles")
+            self.conn.executemany("INSERT INTO user_roles (user_id, role) VALUES (?, ?)", list(roles.items()))
+
+    def load_groups(self) -> Tuple[Dict[str, str], Dict[str, int]]:
+        rows = self.conn.execute("SELECT key, name, group_id FROM responsible_groups ORDER BY position").fetchall()
+        groups = {key: name for key, name, _ in rows}
+        group_ids = {name: group_id for _, name, group_id in rows if group_id is not None}
+        return groups, group_ids
+
+    def replace_groups(self, groups: Dict[str, str], group_ids: Dict[str, int]):
+        with self.conn:
+            self.conn.execute("DELETE FROM responsible_groups")
+            self.conn.executemany(
+                "INSERT INTO responsible_groups (key, name, group_id, position) VALUES (?, ?, ?, ?)",
+                [(key, name, group_ids.get(name), position) for position, (key, name) in enumerate(groups.items())],
+            )
+
+    def close(self):
+        self.conn.close()
+
@@ -2,14 +2,19 @@
 import logging
 import asyncio
 from aiogram import Bot, Dispatcher, executor, types
-from aiogram.contrib.fsm_storage.memory import MemoryStorage
+from aiogram.bot.api import TelegramAPIServer, TELEGRAM_PRODUCTION
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
 import config
 from utils.storage import DataStorage
+from utils.fsm_storage import SQLiteStorage
+from utils.outbox import MessageDispatcher
 from filters.admin_filter import AdminFilter
 from utils.reports import scheduled_line_status_report
-from utils.reminders import check_pending_requests_for_reminders
+from utils.reminders import restore_request_reminders
+from utils.webhook import create_webhook_app, generate_secret_token
+from utils.update_dispatch import ChatOrderedDispatcher
+from utils.metrics import REGISTRY, start_metrics_server
 
 # --- Настройка логирования ---
 logging.basicConfig(
@@ -21,7 +26,7 @@ logger = logging.getLogger(__name__)
 
 # --- Планировщик задач (старый отчет по простоям) ---
 # Новый отчет о статусе линий и напоминания вынесены в свои модули
-async def scheduled_shift_report(bot: Bot, storage: DataStorage, shift_type: str, description: str):
+async def scheduled_shift_report(outbox: MessageDispatcher, storage: DataStorage, shift_type: str, description: str):
     """
     Формирует и рассылает отчеты о простоях по окончании смены.
     """
@@ -33,26 +38,57 @@ async def scheduled_shift_report(bot: Bot, storage: DataStorage, shift_type: str
         return
 
     # Отправка сводки администраторам
-    admin_ids = [uid for uid, role in storage.user_roles.items() if storage.is_admin(uid)]
+    admin_ids = storage.get_admin_ids()
     if admin_ids:
         summary_text = await generate_admin_shift_summary(start_dt, end_dt, storage)
-        for admin_id in admin_ids:
-            try:
-                await bot.send_message(int(admin_id), summary_text, parse_mode=types.ParseMode.MARKDOWN)
-            except Exception as e:
-                logger.error(f"Ошибка отправки сводки админу {admin_id}: {e}")
+        await outbox.broadcast(admin_ids, summary_text, parse_mode=types.ParseMode.MARKDOWN)
 
     # Отправка уведомления в общий чат
     if config.REPORTS_CHAT_IDS:
         report_period_str = f"c {start_dt.strftime('%H:%M %d.%m')} по {end_dt.strftime('%H:%M %d.%m')}"
         message_text = f"Сформирован отчет по простоям за {description.lower()} {report_period_str}"
         sheet_url = f"https://docs.google.com/spreadsheets/d/{config.GOOGLE_SHEET_ID}/"
-        
-        for chat_id in config.REPORTS_CHAT_IDS:
-            try:
-                await bot.send_message(int(chat_id), f"{message_text}\n\n[Открыть таблицу]({sheet_url})", parse_mode=types.ParseMode.MARKDOWN)
-            except Exception as e:
-                logger.error(f"Ошибка отправки отчета в чат {chat_id}: {e}")
+        await outbox.broadcast(config.REPORTS_CHAT_IDS, f"{message_text}\n\n[Открыть таблицу]({sheet_url})",
+                               parse_mode=types.ParseMode.MARKDOWN)
+
+
+# --- Метрики ---
+def register_bot_metrics(dp: Dispatcher):
+    """
+    Показатели для /metrics. Значения берутся из хранилища, очередей и диспетчера в момент запроса;
+    гистограммы обработчиков и вызовов Google Sheets заполняются сами.
+    """
+    storage: DataStorage = dp['storage']
+    outbox: MessageDispatcher = dp['outbox']
+
+    def cache_age():
+        age = storage.cache_age_seconds()
+        return float("nan") if age is None else age
+
+    REGISTRY.gauge("downtime_cache_age_seconds", "Возраст кэша простоев", cache_age)
+    REGISTRY.gauge("downtime_cache_rows", "Строк в кэше простоев",
+                   lambda: len(storage.downtime_cache["data_rows"] or ()))
+    REGISTRY.gauge("pending_requests", "Открытые заявки", lambda: len(storage.pending_requests))
+    REGISTRY.gauge("active_downtimes", "Активные простои", lambda: len(storage.active_downtimes))
+    REGISTRY.gauge("write_queue_pending", "Записи о простоях, еще не выгруженные в таблицу",
+                   lambda: len(storage.write_queue.pending))
+
+    REGISTRY.gauge("outbox_waiting", "Сообщения в очереди на отправку", lambda: outbox.waiting)
+    REGISTRY.counter("outbox_sent_total", "Отправлено сообщений", lambda: outbox.sent_total)
+    REGISTRY.counter("outbox_failed_total", "Не отправлено сообщений", lambda: outbox.failed_total)
+    REGISTRY.counter("telegram_retry_after_total", "Ответы Telegram 429 (RetryAfter)", lambda: outbox.retry_after_total)
+
+    REGISTRY.gauge("sheets_queued", "Вызовы Google Sheets в очереди пула", lambda: storage.sheets.queued)
+    REGISTRY.gauge("sheets_in_flight", "Выполняющиеся вызовы Google Sheets", lambda: storage.sheets.in_flight)
+    REGISTRY.counter("sheets_timeouts_total", "Таймауты вызовов Google Sheets", lambda: storage.sheets.timeouts_total)
+    REGISTRY.counter("sheets_throttled_total", "Ответы Google Sheets 429", lambda: storage.sheets.breaker.throttled_total)
+    REGISTRY.gauge("sheets_breaker_open", "Автомат защиты Google Sheets разомкнут",
+                   lambda: int(storage.sheets.breaker.is_open()))
+
+    if isinstance(dp, ChatOrderedDispatcher):
+        REGISTRY.gauge("updates_backlog", "Апдейты, ждущие обработки", lambda: dp.backlog)
+        REGISTRY.gauge("updates_in_progress", "Апдейты в обработке", lambda: dp.in_progress)
+        REGISTRY.counter("updates_processed_total", "Обработано апдейтов", lambda: dp.processed_total)
 
 
 # --- Жизненный цикл бота ---
@@ -61,45 +97,85 @@ async def on_startup(dp: Dispatcher):
     Выполняется при запуске бота.
     """
     logger.warning("--- ЗАПУСК БОТА ---")
-    bot = dp.bot
+    outbox: MessageDispatcher = dp['outbox']
     
     storage: DataStorage = dp['storage']
     await storage.initialize()
-    if not storage.gspread_client:
+    if not storage.gspread_client and not storage.local_store:
         logger.critical("Не удалось инициализировать gspread клиент. Бот может работать некорректно.")
 
     # Настройка и запуск планировщика
     scheduler = AsyncIOScheduler(timezone=config.SCHEDULER_TIMEZONE)
     
     # 1. Отчеты о простоях по сменам (в 08:05 и 20:05)
-    scheduler.add_job(scheduled_shift_report, 'cron', hour=8, minute=5, args=[bot, storage, 'previous', "Ночная смена"])
-    scheduler.add_job(scheduled_shift_report, 'cron', hour=20, minute=5, args=[bot, storage, 'previous', "Дневная смена"])
+    scheduler.add_job(scheduled_shift_report, 'cron', hour=8, minute=5, args=[outbox, storage, 'previous', "Ночная смена"])
+    scheduler.add_job(scheduled_shift_report, 'cron', hour=20, minute=5, args=[outbox, storage, 'previous', "Дневная смена"])
     
     # 2. Отчет о статусе линий за 5 минут до конца смены (в 07:55 и 19:55)
-    scheduler.add_job(scheduled_line_status_report, 'cron', hour=7, minute=55, args=[bot, storage])
-    scheduler.add_job(scheduled_line_status_report, 'cron', hour=19, minute=55, args=[bot, storage])
+    scheduler.add_job(scheduled_line_status_report, 'cron', hour=7, minute=55, args=[outbox, storage])
+    scheduler.add_job(scheduled_line_status_report, 'cron', hour=19, minute=55, args=[outbox, storage])
     
-    # 3. Проверка "зависших" заявок для напоминаний (каждые 5 минут)
-    scheduler.add_job(check_pending_requests_for_reminders, 'interval', minutes=5, args=[bot, storage])
+    # 3. Напоминания по "зависшим" заявкам: у каждой заявки своя задача на точное время,
+    # обработчики ставят ее при создании и смене статуса, здесь — восстановление после перезапуска
+    restore_request_reminders(scheduler, outbox, storage)
     
     # 4. Технические задачи
-    scheduler.add_job(storage.refresh_downtime_cache, 'interval', seconds=config.CACHE_REFRESH_INTERVAL_SECONDS, args=[bot])
+    scheduler.add_job(storage.refresh_downtime_cache, 'interval', seconds=config.CACHE_REFRESH_INTERVAL_SECONDS, args=[outbox])
+    scheduler.add_job(storage.flush_write_queue, 'interval', seconds=config.WRITE_QUEUE_FLUSH_INTERVAL_SECONDS)
+    scheduler.add_job(storage.flush_role_changes, 'interval', seconds=config.WRITE_QUEUE_FLUSH_INTERVAL_SECONDS)
     scheduler.add_job(storage.initialize, 'interval', hours=6)
+    scheduler.add_job(storage.reload_reference_data, 'interval', minutes=config.REFERENCE_RELOAD_INTERVAL_MINUTES)
+    scheduler.add_job(dp.storage.cleanup_expired, 'interval', minutes=config.FSM_CLEANUP_INTERVAL_MINUTES,
+                      args=[config.FSM_STATE_TTL_HOURS])
     
     scheduler.start()
     dp['scheduler'] = scheduler
     logger.info("Планировщик задач запущен.")
 
+    if config.METRICS_PORT:
+        register_bot_metrics(dp)
+        dp['metrics_runner'] = await start_metrics_server(config.METRICS_HOST, config.METRICS_PORT)
+        if dp['metrics_runner']:
+            logger.info(f"Метрики доступны на http://{config.METRICS_HOST}:{config.METRICS_PORT}/metrics")
+
+
+async def on_startup_webhook(dp: Dispatcher):
+    """
+    Регистрирует вебхук в Telegram. Вызывается после on_startup, когда бот готов принимать апдейты.
+    Накопившиеся за время перезапуска апдейты Telegram доставит сразу после регистрации.
+    """
+    webhook_url = f"{config.WEBHOOK_HOST.rstrip('/')}{config.WEBHOOK_PATH}"
+    await dp.bot.set_webhook(webhook_url, secret_token=dp['webhook_secret'],
+                             drop_pending_updates=config.SKIP_UPDATES_ON_START)
+    logger.info(f"Вебхук зарегистрирован: {webhook_url}")
+
 
 async def on_shutdown(dp: Dispatcher):
     """
     Выполняется при остановке бота.
     """
     logger.warning("--- ОСТАНОВКА БОТА ---")
+    # В режиме вебхука сначала дожидаемся апдейтов, которые еще обрабатываются
+    in_flight = dp.get('in_flight')
+    if in_flight:
+        await in_flight.wait_idle(config.WEBHOOK_DRAIN_TIMEOUT_SECONDS)
+
+    metrics_runner = dp.get('metrics_runner')
+    if metrics_runner:
+        await metrics_runner.cleanup()
+
     scheduler = dp.get('scheduler')
     if scheduler and scheduler.running:
         scheduler.shutdown()
         logger.info("Планировщик остановлен.")
+
+    storage: DataStorage = dp['storage']
+    # Последняя попытка отправить очередь; то, что не ушло, останется в журнале (или локальном хранилище) до следующего запуска
+    await storage.flush_write_queue(force=True)
+    await storage.flush_role_changes()
+    storage.sheets.shutdown()
+    storage.state_db.close()
+    storage.backend.close()
         
     await dp.storage.close()
     await dp.storage.wait_closed()
@@ -114,9 +190,16 @@ def main():
     Главная функция, собирающая и запускающая бота.
     """
     # Инициализация основных объектов
-    bot = Bot(token=config.TELEGRAM_BOT_TOKEN)
-    storage_fsm = MemoryStorage()
-    dp = Dispatcher(bot, storage=storage_fsm)
+    server = TELEGRAM_PRODUCTION
+    if config.TELEGRAM_API_SERVER_URL:
+        server = TelegramAPIServer.from_base(config.TELEGRAM_API_SERVER_URL)
+    bot = Bot(token=config.TELEGRAM_BOT_TOKEN, server=server)
+    # Состояния форм хранятся на диске, чтобы перезапуск не сбрасывал незаконченный ввод
+    storage_fsm = SQLiteStorage()
+    # Апдейты разных чатов обрабатываются параллельно, одного чата — по порядку
+    dp = ChatOrderedDispatcher(bot, storage=storage_fsm)
+    # Все рассылки идут через общую очередь с лимитами Telegram
+    dp['outbox'] = MessageDispatcher(bot)
     
     # Создание и передача хранилища данных через dp
     data_storage = DataStorage()
@@ -136,12 +219,29 @@ def main():
     other_handlers.register_other_handlers(dp)
     
     # Запуск
-    executor.start_polling(
-        dispatcher=dp,
-        skip_updates=True,
-        on_startup=on_startup,
-        on_shutdown=on_shutdown,
-    )
+    if config.BOT_MODE == "webhook":
+        if not config.WEBHOOK_HOST:
+            logger.critical("BOT_MODE=webhook, но не задан WEBHOOK_HOST.")
+            return
+        dp['webhook_secret'] = config.WEBHOOK_SECRET_TOKEN or generate_secret_token()
+        web_app = create_webhook_app(dp, config.WEBHOOK_PATH, dp['webhook_secret'])
+        # Маршрут уже добавлен в web_app, поэтому webhook_path=None; skip_updates не используется —
+        # он удаляет вебхук, пропуск апдейтов делает drop_pending_updates в on_startup_webhook
+        bot_executor = executor.set_webhook(
+            dispatcher=dp,
+            webhook_path=None,
+            on_startup=[on_startup, on_startup_webhook],
+            on_shutdown=on_shutdown,
+            web_app=web_app,
+        )
+        bot_executor.run_app(host=config.WEBAPP_HOST, port=config.WEBAPP_PORT)
+    else:
+        executor.start_polling(
+            dispatcher=dp,
+            skip_updates=config.SKIP_UPDATES_ON_START,
+            on_startup=on_startup,
+            on_shutdown=on_shutdown,
+        )
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,130 @@
+# utils/metrics.py
+import bisect
+import logging
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    parts = []
+    for key, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+        parts.append(f'{key}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value != value:
+        return "NaN"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """
+    Гистограмма длительностей в формате Prometheus, с одной меткой.
+    observe() вызывается и из event loop, и из потоков пула Google Sheets, поэтому под блокировкой.
+    """
+
+    def __init__(self, name: str, help_text: str, label: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = buckets
+        self._series: Dict[str, List] = {}  # значение метки -> [счетчики по корзинам, сумма, количество]
+        self._lock = threading.Lock()
+
+    def observe(self, label_value: str, seconds: float):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [[0] * len(self.buckets), 0.0, 0]
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += seconds
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+        for label_value, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels({self.label: label_value, "le": bound})
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels({self.label: label_value, "le": "+Inf"})
+            lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = _format_labels({self.label: label_value})
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Реестр метрик. Гистограммы заполняются по ходу работы, а счетчики и показатели
+    (возраст кэша, очереди, 429) вычисляются в момент запроса /metrics из уже существующих объектов.
+    """
+
+    def __init__(self):
+        self._histograms: List[Histogram] = []
+        self._values: List[Tuple[str, str, str, Callable[[], float]]] = []
+
+    def histogram(self, name: str, help_text: str, label: str) -> Histogram:
+        histogram = Histogram(name, help_text, label)
+        self._histograms.append(histogram)
+        return histogram
+
+    def gauge(self, name: str, help_text: str, func: Callable[[], float]):
+        self._values.append((name, help_text, "gauge", func))
+
+    def counter(self, name: str, help_text: str, func: Callable[[], float]):
+        self._values.append((name, help_text, "counter", func))
+
+    def render(self) -> str:
+        lines = []
+        for name, help_text, kind, func in self._values:
+            try:
+                value = func()
+            except Exception as e:
+                logging.error(f"[METRICS] Ошибка вычисления метрики {name}: {e}")
+                value = float("nan")
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name} {_format_value(value)}")
+        for histogram in self._histograms:
+            lines.extend(histogram.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+HANDLER_SECONDS = REGISTRY.histogram("bot_handler_seconds", "Время работы обработчика апдейта", "handler")
+SHEETS_CALL_SECONDS = REGISTRY.histogram("sheets_call_seconds", "Время вызова Google Sheets API", "func")
+
+
+async def start_metrics_server(host: str, port: int,
+                               registry: MetricsRegistry = REGISTRY) -> Optional[web.AppRunner]:
+    """Запускает локальный HTTP-сервер с /metrics. Возвращает runner для остановки (None — не запустился)."""
+
+    async def metrics_handler(request: web.Request) -> web.Response:
+        return web.Response(text=registry.render(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", metrics_handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+    except OSError as e:
+        logging.error(f"[METRICS] Не удалось запустить сервер метрик на {host}:{port}: {e}")
+        await runner.cleanup()
+        return None
+    return runner
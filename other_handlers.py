@@ -9,22 +9,16 @@ from config import EMPLOYEE_ROLE, BOT_VERSION
 from keyboards.reply import get_main_keyboard
 from keyboards.inline import get_end_downtime_keyboard, get_group_work_completion_keyboard
 from fsm import DowntimeForm
+from utils.reminders import schedule_request_reminder
 
 async def send_welcome(message: types.Message, state: FSMContext):
     dp = Dispatcher.get_current()
     storage: DataStorage = dp['storage']
     await state.finish()
     user_id = str(message.from_user.id)
-    if user_id not in storage.user_roles:
+    # Роль появляется сразу, в лист она уйдет вместе с остальными регистрациями при ближайшей записи
+    if storage.roles.register(user_id, EMPLOYEE_ROLE):
         logging.info(f"Новый пользователь {user_id}. Авто-регистрация.")
-        try:
-            if storage.user_roles_ws:
-                storage.user_roles_ws.append_row([user_id, EMPLOYEE_ROLE])
-                await storage.load_user_roles()
-            else:
-                logging.error("Лист ролей не доступен для авто-регистрации.")
-        except Exception as e:
-            logging.error(f"Ошибка авто-регистрации пользователя {user_id}: {e}")
     is_admin_user = storage.is_admin(user_id)
     await message.reply(f"Привет, {message.from_user.full_name}!\nЯ бот для сбора данных (Версия: {BOT_VERSION}).", reply_markup=get_main_keyboard(is_admin_user))
 
@@ -53,6 +47,9 @@ async def handle_accept_downtime(cb: types.CallbackQuery):
     request['accepted_by_user_id'] = user.id
     request['accepted_by_user_name'] = user.full_name
     request['acceptance_time_iso'] = datetime.now().isoformat()
+    storage.pending_requests.save(request_id)
+    # Заявка принята — напоминание группе больше не нужно
+    schedule_request_reminder(dp.get('scheduler'), dp['outbox'], storage, request_id)
     
     updated_text = request['group_notification_text'] + f"\n\n✅ **Принята в работу:** {user.full_name}"
 
@@ -104,6 +101,8 @@ async def handle_group_work_complete(cb: types.CallbackQuery):
         
     request['status'] = 'pending_initiator_closure'
     request['group_completion_time'] = datetime.now().isoformat()
+    storage.pending_requests.save(request_id)
+    schedule_request_reminder(dp.get('scheduler'), dp['outbox'], storage, request_id)
     
     initiator_id = request['initiating_user_id']
     initiator_chat_id = request['initiating_user_chat_id']
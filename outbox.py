@@ -0,0 +1,118 @@
+# utils/outbox.py
+import asyncio
+import logging
+import time
+from typing import Dict, Iterable, Optional
+
+from aiogram import Bot, types
+from aiogram.utils.exceptions import RetryAfter
+
+from config import OUTBOX_GLOBAL_RATE_PER_SECOND, OUTBOX_PER_CHAT_RATE_PER_SECOND, OUTBOX_MAX_RETRIES
+
+
+class TokenBucket:
+    """
+    Корзина токенов с резервированием: reserve() сразу забирает токен и возвращает,
+    сколько секунд нужно подождать до отправки. Между await'ами код не прерывается,
+    поэтому блокировка не нужна — очередь образуется из зарезервированных задержек.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def reserve(self) -> float:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        self.tokens -= 1
+        return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+    def pause(self, seconds: float):
+        """Запрещает отправку на seconds секунд (после RetryAfter от Telegram)."""
+        self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+
+class MessageDispatcher:
+    """
+    Единая точка отправки сообщений: общий лимит и лимит на чат, параллельная рассылка,
+    автоматический повтор после RetryAfter, счетчики доставок, ошибок и задержки.
+    """
+
+    def __init__(self, bot: Bot, global_rate: float = OUTBOX_GLOBAL_RATE_PER_SECOND,
+                 per_chat_rate: float = OUTBOX_PER_CHAT_RATE_PER_SECOND, max_retries: int = OUTBOX_MAX_RETRIES):
+        self.bot = bot
+        self.per_chat_rate = per_chat_rate
+        self.max_retries = max_retries
+        self._global_bucket = TokenBucket(global_rate, capacity=global_rate)
+        self._chat_buckets: Dict[str, TokenBucket] = {}
+
+        self.waiting = 0                   # Сообщения, ждущие своей очереди на отправку
+        self.sent_total = 0
+        self.failed_total = 0
+        self.retry_after_total = 0
+        self.latency_total_seconds = 0.0   # От постановки в очередь до доставки
+        self.max_latency_seconds = 0.0
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        key = str(chat_id)
+        bucket = self._chat_buckets.get(key)
+        if bucket is None:
+            bucket = self._chat_buckets[key] = TokenBucket(self.per_chat_rate)
+        return bucket
+
+    async def _wait_turn(self, chat_bucket: TokenBucket):
+        # Сначала очередь чата, затем общая: токен общей корзины берется только когда чат готов
+        delay = chat_bucket.reserve()
+        if delay:
+            await asyncio.sleep(delay)
+        delay = self._global_bucket.reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+    async def send_message(self, chat_id, text: str, **kwargs) -> Optional[types.Message]:
+        """Отправляет сообщение с учетом лимитов. Возвращает Message или None при ошибке."""
+        queued_at = time.monotonic()
+        chat_bucket = self._chat_bucket(chat_id)
+        for attempt in range(self.max_retries + 1):
+            self.waiting += 1
+            try:
+                await self._wait_turn(chat_bucket)
+            finally:
+                self.waiting -= 1
+            try:
+                message = await self.bot.send_message(chat_id, text, **kwargs)
+            except RetryAfter as e:
+                self.retry_after_total += 1
+                logging.warning(f"[OUTBOX] Telegram просит подождать {e.timeout} с перед отправкой в чат {chat_id}.")
+                chat_bucket.pause(e.timeout)
+                continue
+            except Exception as e:
+                self.failed_total += 1
+                logging.error(f"[OUTBOX] Не удалось отправить сообщение в чат {chat_id}: {e}")
+                return None
+            latency = time.monotonic() - queued_at
+            self.sent_total += 1
+            self.latency_total_seconds += latency
+            self.max_latency_seconds = max(self.max_latency_seconds, latency)
+            return message
+        self.failed_total += 1
+        logging.error(f"[OUTBOX] Сообщение в чат {chat_id} не отправлено: исчерпаны повторы после RetryAfter.")
+        return None
+
+    async def broadcast(self, chat_ids: Iterable, text: str, **kwargs) -> int:
+        """Параллельно отправляет одно сообщение в несколько чатов. Возвращает число доставленных."""
+        results = await asyncio.gather(*(self.send_message(int(chat_id), text, **kwargs) for chat_id in chat_ids))
+        return sum(1 for message in results if message is not None)
+
+    def metrics(self) -> dict:
+        return {
+            "waiting": self.waiting,
+            "sent_total": self.sent_total,
+            "failed_total": self.failed_total,
+            "retry_after_total": self.retry_after_total,
+            "avg_latency_seconds": self.latency_total_seconds / self.sent_total if self.sent_total else 0.0,
+            "max_latency_seconds": self.max_latency_seconds,
+        }
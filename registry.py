@@ -0,0 +1,75 @@
+# g_sheets/registry.py
+import logging
+import threading
+from typing import Dict, Optional
+
+import gspread
+from requests.adapters import HTTPAdapter
+
+from g_sheets.api import open_or_create_worksheet
+from config import GOOGLE_SHEET_ID, SHEETS_EXECUTOR_WORKERS
+
+
+def configure_session_pool(gc: gspread.Client, pool_size: int = SHEETS_EXECUTOR_WORKERS):
+    """
+    Настраивает пул соединений авторизованной сессии клиента: keep-alive соединений
+    столько же, сколько потоков шлюза, чтобы параллельные запросы не открывали новые TLS-сессии.
+    """
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    gc.session.mount("https://", adapter)
+
+
+class WorksheetRegistry:
+    """
+    Реестр открытой таблицы и ее листов.
+    open_by_key и список листов запрашиваются один раз, дальше листы берутся из реестра.
+    invalidate() сбрасывает реестр (например, если лист переименовали или удалили).
+    Методы блокирующие — вызываются через SheetsGateway.
+    """
+
+    def __init__(self, gc: Optional[gspread.Client]):
+        self.gc = gc
+        self._spreadsheet: Optional[gspread.Spreadsheet] = None
+        self._worksheets: Dict[str, gspread.Worksheet] = {}
+        self._lock = threading.Lock()
+
+    def _open_spreadsheet(self) -> gspread.Spreadsheet:
+        if self._spreadsheet is None:
+            self._spreadsheet = self.gc.open_by_key(GOOGLE_SHEET_ID)
+            # Один запрос метаданных на все листы сразу
+            self._worksheets = {ws.title: ws for ws in self._spreadsheet.worksheets()}
+            logging.info(f"[GS] Таблица открыта, листов: {len(self._worksheets)}.")
+        return self._spreadsheet
+
+    def worksheet(self, worksheet_name: str, headers_list: list = None) -> Optional[gspread.Worksheet]:
+        """Возвращает лист из реестра; отсутствующий лист создается."""
+        if not self.gc:
+            logging.error("gspread клиент не инициализирован.")
+            return None
+        with self._lock:
+            try:
+                spreadsheet = self._open_spreadsheet()
+                worksheet = self._worksheets.get(worksheet_name)
+                if worksheet is None:
+                    worksheet = open_or_create_worksheet(spreadsheet, worksheet_name, headers_list)
+                    self._worksheets[worksheet_name] = worksheet
+                return worksheet
+            except Exception as e:
+                logging.error(f"Ошибка получения листа '{worksheet_name}': {e}")
+                return None
+
+    def spreadsheet(self) -> Optional[gspread.Spreadsheet]:
+        """Открытая таблица (для запросов сразу к нескольким листам)."""
+        if not self.gc:
+            return None
+        with self._lock:
+            try:
+                return self._open_spreadsheet()
+            except Exception as e:
+                logging.error(f"Ошибка открытия таблицы: {e}")
+                return None
+
+    def invalidate(self):
+        with self._lock:
+            self._spreadsheet = None
+            self._worksheets = {}
@@ -1,85 +1,159 @@
 # utils/reminders.py
 import logging
 from datetime import datetime, timedelta
+from typing import Optional
 
-from aiogram import Bot
 from aiogram.utils.markdown import escape_md
+from apscheduler.jobstores.base import JobLookupError
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
 from utils.storage import DataStorage
+from utils.outbox import MessageDispatcher
 from keyboards.inline import get_end_downtime_keyboard
 
 # --- Константы для напоминаний ---
 GROUP_REMINDER_DELAY_MINUTES = 30  # Через сколько минут напомнить группе о непринятой заявке
 INITIATOR_REMINDER_DELAY_HOURS = 2 # Через сколько часов напомнить инициатору о незакрытой заявке
+REMINDER_RETRY_MINUTES = 5         # Через сколько минут повторить напоминание, которое не удалось отправить
 
-async def check_pending_requests_for_reminders(bot: Bot, storage: DataStorage):
+# Статусы заявок, по которым бывают напоминания
+REMINDER_STATUSES = ("pending_acceptance", "pending_initiator_closure")
+
+
+def _reminder_job_id(request_id: str) -> str:
+    return f"reminder_{request_id}"
+
+
+def _reminder_due_time(request_data: dict) -> Optional[datetime]:
     """
-    Проверяет все активные заявки и отправляет напоминания, если они "зависли".
-    Эта функция будет вызываться планировщиком каждые несколько минут.
+    Момент напоминания по текущему статусу заявки или None, если напоминать не нужно.
+    Времена в заявке хранятся в локальном времени сервера, astimezone() делает их aware.
+    """
+    status = request_data.get("status")
+    if status == "pending_acceptance" and request_data.get("reminders_sent_group", 0) == 0:
+        creation_time_iso = request_data.get("creation_time")
+        if creation_time_iso:
+            return datetime.fromisoformat(creation_time_iso).astimezone() + timedelta(minutes=GROUP_REMINDER_DELAY_MINUTES)
+    elif status == "pending_initiator_closure" and request_data.get("reminders_sent_initiator", 0) == 0:
+        group_completion_time_iso = request_data.get("group_completion_time")
+        if group_completion_time_iso:
+            return datetime.fromisoformat(group_completion_time_iso).astimezone() + timedelta(hours=INITIATOR_REMINDER_DELAY_HOURS)
+    return None
+
+
+def schedule_request_reminder(scheduler: Optional[AsyncIOScheduler], outbox: MessageDispatcher, storage: DataStorage,
+                              request_id: str):
     """
-    logging.info("[REMINDER_CHECK] Запуск проверки заявок для напоминаний...")
-    now = datetime.now()
-    # Копируем ключи, чтобы избежать ошибок при изменении словаря во время итерации
-    request_ids = list(storage.pending_requests.keys())
-    
-    reminders_sent_count = 0
+    Ставит напоминание по заявке на точное время согласно ее текущему статусу.
+    Вызывается при создании заявки и каждой смене статуса: у заявки одна задача,
+    новая заменяет старую, а если напоминание больше не нужно — задача снимается.
+    """
+    if scheduler is None:
+        logging.warning(f"[REMINDER] Планировщик не запущен, напоминание по заявке {request_id} не поставлено.")
+        return
+    request_data = storage.pending_requests.get(request_id)
+    try:
+        run_date = _reminder_due_time(request_data) if request_data else None
+    except ValueError as e:
+        logging.error(f"[REMINDER] Некорректное время в заявке {request_id}: {e}")
+        run_date = None
+    if run_date is None:
+        cancel_request_reminder(scheduler, request_id)
+        return
+    # После перезапуска срок может быть уже в прошлом — тогда напоминание уходит сразу
+    run_date = max(run_date, datetime.now().astimezone())
+    _add_reminder_job(scheduler, outbox, storage, request_id, run_date)
+
+
+def _add_reminder_job(scheduler: AsyncIOScheduler, outbox: MessageDispatcher, storage: DataStorage,
+                      request_id: str, run_date: datetime):
+    scheduler.add_job(send_request_reminder, 'date', run_date=run_date, args=[outbox, storage, request_id, scheduler],
+                      id=_reminder_job_id(request_id), replace_existing=True, misfire_grace_time=None)
+
+
+def _retry_request_reminder(scheduler: Optional[AsyncIOScheduler], outbox: MessageDispatcher, storage: DataStorage,
+                            request_id: str):
+    """Переносит неотправленное напоминание на REMINDER_RETRY_MINUTES, чтобы оно не потерялось."""
+    if scheduler is None:
+        return
+    run_date = datetime.now().astimezone() + timedelta(minutes=REMINDER_RETRY_MINUTES)
+    _add_reminder_job(scheduler, outbox, storage, request_id, run_date)
+    logging.warning(f"[REMINDER] Напоминание по заявке {request_id} не отправлено, повтор в {run_date:%H:%M}.")
+
 
+def cancel_request_reminder(scheduler: Optional[AsyncIOScheduler], request_id: str):
+    """Снимает напоминание по заявке (заявка закрыта или перешла в статус без напоминаний)."""
+    if scheduler is None:
+        return
+    try:
+        scheduler.remove_job(_reminder_job_id(request_id))
+    except JobLookupError:
+        pass
+
+
+def restore_request_reminders(scheduler: AsyncIOScheduler, outbox: MessageDispatcher, storage: DataStorage):
+    """Ставит напоминания по открытым заявкам, восстановленным из базы состояния при запуске."""
+    request_ids = [request_id for status in REMINDER_STATUSES
+                   for request_id in storage.pending_requests.ids_by_status(status)]
     for request_id in request_ids:
-        request_data = storage.pending_requests.get(request_id)
-        if not request_data:
-            continue
-
-        status = request_data.get("status")
-        
-        try:
-            # --- 1. Напоминание для группы о НЕПРИНЯТОЙ заявке ---
-            if status == "pending_acceptance":
-                creation_time = datetime.fromisoformat(request_data.get("creation_time", now.isoformat()))
-                age = now - creation_time
-                
-                if age > timedelta(minutes=GROUP_REMINDER_DELAY_MINUTES) and request_data.get("reminders_sent_group", 0) == 0:
-                    group_id = request_data["responsible_group_id"]
-                    original_msg_id = request_data["group_notification_message_id"]
-                    reminder_text = "⚠️ **Напоминание:** Эта заявка не принята в работу уже более 30 минут!"
-                    
-                    await bot.send_message(
-                        chat_id=group_id,
-                        text=reminder_text,
-                        reply_to_message_id=original_msg_id,
-                        parse_mode="Markdown"
-                    )
-                    request_data["reminders_sent_group"] = 1
-                    reminders_sent_count += 1
-                    logging.info(f"[REMINDER] Отправлено напоминание группе {group_id} по заявке {request_id}")
-
-            # --- 2. Напоминание для инициатора о НЕЗАКРЫТОЙ заявке ---
-            elif status == "pending_initiator_closure":
-                group_completion_time_iso = request_data.get("group_completion_time")
-                if not group_completion_time_iso: continue
-                
-                group_completion_time = datetime.fromisoformat(group_completion_time_iso)
-                age_since_completion = now - group_completion_time
-
-                if age_since_completion > timedelta(hours=INITIATOR_REMINDER_DELAY_HOURS) and request_data.get("reminders_sent_initiator", 0) == 0:
-                    initiator_chat_id = request_data["initiating_user_chat_id"]
-                    reminder_text = (f"⚠️ **Напоминание:**\n\n"
-                                     f"Работа по вашей заявке на линии "
-                                     f"**{escape_md(request_data.get('ls_name', ''))}** "
-                                     f"была завершена ответственной группой более {INITIATOR_REMINDER_DELAY_HOURS} часов назад. "
-                                     f"Пожалуйста, закройте запись о простое, нажав на одну из кнопок ниже.")
-                    
-                    await bot.send_message(
-                        chat_id=initiator_chat_id,
-                        text=reminder_text,
-                        reply_markup=get_end_downtime_keyboard(),
-                        parse_mode="Markdown"
-                    )
-                    request_data["reminders_sent_initiator"] = 1
-                    reminders_sent_count += 1
-                    logging.info(f"[REMINDER] Отправлено напоминание инициатору {initiator_chat_id} по заявке {request_id}")
-
-        except Exception as e:
-            logging.error(f"[REMINDER_CHECK] Ошибка при обработке заявки {request_id}: {e}")
-
-    if reminders_sent_count > 0:
-        logging.info(f"[REMINDER_CHECK] Проверка завершена. Отправлено напоминаний: {reminders_sent_count}.")
\ No newline at end of file
+        schedule_request_reminder(scheduler, outbox, storage, request_id)
+    if request_ids:
+        logging.info(f"[REMINDER] Восстановлено напоминаний: {len(request_ids)}.")
+
+
+async def send_request_reminder(outbox: MessageDispatcher, storage: DataStorage, request_id: str,
+                                scheduler: Optional[AsyncIOScheduler] = None):
+    """
+    Отправляет напоминание по заявке, если она все еще "зависла".
+    Вызывается планировщиком в момент, рассчитанный schedule_request_reminder;
+    если отправка не удалась, напоминание переносится на REMINDER_RETRY_MINUTES.
+    """
+    request_data = storage.pending_requests.get(request_id)
+    if not request_data:
+        return
+
+    status = request_data.get("status")
+
+    try:
+        # --- 1. Напоминание для группы о НЕПРИНЯТОЙ заявке ---
+        if status == "pending_acceptance" and request_data.get("reminders_sent_group", 0) == 0:
+            group_id = request_data["responsible_group_id"]
+            original_msg_id = request_data["group_notification_message_id"]
+            reminder_text = "⚠️ **Напоминание:** Эта заявка не принята в работу уже более 30 минут!"
+
+            if not await outbox.send_message(
+                chat_id=group_id,
+                text=reminder_text,
+                reply_to_message_id=original_msg_id,
+                parse_mode="Markdown"
+            ):
+                _retry_request_reminder(scheduler, outbox, storage, request_id)
+                return
+            request_data["reminders_sent_group"] = 1
+            storage.pending_requests.save(request_id)
+            logging.info(f"[REMINDER] Отправлено напоминание группе {group_id} по заявке {request_id}")
+
+        # --- 2. Напоминание для инициатора о НЕЗАКРЫТОЙ заявке ---
+        elif status == "pending_initiator_closure" and request_data.get("reminders_sent_initiator", 0) == 0:
+            initiator_chat_id = request_data["initiating_user_chat_id"]
+            reminder_text = (f"⚠️ **Напоминание:**\n\n"
+                             f"Работа по вашей заявке на линии "
+                             f"**{escape_md(request_data.get('ls_name', ''))}** "
+                             f"была завершена ответственной группой более {INITIATOR_REMINDER_DELAY_HOURS} часов назад. "
+                             f"Пожалуйста, закройте запись о простое, нажав на одну из кнопок ниже.")
+
+            if not await outbox.send_message(
+                chat_id=initiator_chat_id,
+                text=reminder_text,
+                reply_markup=get_end_downtime_keyboard(),
+                parse_mode="Markdown"
+            ):
+                _retry_request_reminder(scheduler, outbox, storage, request_id)
+                return
+            request_data["reminders_sent_initiator"] = 1
+            storage.pending_requests.save(request_id)
+            logging.info(f"[REMINDER] Отправлено напоминание инициатору {initiator_chat_id} по заявке {request_id}")
+
+    except Exception as e:
+        logging.error(f"[REMINDER] Ошибка при отправке напоминания по заявке {request_id}: {e}")
+        _retry_request_reminder(scheduler, outbox, storage, request_id)
@@ -1,5 +1,4 @@
 # handlers/admin_handlers.py
-import logging
 from datetime import datetime
 from aiogram import Dispatcher, types
 from aiogram.dispatcher import FSMContext
@@ -13,7 +12,7 @@ from fsm import AdminForm, PastDowntimeForm
 from filters.admin_filter import AdminFilter
 from utils.storage import DataStorage
 from config import (
-    USER_ID_COLUMN, USER_ROLE_COLUMN, SCHEDULER_TIMEZONE, 
+    SCHEDULER_TIMEZONE, 
     PRODUCTION_SITES, DOWNTIME_REASONS, LINES_SECTIONS
 )
 
@@ -28,12 +27,13 @@ from keyboards.inline import (
 
 # Reports & G-Sheets API
 from utils.reports import (
-    get_downtime_report_for_period,
+    get_downtime_report_pages,
     get_shift_time_range,
     generate_line_status_report,
+    get_analytics_report,
     calculate_shift_times
 )
-from g_sheets.api import get_worksheet, append_downtime_record, get_next_sequence_number
+from utils.report_render import paginate_text
 
 # --- Управление ролями ---
 async def manage_roles_start(message: types.Message, state: FSMContext):
@@ -59,27 +59,19 @@ async def process_role_choice(cb: types.CallbackQuery, state: FSMContext):
     new_role = cb.data.split('setrole_', 1)[1]
     user_data = await state.get_data()
     target_user_id = user_data.get('target_user_id')
-    if not target_user_id or not storage.gspread_client:
+    if not target_user_id:
         await cb.message.edit_text("❌ Ошибка: Не удалось получить ID пользователя. Попробуйте снова.")
         await state.finish()
         return
-    try:
-        roles_ws = get_worksheet(storage.gspread_client, storage.user_roles_ws.title, [USER_ID_COLUMN, USER_ROLE_COLUMN])
-        cell = roles_ws.find(target_user_id, in_column=1)
-        action_message = ""
-        if new_role == "DELETE":
-            if cell: roles_ws.delete_rows(cell.row)
-            action_message = f"Роль для `{target_user_id}` удалена."
-        else:
-            if cell: roles_ws.update_cell(cell.row, 2, new_role)
-            else: roles_ws.append_row([target_user_id, new_role])
-            action_message = f"Роль для `{target_user_id}` установлена: **{new_role}**."
-        await storage.load_user_roles()
-        await cb.message.edit_text(action_message, parse_mode='Markdown')
-        await cb.answer("Роль успешно обновлена.")
-    except Exception as e:
-        logging.error(f"Ошибка при обновлении роли для {target_user_id}: {e}")
-        await cb.message.edit_text("❌ Произошла непредвиденная ошибка при работе с Google Sheets.")
+    # Роль меняется в памяти сразу, в лист ролей изменение уходит фоновой записью
+    if new_role == "DELETE":
+        storage.roles.delete_role(target_user_id)
+        action_message = f"Роль для `{target_user_id}` удалена."
+    else:
+        storage.roles.set_role(target_user_id, new_role)
+        action_message = f"Роль для `{target_user_id}` установлена: **{new_role}**."
+    await cb.message.edit_text(action_message, parse_mode='Markdown')
+    await cb.answer("Роль успешно обновлена.")
     await state.finish()
 
 async def cancel_admin_input(cb: types.CallbackQuery, state: FSMContext):
@@ -96,13 +88,14 @@ async def send_shift_report(message: types.Message, shift_type: str):
     if not start_dt or not end_dt:
         await message.answer("Не удалось определить временные рамки смены.")
         return
-    report_text = await get_downtime_report_for_period(start_dt, end_dt, storage)
-    max_length = 4096
-    if len(report_text) > max_length:
-        for i in range(0, len(report_text), max_length):
-            await message.answer(report_text[i:i+max_length], parse_mode='Markdown')
-    else:
-        await message.answer(report_text, parse_mode='Markdown')
+    for page in await get_downtime_report_pages(start_dt, end_dt, storage):
+        await message.answer(page, parse_mode='Markdown')
+
+async def send_current_shift_report(message: types.Message):
+    await send_shift_report(message, 'current')
+
+async def send_previous_shift_report(message: types.Message):
+    await send_shift_report(message, 'previous')
 
 async def send_line_status_now(message: types.Message):
     dp = Dispatcher.get_current()
@@ -111,6 +104,29 @@ async def send_line_status_now(message: types.Message):
     report_text = await generate_line_status_report(storage)
     await message.answer(report_text, parse_mode='Markdown')
 
+async def send_analytics_report(message: types.Message):
+    dp = Dispatcher.get_current()
+    storage: DataStorage = dp['storage']
+    usage = ("Использование: `/analytics ДД.ММ.ГГГГ ДД.ММ.ГГГГ [site|line|reason|group]`\n"
+             "Например: `/analytics 01.06.2025 30.06.2025 reason`")
+    args = message.get_args().split()
+    if len(args) < 2:
+        await message.answer(usage, parse_mode='Markdown')
+        return
+    try:
+        start_date = datetime.strptime(args[0], "%d.%m.%Y").date()
+        end_date = datetime.strptime(args[1], "%d.%m.%Y").date()
+    except ValueError:
+        await message.answer("❗️ **Неверный формат даты.**\n" + usage, parse_mode='Markdown')
+        return
+    if end_date < start_date:
+        await message.answer("❗️ Дата окончания не может быть раньше даты начала.")
+        return
+    group_by = args[2].lower() if len(args) > 2 else "site"
+    report_text = await get_analytics_report(start_date, end_date, group_by, storage)
+    for page in paginate_text(report_text):
+        await message.answer(page, parse_mode='Markdown')
+
 # --- Внесение прошедшего простоя ---
 async def start_past_downtime(message: types.Message, state: FSMContext):
     await state.finish()
@@ -220,10 +236,15 @@ async def save_past_downtime(cb: types.CallbackQuery, state: FSMContext):
     user = cb.from_user
     tz = timezone(SCHEDULER_TIMEZONE)
 
+    next_seq_num = await storage.allocate_sequence_number()
+    if next_seq_num is None:
+        # Состояние и кнопка сохранения остаются: запись можно сохранить повторно
+        await cb.answer("❌ Номера заявок еще не сверены с таблицей. Попробуйте через минуту.", show_alert=True)
+        return
+
     async with state.proxy() as data:
         start_time = data.get('start_time')
         shift_start_str, shift_end_str = calculate_shift_times(start_time)
-        next_seq_num = get_next_sequence_number(storage.downtime_ws)
         record_data = {
             "Порядковый номер заявки": next_seq_num,
             "Timestamp_записи": datetime.now(tz).strftime("%Y-%m-%d %H:%M:%S"),
@@ -242,11 +263,10 @@ async def save_past_downtime(cb: types.CallbackQuery, state: FSMContext):
             "Дополнительный_комментарий_инициатора": f"Запись внесена вручную {start_time.strftime('%d.%m %H:%M')} - {data['end_time'].strftime('%d.%m %H:%M')}",
             "ID_Фото": ""
         }
-    if append_downtime_record(storage.downtime_ws, record_data):
-        await storage.refresh_downtime_cache(cb.bot)
+    if storage.queue_downtime_record(record_data):
         await cb.message.edit_text(f"✅ **Запись о прошедшем простое (№{next_seq_num}) успешно сохранена!**", parse_mode='Markdown')
     else:
-        await cb.message.edit_text("❌ Ошибка сохранения в Google Sheets.")
+        await cb.message.edit_text("❌ Ошибка сохранения записи.")
     await state.finish()
     await cb.answer("Сохранено")
 
@@ -255,9 +275,10 @@ def register_admin_handlers(dp: Dispatcher):
     dp.register_message_handler(process_user_for_role, state=AdminForm.choosing_user_for_role)
     dp.register_callback_query_handler(process_role_choice, lambda c: c.data.startswith('setrole_'), state=AdminForm.choosing_role_for_user)
     dp.register_callback_query_handler(cancel_admin_input, text="cancel_admin_role_input", state=AdminForm.all_states)
-    dp.register_message_handler(lambda msg: send_shift_report(msg, 'current'), AdminFilter(), text="📄 Отчет за текущую смену", state="*")
-    dp.register_message_handler(lambda msg: send_shift_report(msg, 'previous'), AdminFilter(), text="📄 Отчет за предыдущую смену", state="*")
+    dp.register_message_handler(send_current_shift_report, AdminFilter(), text="📄 Отчет за текущую смену", state="*")
+    dp.register_message_handler(send_previous_shift_report, AdminFilter(), text="📄 Отчет за предыдущую смену", state="*")
     dp.register_message_handler(send_line_status_now, AdminFilter(), text="🔄 Статус линий", state="*")
+    dp.register_message_handler(send_analytics_report, AdminFilter(), commands=['analytics'], state="*")
     dp.register_message_handler(start_past_downtime, AdminFilter(), text="🗓️ Внести прошедший простой", state="*")
     dp.register_callback_query_handler(past_downtime_site_chosen, lambda c: c.data.startswith('site_'), state=PastDowntimeForm.choosing_site)
     dp.register_callback_query_handler(past_downtime_line_chosen, lambda c: c.data.startswith('ls_'), state=PastDowntimeForm.choosing_line_section)
@@ -0,0 +1,72 @@
+# utils/report_render.py
+from functools import lru_cache
+from typing import List, Tuple
+
+from aiogram.utils.markdown import escape_md
+
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+# Кусок отчета: (разделитель перед куском, текст куска). Кусок не разрезается между страницами,
+# поэтому разметка (**...**, _..._) внутри него всегда остается целой.
+Piece = Tuple[str, str]
+
+
+@lru_cache(maxsize=4096)
+def escape_label(value: str) -> str:
+    """escape_md для часто повторяющихся значений (площадки, линии, причины, группы)."""
+    return escape_md(value)
+
+
+def _split_oversized(text: str, limit: int) -> List[str]:
+    """Делит слишком длинный кусок по строкам; строку длиннее лимита — по лимиту (крайний случай)."""
+    parts, current = [], ""
+    for line in text.split("\n"):
+        while len(line) > limit:
+            if current:
+                parts.append(current)
+                current = ""
+            parts.append(line[:limit])
+            line = line[limit:]
+        if current and len(current) + 1 + len(line) > limit:
+            parts.append(current)
+            current = line
+        else:
+            current = f"{current}\n{line}" if current else line
+    if current:
+        parts.append(current)
+    return parts
+
+
+def paginate(pieces: List[Piece], limit: int = TELEGRAM_MESSAGE_LIMIT) -> List[str]:
+    """
+    Собирает куски в страницы не длиннее limit. Разрыв страницы делается только между кусками,
+    разделитель на месте разрыва отбрасывается. Если все влезает, результат — одна страница,
+    равная простой склейке кусков.
+    """
+    pages: List[str] = []
+    current: List[str] = []
+    current_len = 0
+    for separator, text in pieces:
+        if current and current_len + len(separator) + len(text) <= limit:
+            current.append(separator)
+            current.append(text)
+            current_len += len(separator) + len(text)
+            continue
+        if current:
+            pages.append("".join(current))
+        if len(text) > limit:
+            *full_pages, text = _split_oversized(text, limit)
+            pages.extend(full_pages)
+        current = [text]
+        current_len = len(text)
+    if current:
+        pages.append("".join(current))
+    return pages
+
+
+def paginate_text(text: str, limit: int = TELEGRAM_MESSAGE_LIMIT) -> List[str]:
+    """Разбивает готовый текст на страницы по границам строк."""
+    if len(text) <= limit:
+        return [text]
+    lines = text.split("\n")
+    return paginate([("", lines[0])] + [("\n", line) for line in lines[1:]], limit)
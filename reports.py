@@ -1,149 +1,102 @@
 # utils/reports.py
 import logging
-from datetime import datetime, timedelta, time
+from datetime import date, datetime
 from collections import Counter, defaultdict
-from pytz import timezone
+from typing import Dict, List
 
 from aiogram.utils.markdown import escape_md
-from aiogram import Bot
 
-from config import (SCHEDULER_TIMEZONE, TOP_N_REASONS_FOR_SUMMARY,
-                    PRODUCTION_SITES, LINES_SECTIONS, ADMIN_ROLE)
+from config import (TOP_N_REASONS_FOR_SUMMARY,
+                    PRODUCTION_SITES, LINES_SECTIONS)
 from utils.storage import DataStorage
+from utils.outbox import MessageDispatcher
+from utils.shifts import get_shift_time_range, calculate_shift_times, is_shift_boundary, get_date_range_bounds
+from utils.report_render import escape_label, paginate
 
-def get_shift_time_range(shift_type: str) -> (datetime, datetime):
-    tz = timezone(SCHEDULER_TIMEZONE)
-    now_local = datetime.now(tz)
-    time_08_00 = time(8, 0)
-    time_20_00 = time(20, 0)
+REPORT_COLUMNS = [
+    "Timestamp_записи", "Площадка", "Линия_Секция", "Направление_простоя",
+    "Время_простоя_минут", "Причина_простоя_описание", "Ответственная_группа",
+    "Дополнительный_комментарий_инициатора"
+]
+SUMMARY_COLUMNS = ["Timestamp_записи", "Время_простоя_минут", "Направление_простоя"]
 
-    if time_08_00 <= now_local.time() < time_20_00:
-        current_start = now_local.replace(hour=8, minute=0, second=0, microsecond=0)
-        current_end = now_local.replace(hour=20, minute=0, second=0, microsecond=0)
-    else:
-        if now_local.time() >= time_20_00:
-            current_start = now_local.replace(hour=20, minute=0, second=0, microsecond=0)
-            current_end = (now_local + timedelta(days=1)).replace(hour=8, minute=0, second=0, microsecond=0)
-        else:
-            current_start = (now_local - timedelta(days=1)).replace(hour=20, minute=0, second=0, microsecond=0)
-            current_end = now_local.replace(hour=8, minute=0, second=0, microsecond=0)
-
-    if shift_type == 'current':
-        return current_start, current_end
-    elif shift_type == 'previous':
-        if current_start.time() == time_08_00:
-            prev_end = current_start
-            prev_start = (current_start - timedelta(days=1)).replace(hour=20, minute=0, second=0, microsecond=0)
-        else:
-            prev_end = current_start
-            prev_start = current_start.replace(hour=8, minute=0, second=0, microsecond=0)
-        return prev_start, prev_end
-
-    return None, None
-
-
-def calculate_shift_times(record_datetime: datetime) -> (str, str):
-    tz = timezone(SCHEDULER_TIMEZONE)
-    record_datetime_aware = record_datetime.astimezone(tz) if record_datetime.tzinfo else tz.localize(record_datetime)
-    record_date = record_datetime_aware.date()
-    record_time = record_datetime_aware.time()
-    time_08_00 = time(8, 0)
-    time_20_00 = time(20, 0)
-
-    if time_08_00 <= record_time < time_20_00:
-        start_dt = tz.localize(datetime.combine(record_date, time_08_00))
-        end_dt = tz.localize(datetime.combine(record_date, time_20_00))
-    elif record_time >= time_20_00:
-        start_dt = tz.localize(datetime.combine(record_date, time_20_00))
-        end_dt = tz.localize(datetime.combine(record_date + timedelta(days=1), time_08_00))
-    else:
-        start_dt = tz.localize(datetime.combine(record_date - timedelta(days=1), time_20_00))
-        end_dt = tz.localize(datetime.combine(record_date, time_08_00))
-
-    return start_dt.strftime("%Y-%m-%d %H:%M:%S"), end_dt.strftime("%Y-%m-%d %H:%M:%S")
-
-def _parse_datetime_from_sheet(dt_string: str) -> datetime | None:
-    """Пытается распарсить строку с датой из таблицы, пробуя несколько форматов."""
-    # Список возможных форматов, от наиболее вероятного к менее
-    formats_to_try = [
-        "%Y-%m-%d %H:%M:%S",  # Наш основной формат
-        "%d.%m.%Y %H:%M:%S",  # Распространенный формат в РФ
-        "%Y/%m/%d %H:%M:%S",
-    ]
-    for fmt in formats_to_try:
-        try:
-            return datetime.strptime(dt_string, fmt)
-        except ValueError:
-            continue
-    logging.warning(f"Не удалось распознать формат даты-времени: '{dt_string}'")
+REPORT_PAGES_CACHE_MAX_SIZE = 32
+_report_pages_cache: Dict[tuple, List[str]] = {}
+
+
+def _missing_column(headers: list, required_cols: list) -> str | None:
+    for col in required_cols:
+        if col not in headers:
+            return col
     return None
 
-async def get_downtime_report_for_period(start_dt: datetime, end_dt: datetime, storage: DataStorage):
+async def get_downtime_report_pages(start_dt: datetime, end_dt: datetime, storage: DataStorage) -> List[str]:
+    """
+    Отчет о простоях за период, разбитый на страницы в пределах лимита Telegram.
+    Готовые страницы кэшируются по (период, версия хранилища, состояние кэша),
+    поэтому повторный запрос того же отчета другими администраторами ничего не пересобирает.
+    """
     cache_status = ""
     if storage.downtime_cache.get("error"):
         cache_status += f"\n\n⚠️ **Кэш-ошибка: {storage.downtime_cache['error']}.**"
     if storage.is_cache_stale():
         cache_status += f"\n\n⚠️ **Данные могут быть неактуальны (кэш устарел).**"
+    sheets_status = storage.sheets.breaker.describe()
+    if sheets_status:
+        cache_status += f"\n\n⚠️ **{sheets_status}: {len(storage.write_queue.pending)}.**"
 
     headers = storage.downtime_cache.get("headers")
     data_rows = storage.downtime_cache.get("data_rows")
 
     if not headers or data_rows is None:
-        return f"Нет данных о простоях для анализа.{cache_status}"
-
-    try:
-        required_cols = [
-            "Timestamp_записи", "Площадка", "Линия_Секция", "Направление_простоя",
-            "Время_простоя_минут", "Причина_простоя_описание", "Ответственная_группа",
-            "Дополнительный_комментарий_инициатора"
-        ]
-        idx_map = {col: headers.index(col) for col in required_cols}
-    except ValueError as e:
-        logging.error(f"Отсутствует необходимый столбец в таблице: {e}")
-        return f"Ошибка конфигурации отчета: столбец '{str(e).split()[0]}' не найден в таблице."
+        return [f"Нет данных о простоях для анализа.{cache_status}"]
+
+    missing = _missing_column(headers, REPORT_COLUMNS)
+    if missing:
+        logging.error(f"Отсутствует необходимый столбец в таблице: '{missing}'")
+        return [f"Ошибка конфигурации отчета: столбец '{missing}' не найден в таблице."]
+
+    store = storage.downtime_store
+    cache_key = (start_dt, end_dt, store.version, cache_status)
+    pages = _report_pages_cache.get(cache_key)
+    if pages is not None:
+        return pages
 
     downtimes_by_site = defaultdict(list)
     total_minutes = 0
-    tz = timezone(SCHEDULER_TIMEZONE)
-
-    for row in data_rows:
-        try:
-            if len(row) <= max(idx_map.values()): continue
-            
-            record_timestamp_str = row[idx_map["Timestamp_записи"]]
-            if not record_timestamp_str: continue
-            
-            # Используем новую надежную функцию для парсинга
-            record_dt = _parse_datetime_from_sheet(record_timestamp_str)
-            if not record_dt: continue
-
-            record_dt_aware = tz.localize(record_dt)
-
-            if start_dt <= record_dt_aware < end_dt:
-                site = escape_md(row[idx_map['Площадка']])
-                duration = int(row[idx_map["Время_простоя_минут"]] or 0)
-                total_minutes += duration
-                description = escape_md(row[idx_map["Причина_простоя_описание"]])
-                initiator_comment = escape_md(row[idx_map["Дополнительный_комментарий_инициатора"]])
-                line_info = (f"⚙️ **{escape_md(row[idx_map['Линия_Секция']])}**: "
-                             f"{escape_md(row[idx_map['Направление_простоя']])} ({duration} мин.)\n"
-                             f"   📝 _{description}_\n"
-                             f"   👥 {escape_md(row[idx_map['Ответственная_группа']])}")
-
-                if initiator_comment and "Без доп. комментария" not in initiator_comment:
-                    line_info += f"\n   🗣️ Комментарий инициатора: _{initiator_comment}_"
-                downtimes_by_site[site].append(line_info)
-        except (ValueError, IndexError) as e:
-            logging.warning(f"Пропущена некорректная строка при создании отчета: {row}. Ошибка: {e}")
-            continue
+
+    # Записи отсортированы по времени: берем только окно смены
+    for i in store.window(start_dt, end_dt):
+        duration = store.minutes[i]
+        total_minutes += duration
+        initiator_comment = store.comments[i]
+        line_info = (f"⚙️ **{escape_label(store.lines[i])}**: "
+                     f"{escape_label(store.reasons[i])} ({duration} мин.)\n"
+                     f"   📝 _{escape_md(store.descriptions[i])}_\n"
+                     f"   👥 {escape_label(store.groups[i])}")
+
+        if initiator_comment and "Без доп. комментария" not in initiator_comment:
+            line_info += f"\n   🗣️ Комментарий инициатора: _{escape_md(initiator_comment)}_"
+        downtimes_by_site[escape_label(store.sites[i])].append(line_info)
 
     if not downtimes_by_site:
-        return f"Нет корректных записей за смену с {start_dt.strftime('%H:%M %d.%m')} по {end_dt.strftime('%H:%M %d.%m')}.{cache_status}"
+        return [f"Нет корректных записей за смену с {start_dt.strftime('%H:%M %d.%m')} по {end_dt.strftime('%H:%M %d.%m')}.{cache_status}"]
 
-    report_header = f"**📊 Отчет за смену с {start_dt.strftime('%H:%M %d.%m')} по {end_dt.strftime('%H:%M %d.%m')}**\n"
-    report_lines = ["\n".join(lines) for site, lines in sorted(downtimes_by_site.items())]
-    report_summary = f"\n\n**⏱️ Общее время простоя: {total_minutes} минут.**"
-    return report_header + "\n\n".join(report_lines) + report_summary + cache_status
+    # Страница может закончиться только между записями; площадки отделены пустой строкой
+    pieces = [("", f"**📊 Отчет за смену с {start_dt.strftime('%H:%M %d.%m')} по {end_dt.strftime('%H:%M %d.%m')}**")]
+    for site_number, (site, lines) in enumerate(sorted(downtimes_by_site.items())):
+        for line_number, line_info in enumerate(lines):
+            separator = "\n" if line_number or not site_number else "\n\n"
+            pieces.append((separator, line_info))
+    pieces.append(("\n\n", f"**⏱️ Общее время простоя: {total_minutes} минут.**"))
+    if cache_status:
+        pieces.append(("\n\n", cache_status[2:]))
+
+    pages = paginate(pieces)
+    if len(_report_pages_cache) >= REPORT_PAGES_CACHE_MAX_SIZE:
+        _report_pages_cache.clear()
+    _report_pages_cache[cache_key] = pages
+    return pages
 
 
 async def generate_admin_shift_summary(start_dt: datetime, end_dt: datetime, storage: DataStorage):
@@ -152,33 +105,19 @@ async def generate_admin_shift_summary(start_dt: datetime, end_dt: datetime, sto
 
     if not headers or data_rows is None: return "Нет данных для сводки."
 
-    try:
-        idx_map = {col: headers.index(col) for col in ["Timestamp_записи", "Время_простоя_минут", "Направление_простоя"]}
-    except ValueError as e: return f"Ошибка конфигурации сводки: столбец '{str(e).split()[0]}' не найден."
-    
-    total_minutes = 0
+    missing = _missing_column(headers, SUMMARY_COLUMNS)
+    if missing: return f"Ошибка конфигурации сводки: столбец '{missing}' не найден."
+
+    store = storage.downtime_store
     reason_counts = Counter()
-    tz = timezone(SCHEDULER_TIMEZONE)
-
-    for row in data_rows:
-        try:
-            if len(row) <= max(idx_map.values()): continue
-            record_timestamp_str = row[idx_map["Timestamp_записи"]]
-            if not record_timestamp_str: continue
-            
-            record_dt = _parse_datetime_from_sheet(record_timestamp_str)
-            if not record_dt: continue
-
-            record_dt_aware = tz.localize(record_dt)
-
-            if start_dt <= record_dt_aware < end_dt:
-                duration = int(row[idx_map["Время_простоя_минут"]] or 0)
-                reason = row[idx_map["Направление_простоя"]] or "Не указана"
-                total_minutes += duration
-                reason_counts[reason] += duration
-        except (ValueError, IndexError) as e:
-            logging.warning(f"Пропущена некорректная строка при создании сводки: {row}. Ошибка: {e}")
-            continue
+    if is_shift_boundary(start_dt) and is_shift_boundary(end_dt):
+        # Период состоит из целых смен: берем готовые агрегаты
+        for reason, duration in store.rollup.minutes_by_reason(start_dt, end_dt).items():
+            reason_counts[reason or "Не указана"] += duration
+    else:
+        for i in store.window(start_dt, end_dt):
+            reason_counts[store.reasons[i] or "Не указана"] += store.minutes[i]
+    total_minutes = sum(reason_counts.values())
 
     if total_minutes == 0:
         return f"За смену ({start_dt.strftime('%H:%M')}-{end_dt.strftime('%H:%M')}) простоев не зафиксировано."
@@ -192,6 +131,62 @@ async def generate_admin_shift_summary(start_dt: datetime, end_dt: datetime, sto
     return summary
 
 
+def _line_label(site: str, line: str) -> str:
+    """Подпись линии для аналитики; пустая, если не указаны ни площадка, ни линия."""
+    if not site and not line:
+        return ""
+    return f"{site or 'Не указана'} / {line or 'Не указана'}"
+
+
+# Группировки для аналитики: ключ команды -> (подпись, функция ключа по (площадка, линия, причина, группа))
+ANALYTICS_GROUPINGS = {
+    "site": ("площадкам", lambda key: key[0]),
+    "line": ("линиям", lambda key: _line_label(key[0], key[1])),
+    "reason": ("причинам", lambda key: key[2]),
+    "group": ("группам", lambda key: key[3]),
+}
+
+
+async def get_analytics_report(start_date: date, end_date: date, group_by: str, storage: DataStorage):
+    """
+    Отчет за произвольный период (в днях) с группировкой по площадке, линии, причине или группе.
+    Считается по предагрегированным сменам, без прохода по строкам листа.
+    """
+    if group_by not in ANALYTICS_GROUPINGS:
+        return f"Неизвестная группировка '{escape_md(group_by)}'. Доступно: {', '.join(ANALYTICS_GROUPINGS)}."
+    if not storage.downtime_cache.get("headers"):
+        return "Нет данных о простоях для анализа."
+
+    start_dt, end_dt = get_date_range_bounds(start_date, end_date)
+    grouping_title, key_func = ANALYTICS_GROUPINGS[group_by]
+    rollup = storage.downtime_store.rollup
+
+    minutes_by_group = Counter()
+    counts_by_group = Counter()
+    for _, key, (minutes, count) in rollup.items(start_dt, end_dt):
+        group_name = key_func(key) or "Не указана"
+        minutes_by_group[group_name] += minutes
+        counts_by_group[group_name] += count
+
+    period_str = f"{start_date.strftime('%d.%m.%Y')} - {end_date.strftime('%d.%m.%Y')}"
+    total_minutes = sum(minutes_by_group.values())
+    if total_minutes == 0 and not counts_by_group:
+        return f"За период {period_str} простоев не зафиксировано."
+
+    shifts_count = len(rollup.shifts_between(start_dt, end_dt))
+    hours, minutes = divmod(total_minutes, 60)
+    report_lines = [
+        f"**📈 Простои за {period_str} по {grouping_title}**\n",
+        f"Общий простой: **{hours} ч {minutes} мин.** ({sum(counts_by_group.values())} простоев, "
+        f"смен с простоями: {shifts_count})\n",
+    ]
+    for group_name, group_minutes in minutes_by_group.most_common():
+        share = group_minutes * 100 / total_minutes if total_minutes else 0
+        report_lines.append(f"- {escape_md(group_name)}: {group_minutes} мин. "
+                            f"({counts_by_group[group_name]} шт., {share:.1f}%)")
+    return "\n".join(report_lines)
+
+
 async def generate_line_status_report(storage: DataStorage):
     report_lines = ["**Статус линий на текущий момент:**"]
     for site_key, site_name in PRODUCTION_SITES.items():
@@ -207,16 +202,12 @@ async def generate_line_status_report(storage: DataStorage):
     return "\n".join(report_lines)
 
 
-async def scheduled_line_status_report(bot: Bot, storage: DataStorage):
+async def scheduled_line_status_report(outbox: MessageDispatcher, storage: DataStorage):
     logging.info("SCHEDULER: Запуск задачи на отправку отчета о статусе линий.")
-    admin_ids = [uid for uid, role in storage.user_roles.items() if role == ADMIN_ROLE]
+    admin_ids = storage.get_admin_ids()
     if not admin_ids:
         logging.warning("SCHEDULER: Нет администраторов для отправки отчета о статусе линий.")
         return
     report_text = await generate_line_status_report(storage)
-    for admin_id in admin_ids:
-        try:
-            await bot.send_message(int(admin_id), report_text, parse_mode="Markdown")
-        except Exception as e:
-            logging.error(f"SCHEDULER: Не удалось отправить отчет о статусе линий админу {admin_id}: {e}")
-    logging.info(f"SCHEDULER: Отчет о статусе линий отправлен {len(admin_ids)} администраторам.")
\ No newline at end of file
+    delivered = await outbox.broadcast(admin_ids, report_text, parse_mode="Markdown")
+    logging.info(f"SCHEDULER: Отчет о статусе линий отправлен {delivered} из {len(admin_ids)} администраторов.")
\ No newline at end of file
@@ -0,0 +1,194 @@
+# utils/roles.py
+import asyncio
+import logging
+from typing import Dict, FrozenSet, Optional, Set
+
+import gspread
+
+from g_sheets.api import (load_user_roles_indexed, update_user_role_cells, append_user_roles, delete_user_role_row,
+                          fetch_column_cells)
+from g_sheets.gateway import SheetsGateway
+from utils.backends import SheetsBackend, StorageBackend
+from config import EMPLOYEE_ROLE
+
+_MISSING = object()
+
+
+class RoleService:
+    """
+    Роли пользователей в памяти с отложенной записью в лист ролей.
+    Изменение сразу видно боту, а в таблицу уходит при flush(): изменения одного пользователя
+    схлопываются в последнее, правки известных строк — один batch_update,
+    новые пользователи — один append_rows. Номер строки каждого пользователя хранится
+    в индексе, поэтому поиск ячейки (find) не нужен; перед записью одним batchGet проверяется,
+    что в этих строках все еще те же пользователи (лист могли отсортировать или отредактировать).
+    Каждое изменение сразу сохраняется и в хранилище (backend) вместе с очередью записи в лист:
+    с локальным хранилищем она восстанавливается после перезапуска (load_stored).
+    """
+
+    def __init__(self, backend: Optional[StorageBackend] = None):
+        self.backend = backend or SheetsBackend()
+        self.roles: Dict[str, str] = {}
+        self.users_by_role: Dict[str, Set[str]] = {}
+        self.row_by_user: Dict[str, int] = {}
+        self.role_column = 2
+        self.id_column = 1
+        self.index_stale = False  # Номера строк могли разойтись с листом — перечитать перед записью
+        self._pending: Dict[str, Optional[str]] = {}  # user_id -> новая роль (None — удалить)
+        self._lock = asyncio.Lock()
+
+    def replace(self, roles: Dict[str, str], row_by_user: Dict[str, int], role_column: int, id_column: int = 1):
+        """Подменяет данные прочитанными из листа; еще не записанные изменения накладываются сверху."""
+        self.roles = dict(roles)
+        self.row_by_user = row_by_user
+        self.role_column = role_column
+        self.id_column = id_column
+        self.index_stale = False
+        for user_id, role in self._pending.items():
+            self._apply(user_id, role)
+        users_by_role: Dict[str, Set[str]] = {}
+        for user_id, role in self.roles.items():
+            users_by_role.setdefault(role, set()).add(user_id)
+        self.users_by_role = users_by_role
+        self.backend.replace_roles(self.roles)
+
+    def load_stored(self):
+        """
+        Загружает роли и не записанные в лист изменения из хранилища. Номеров строк
+        листа в нем нет, поэтому перед записью в лист индекс будет перечитан.
+        """
+        roles = self.backend.load_roles()
+        pending = self.backend.load_pending_roles()
+        if not roles and not pending:
+            return
+        self.roles = {}
+        self.users_by_role = {}
+        self.row_by_user = {}
+        for user_id, role in roles.items():
+            self._apply(user_id, role)
+        self._pending.update(pending)
+        if pending:
+            logging.warning(f"[ROLES] Восстановлено не записанных в лист изменений ролей: {len(pending)}.")
+        self.index_stale = True
+
+    async def load_parsed(self, parsed: tuple):
+        """Подменяет данные уже прочитанными (parse_user_roles), дождавшись текущей записи в лист."""
+        async with self._lock:
+            self.replace(*parsed)
+
+    def _apply(self, user_id: str, role: Optional[str]):
+        old_role = self.roles.pop(user_id, None)
+        if old_role is not None:
+            self.users_by_role.get(old_role, set()).discard(user_id)
+        if role is not None:
+            self.roles[user_id] = role
+            self.users_by_role.setdefault(role, set()).add(user_id)
+
+    def get_users_with_role(self, role: str) -> FrozenSet[str]:
+        return frozenset(self.users_by_role.get(role, ()))
+
+    def has_role(self, user_id: str, role: str) -> bool:
+        return str(user_id) in self.users_by_role.get(role, ())
+
+    def set_role(self, user_id: str, role: str):
+        user_id = str(user_id)
+        self._apply(user_id, role)
+        self._pending[user_id] = role
+        self.backend.save_role(user_id, role)
+
+    def delete_role(self, user_id: str):
+        user_id = str(user_id)
+        self._apply(user_id, None)
+        self._pending[user_id] = None
+        self.backend.save_role(user_id, None)
+
+    def register(self, user_id: str, role: str = EMPLOYEE_ROLE) -> bool:
+        """Регистрирует нового пользователя. Возвращает False, если роль у него уже есть."""
+        if str(user_id) in self.roles:
+            return False
+        self.set_role(user_id, role)
+        return True
+
+    def _done(self, user_id: str, role: Optional[str]):
+        # Если роль успели изменить еще раз, пока шла запись, изменение остается в очереди
+        if self._pending.get(user_id, _MISSING) == role:
+            del self._pending[user_id]
+            self.backend.clear_pending_role(user_id, role)
+
+    async def flush(self, sheets: SheetsGateway, worksheet: Optional[gspread.Worksheet]) -> bool:
+        """Записывает накопленные изменения в лист. Возвращает False, если что-то осталось в очереди."""
+        if not self._pending:
+            return True
+        if not worksheet:
+            return False
+        async with self._lock:
+            if self.index_stale and not await self._reindex(sheets, worksheet):
+                return False
+            rows_match = await self._rows_match(sheets, worksheet)
+            if rows_match is None:
+                return False
+            if not rows_match:
+                logging.warning("[ROLES] Строки листа ролей сдвинулись, индекс перечитывается перед записью.")
+                if not await self._reindex(sheets, worksheet):
+                    return False
+
+            batch = dict(self._pending)
+            updates = [(user_id, role) for user_id, role in batch.items()
+                       if role is not None and user_id in self.row_by_user]
+            appends = [(user_id, role) for user_id, role in batch.items()
+                       if role is not None and user_id not in self.row_by_user]
+            deletes = [(user_id, self.row_by_user.get(user_id)) for user_id, role in batch.items() if role is None]
+
+            if updates:
+                if not await sheets.call(update_user_role_cells, worksheet,
+                                         [(self.row_by_user[user_id], role) for user_id, role in updates],
+                                         self.role_column):
+                    return False
+                for user_id, role in updates:
+                    self._done(user_id, role)
+
+            if appends:
+                first_row = await sheets.call(append_user_roles, worksheet, [[user_id, role] for user_id, role in appends])
+                if first_row is None:
+                    return False
+                if first_row:
+                    for offset, (user_id, _) in enumerate(appends):
+                        self.row_by_user[user_id] = first_row + offset
+                else:
+                    self.index_stale = True
+                for user_id, role in appends:
+                    self._done(user_id, role)
+
+            # Удаляем снизу вверх, чтобы номера еще не удаленных строк не сдвигались
+            for user_id, row in sorted(deletes, key=lambda item: item[1] or 0, reverse=True):
+                if row:
+                    if not await sheets.call(delete_user_role_row, worksheet, row):
+                        return False
+                    del self.row_by_user[user_id]
+                    for other_id, other_row in self.row_by_user.items():
+                        if other_row > row:
+                            self.row_by_user[other_id] = other_row - 1
+                self._done(user_id, None)
+
+            logging.info(f"[ROLES] Записано изменений ролей: {len(batch)}.")
+            return not self._pending
+
+    async def _reindex(self, sheets: SheetsGateway, worksheet: gspread.Worksheet) -> bool:
+        result = await sheets.call(load_user_roles_indexed, worksheet)
+        if result is None:
+            return False
+        self.replace(*result)
+        return True
+
+    async def _rows_match(self, sheets: SheetsGateway, worksheet: gspread.Worksheet) -> Optional[bool]:
+        """
+        Проверяет, что в запомненных строках изменяемых и удаляемых пользователей лежат их ID.
+        None — лист прочитать не удалось.
+        """
+        rows = {user_id: self.row_by_user[user_id] for user_id in self._pending if user_id in self.row_by_user}
+        if not rows:
+            return True
+        cells = await sheets.call(fetch_column_cells, worksheet, sorted(set(rows.values())), self.id_column)
+        if cells is None:
+            return None
+        return all(cells.get(row) == user_id for user_id, row in rows.items())
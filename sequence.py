@@ -0,0 +1,55 @@
+# utils/sequence.py
+import json
+import logging
+import os
+
+from config import SEQUENCE_STATE_PATH
+
+
+class SequenceAllocator:
+    """
+    Локальный счетчик "Порядкового номера заявки".
+    Засевается один раз из таблицы, дальше номера выдаются без запросов к Google Sheets.
+    Последнее выданное значение сохраняется на диск, чтобы пережить перезапуск.
+    """
+
+    def __init__(self, path: str = SEQUENCE_STATE_PATH):
+        self.path = path
+        self.last_value = self._load()
+        self.seeded = False
+
+    def _load(self) -> int:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return int(json.load(f).get("last_value", 0))
+        except FileNotFoundError:
+            return 0
+        except (ValueError, OSError) as e:
+            logging.error(f"[SEQ] Не удалось прочитать состояние счетчика '{self.path}': {e}")
+            return 0
+
+    def _save(self):
+        # Пишем во временный файл и атомарно подменяем, чтобы не получить "битый" счетчик при сбое
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"last_value": self.last_value}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def seed(self, next_from_sheet: int):
+        """Согласует счетчик с таблицей: next_from_sheet — следующий свободный номер по столбцу A."""
+        self.last_value = max(self.last_value, next_from_sheet - 1)
+        self._save()
+        self.seeded = True
+        logging.info(f"[SEQ] Счетчик заявок засеян, следующий номер: {self.last_value + 1}.")
+
+    def allocate(self) -> int:
+        """
+        Выдает следующий номер. Метод синхронный и не уступает управление event loop,
+        поэтому два одновременных сохранения не получат одинаковый номер.
+        """
+        self.last_value += 1
+        self._save()
+        return self.last_value
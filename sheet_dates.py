@@ -0,0 +1,121 @@
+# utils/sheet_dates.py
+import logging
+from datetime import datetime, tzinfo
+from typing import Dict, Optional, Tuple
+
+# Форматы, которые встречаются в таблице, от наиболее вероятного к менее
+SHEET_DATETIME_FORMATS = [
+    "%Y-%m-%d %H:%M:%S",  # Наш основной формат
+    "%d.%m.%Y %H:%M:%S",  # Распространенный формат в РФ (автоформат Google)
+    "%Y/%m/%d %H:%M:%S",
+]
+PARSE_CACHE_MAX_SIZE = 200_000
+
+_MISSING = object()
+
+
+def _split_fixed_width(dt_string: str) -> Optional[Tuple[int, ...]]:
+    """
+    Разбирает строку фиксированной ширины на (год, месяц, день, час, минута, секунда) без strptime.
+    Возвращает None, если строка не в одном из форматов SHEET_DATETIME_FORMATS.
+    """
+    if len(dt_string) != 19 or dt_string[10] != " " or dt_string[13] != ":" or dt_string[16] != ":":
+        return None
+    if dt_string[4] in "-/" and dt_string[7] == dt_string[4]:
+        fields = (dt_string[0:4], dt_string[5:7], dt_string[8:10])
+    elif dt_string[2] == "." and dt_string[5] == ".":
+        fields = (dt_string[6:10], dt_string[3:5], dt_string[0:2])
+    else:
+        return None
+    fields += (dt_string[11:13], dt_string[14:16], dt_string[17:19])
+    # int() пропустил бы знак и пробелы ("+024", " 1"), которые strptime не принимает
+    if not "".join(fields).isdigit():
+        return None
+    try:
+        return tuple(int(field) for field in fields)
+    except ValueError:
+        return None
+
+
+class SheetDatetimeParser:
+    """
+    Парсер дат одного столбца таблицы.
+    Запоминает формат, который реально используется в столбце, разбирает строки фиксированной
+    ширины без strptime и кэширует результат по исходной строке (в том числе неудачи,
+    чтобы предупреждение о нераспознанной строке писалось один раз).
+    """
+
+    def __init__(self, tz: Optional[tzinfo] = None, cache_size: int = PARSE_CACHE_MAX_SIZE):
+        self.tz = tz
+        self.cache_size = cache_size
+        self.last_format: Optional[str] = None
+        self.failures = 0
+        self._cache: Dict[str, Optional[datetime]] = {}
+        self._tzinfo_by_day: Dict[Tuple, object] = {}
+        self._tzinfo_by_hour: Dict[Tuple, tzinfo] = {}
+
+    def parse(self, dt_string: str) -> Optional[datetime]:
+        """Возвращает datetime (с часовым поясом, если он задан) или None."""
+        result = self._cache.get(dt_string, _MISSING)
+        if result is not _MISSING:
+            return result
+        result = None
+        parts = _split_fixed_width(dt_string)
+        if parts is not None:
+            try:
+                result = datetime(*parts, tzinfo=self._tzinfo_for(parts) if self.tz is not None else None)
+            except ValueError:
+                result = None
+        if result is None:
+            result = self._parse_naive(dt_string)
+            if result is not None and self.tz is not None:
+                result = result.replace(tzinfo=self._tzinfo_for((result.year, result.month, result.day, result.hour)))
+        if len(self._cache) >= self.cache_size:
+            self._cache.clear()
+        self._cache[dt_string] = result
+        return result
+
+    def _parse_naive(self, dt_string: str) -> Optional[datetime]:
+        formats = SHEET_DATETIME_FORMATS
+        if self.last_format:
+            formats = [self.last_format] + [fmt for fmt in formats if fmt != self.last_format]
+        for fmt in formats:
+            try:
+                result = datetime.strptime(dt_string, fmt)
+            except ValueError:
+                continue
+            self.last_format = fmt
+            return result
+        self.failures += 1
+        logging.warning(f"Не удалось распознать формат даты-времени: '{dt_string}'")
+        return None
+
+    def _tzinfo_for(self, parts: Tuple[int, ...]) -> tzinfo:
+        # tz.localize (pytz) дорогой, а смещение пояса меняется лишь несколько раз за историю,
+        # поэтому tzinfo вычисляется один раз на день (или на час, если в этот день был переход)
+        day_key = parts[:3]
+        tz_for_day = self._tzinfo_by_day.get(day_key)
+        if tz_for_day is None:
+            first = self._localized_tzinfo(datetime(*day_key))
+            last = self._localized_tzinfo(datetime(*day_key, 23, 59, 59))
+            tz_for_day = first if first is last else _MISSING
+            self._tzinfo_by_day[day_key] = tz_for_day
+        if tz_for_day is not _MISSING:
+            return tz_for_day
+        hour_key = parts[:4]
+        tz_for_hour = self._tzinfo_by_hour.get(hour_key)
+        if tz_for_hour is None:
+            tz_for_hour = self._tzinfo_by_hour[hour_key] = self._localized_tzinfo(datetime(*hour_key))
+        return tz_for_hour
+
+    def _localized_tzinfo(self, naive_dt: datetime) -> tzinfo:
+        localize = getattr(self.tz, "localize", None)
+        return localize(naive_dt).tzinfo if localize else self.tz
+
+
+_default_parser = SheetDatetimeParser()
+
+
+def parse_sheet_datetime(dt_string: str) -> datetime | None:
+    """Пытается распарсить строку с датой из таблицы, пробуя несколько форматов."""
+    return _default_parser.parse(dt_string)
@@ -0,0 +1,78 @@
+# utils/shifts.py
+from datetime import date, datetime, timedelta, time
+from pytz import timezone
+
+from config import SCHEDULER_TIMEZONE
+
+def get_shift_time_range(shift_type: str) -> (datetime, datetime):
+    tz = timezone(SCHEDULER_TIMEZONE)
+    now_local = datetime.now(tz)
+    time_08_00 = time(8, 0)
+    time_20_00 = time(20, 0)
+
+    if time_08_00 <= now_local.time() < time_20_00:
+        current_start = now_local.replace(hour=8, minute=0, second=0, microsecond=0)
+        current_end = now_local.replace(hour=20, minute=0, second=0, microsecond=0)
+    else:
+        if now_local.time() >= time_20_00:
+            current_start = now_local.replace(hour=20, minute=0, second=0, microsecond=0)
+            current_end = (now_local + timedelta(days=1)).replace(hour=8, minute=0, second=0, microsecond=0)
+        else:
+            current_start = (now_local - timedelta(days=1)).replace(hour=20, minute=0, second=0, microsecond=0)
+            current_end = now_local.replace(hour=8, minute=0, second=0, microsecond=0)
+
+    if shift_type == 'current':
+        return current_start, current_end
+    elif shift_type == 'previous':
+        if current_start.time() == time_08_00:
+            prev_end = current_start
+            prev_start = (current_start - timedelta(days=1)).replace(hour=20, minute=0, second=0, microsecond=0)
+        else:
+            prev_end = current_start
+            prev_start = current_start.replace(hour=8, minute=0, second=0, microsecond=0)
+        return prev_start, prev_end
+
+    return None, None
+
+
+def calculate_shift_bounds(record_datetime: datetime) -> (datetime, datetime):
+    """Начало и конец смены (08:00-20:00 или 20:00-08:00), в которую попадает момент времени."""
+    tz = timezone(SCHEDULER_TIMEZONE)
+    record_datetime_aware = record_datetime.astimezone(tz) if record_datetime.tzinfo else tz.localize(record_datetime)
+    record_date = record_datetime_aware.date()
+    record_time = record_datetime_aware.time()
+    time_08_00 = time(8, 0)
+    time_20_00 = time(20, 0)
+
+    if time_08_00 <= record_time < time_20_00:
+        start_dt = tz.localize(datetime.combine(record_date, time_08_00))
+        end_dt = tz.localize(datetime.combine(record_date, time_20_00))
+    elif record_time >= time_20_00:
+        start_dt = tz.localize(datetime.combine(record_date, time_20_00))
+        end_dt = tz.localize(datetime.combine(record_date + timedelta(days=1), time_08_00))
+    else:
+        start_dt = tz.localize(datetime.combine(record_date - timedelta(days=1), time_20_00))
+        end_dt = tz.localize(datetime.combine(record_date, time_08_00))
+
+    return start_dt, end_dt
+
+
+def calculate_shift_times(record_datetime: datetime) -> (str, str):
+    start_dt, end_dt = calculate_shift_bounds(record_datetime)
+    return start_dt.strftime("%Y-%m-%d %H:%M:%S"), end_dt.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def is_shift_boundary(dt: datetime) -> bool:
+    """Проверяет, что момент времени совпадает с началом смены."""
+    return calculate_shift_bounds(dt)[0] == dt
+
+
+def get_date_range_bounds(start_date: date, end_date: date) -> (datetime, datetime):
+    """
+    Границы периода из целых производственных суток: с 08:00 start_date
+    до 08:00 дня, следующего за end_date (ночная смена относится к дню своего начала).
+    """
+    tz = timezone(SCHEDULER_TIMEZONE)
+    start_dt = tz.localize(datetime.combine(start_date, time(8, 0)))
+    end_dt = tz.localize(datetime.combine(end_date + timedelta(days=1), time(8, 0)))
+    return start_dt, end_dt
@@ -0,0 +1,147 @@
+# utils/state_db.py
+import json
+import logging
+import os
+import sqlite3
+from collections.abc import MutableMapping
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Tuple
+
+from config import STATE_DB_PATH
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pending_requests (
+    request_id    TEXT PRIMARY KEY,
+    status        TEXT NOT NULL,
+    creation_time TEXT NOT NULL,
+    data          TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_pending_requests_status ON pending_requests (status);
+CREATE INDEX IF NOT EXISTS idx_pending_requests_creation_time ON pending_requests (creation_time);
+
+CREATE TABLE IF NOT EXISTS active_downtimes (
+    site       TEXT NOT NULL,
+    line       TEXT NOT NULL,
+    reason     TEXT NOT NULL,
+    started_at TEXT NOT NULL,
+    PRIMARY KEY (site, line)
+);
+"""
+
+
+class StateDB:
+    """Локальная SQLite-база (режим WAL) для состояния, которое должно переживать перезапуск бота."""
+
+    def __init__(self, path: str = STATE_DB_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # В режиме WAL NORMAL не теряет целостность при сбое и не делает fsync на каждую транзакцию
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def load_pending_requests(self) -> Dict[str, Dict[str, Any]]:
+        rows = self.conn.execute("SELECT request_id, data FROM pending_requests ORDER BY creation_time").fetchall()
+        return {request_id: json.loads(data) for request_id, data in rows}
+
+    def save_pending_request(self, request_id: str, request: Dict[str, Any]):
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO pending_requests (request_id, status, creation_time, data) VALUES (?, ?, ?, ?)",
+                (request_id, request.get("status", ""), request.get("creation_time", ""),
+                 json.dumps(request, ensure_ascii=False, default=str)),
+            )
+
+    def delete_pending_request(self, request_id: str):
+        with self.conn:
+            self.conn.execute("DELETE FROM pending_requests WHERE request_id = ?", (request_id,))
+
+    def pending_request_ids_by_status(self, status: str) -> List[str]:
+        rows = self.conn.execute(
+            "SELECT request_id FROM pending_requests WHERE status = ? ORDER BY creation_time", (status,)
+        ).fetchall()
+        return [request_id for (request_id,) in rows]
+
+    def load_active_downtimes(self) -> Dict[Tuple[str, str], str]:
+        rows = self.conn.execute("SELECT site, line, reason FROM active_downtimes").fetchall()
+        return {(site, line): reason for site, line, reason in rows}
+
+    def save_active_downtime(self, site: str, line: str, reason: str):
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO active_downtimes (site, line, reason, started_at) VALUES (?, ?, ?, ?)",
+                (site, line, reason, datetime.now().isoformat()),
+            )
+
+    def delete_active_downtime(self, site: str, line: str):
+        with self.conn:
+            self.conn.execute("DELETE FROM active_downtimes WHERE site = ? AND line = ?", (site, line))
+
+    def close(self):
+        self.conn.close()
+
+
+class PendingRequests(MutableMapping):
+    """
+    Словарь заявок с записью в StateDB при каждом изменении.
+    Вложенные словари заявок меняются на месте, поэтому после изменения полей нужно вызвать save().
+    """
+
+    def __init__(self, db: StateDB):
+        self._db = db
+        self._data: Dict[str, Dict[str, Any]] = db.load_pending_requests()
+        if self._data:
+            logging.info(f"[STATE] Восстановлено заявок: {len(self._data)}.")
+
+    def __getitem__(self, request_id: str) -> Dict[str, Any]:
+        return self._data[request_id]
+
+    def __setitem__(self, request_id: str, request: Dict[str, Any]):
+        self._data[request_id] = request
+        self._db.save_pending_request(request_id, request)
+
+    def __delitem__(self, request_id: str):
+        del self._data[request_id]
+        self._db.delete_pending_request(request_id)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._data)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def save(self, request_id: str):
+        """Сохраняет заявку после изменения ее полей."""
+        if request_id in self._data:
+            self._db.save_pending_request(request_id, self._data[request_id])
+
+    def ids_by_status(self, status: str) -> List[str]:
+        return self._db.pending_request_ids_by_status(status)
+
+
+class ActiveDowntimes(MutableMapping):
+    """Активные простои по линиям: (площадка, линия) -> направление простоя, с записью в StateDB."""
+
+    def __init__(self, db: StateDB):
+        self._db = db
+        self._data: Dict[Tuple[str, str], str] = db.load_active_downtimes()
+        if self._data:
+            logging.info(f"[STATE] Восстановлено активных простоев: {len(self._data)}.")
+
+    def __getitem__(self, line_key: Tuple[str, str]) -> str:
+        return self._data[line_key]
+
+    def __setitem__(self, line_key: Tuple[str, str], reason: str):
+        self._data[line_key] = reason
+        self._db.save_active_downtime(line_key[0], line_key[1], reason)
+
+    def __delitem__(self, line_key: Tuple[str, str]):
+        del self._data[line_key]
+        self._db.delete_active_downtime(line_key[0], line_key[1])
+
+    def __iter__(self) -> Iterator[Tuple[str, str]]:
+        return iter(self._data)
+
+    def __len__(self) -> int:
+        return len(self._data)
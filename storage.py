@@ -1,98 +1,437 @@
 # utils/storage.py
+import asyncio
+import hashlib
+import json
 import logging
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
-from aiogram import Bot
+from typing import Optional, Dict, Any, List, FrozenSet
 
 import gspread
-from g_sheets.api import get_gspread_client, get_worksheet, fetch_all_rows, load_user_roles, load_responsible_groups
-from config import (ADMIN_ROLE, DOWNTIME_WORKSHEET_NAME, USER_ROLES_WORKSHEET_NAME, RESPONSIBLE_GROUPS_WORKSHEET_NAME, 
-                    SHEET_HEADERS, CACHE_MAX_AGE_SECONDS)
+from g_sheets.api import (get_gspread_client, fetch_all_rows, fetch_rows_from, fetch_sheets_values,
+                          get_next_sequence_number, next_sequence_number,
+                          parse_user_roles, parse_responsible_groups)
+from g_sheets.gateway import SheetsGateway
+from g_sheets.registry import WorksheetRegistry, configure_session_pool
+from utils.sequence import SequenceAllocator
+from utils.write_queue import DowntimeWriteQueue, LocalStoreWriteQueue
+from utils.backends import StorageBackend, SheetsBackend
+from utils.local_store import LocalStore
+from utils.downtime_store import DowntimeStore
+from utils.state_db import StateDB, PendingRequests, ActiveDowntimes
+from utils.roles import RoleService
+from utils.outbox import MessageDispatcher
+from config import (ADMIN_ROLE, LOCAL_STORE_ENABLED, DOWNTIME_WORKSHEET_NAME, USER_ROLES_WORKSHEET_NAME, RESPONSIBLE_GROUPS_WORKSHEET_NAME, 
+                    SHEET_HEADERS, CACHE_MAX_AGE_SECONDS, USER_ID_COLUMN, USER_ROLE_COLUMN,
+                    GROUP_NAME_COLUMN, GROUP_ID_COLUMN, SEQUENCE_COLUMN)
+
+
+def _pad_row(row: List[str], width: int) -> List[str]:
+    return row + [""] * (width - len(row)) if len(row) < width else row
+
+
+def _row_fingerprint(row: List[str]) -> tuple:
+    """Сравнимое представление строки: пустые ячейки в конце не учитываются."""
+    values = [str(v) for v in row]
+    while values and values[-1] == "":
+        values.pop()
+    return tuple(values)
+
+
+def _values_fingerprint(values: List[List[str]]) -> str:
+    """Хэш значений листа: по нему видно, изменился ли лист с прошлой загрузки."""
+    return hashlib.blake2b(json.dumps(values, ensure_ascii=False).encode("utf-8"), digest_size=16).hexdigest()
+
 
 class DataStorage:
-    def __init__(self):
-        self.gspread_client: Optional[gspread.Client] = get_gspread_client()
+    """
+    Данные бота в памяти: простои, роли, группы, открытые заявки.
+    Где данные хранятся, решает хранилище (backend, см. utils/backends.py). По умолчанию
+    это SheetsBackend: источником данных остается Google Таблица. С локальным хранилищем
+    (LOCAL_STORE=1) данные загружаются из SQLite-базы, новые записи и роли сохраняются в ней,
+    а Google Таблица получает их копию асинхронно (очередь выгрузки, отложенная запись ролей).
+    Роли и группы, измененные в таблице вручную, подтягиваются при reload_reference_data.
+    """
+
+    def __init__(self, gspread_client: Optional[gspread.Client] = None, use_local_store: bool = LOCAL_STORE_ENABLED):
+        # Локальное хранилище (None — источником данных остается Google Таблица)
+        self.local_store: Optional[LocalStore] = LocalStore() if use_local_store else None
+        self.backend: StorageBackend = self.local_store or SheetsBackend()
+        # Все вызовы gspread идут через шлюз, чтобы не блокировать event loop
+        self.sheets = SheetsGateway()
+        # Клиент можно передать явно (например, поддельный в бенчмарках)
+        self.gspread_client: Optional[gspread.Client] = gspread_client or get_gspread_client()
+        if self.gspread_client:
+            configure_session_pool(self.gspread_client)
+            # Автомат защиты видит статусы всех ответов API (429, 5xx)
+            self.sheets.breaker.observe(self.gspread_client.session)
+        # Таблица и листы открываются один раз и переиспользуются
+        self.worksheets = WorksheetRegistry(self.gspread_client)
+        self._announced_breaker_trips = 0
+        self.sequence = SequenceAllocator()
+        self.write_queue = LocalStoreWriteQueue(self.local_store) if self.local_store else DowntimeWriteQueue()
         self.downtime_ws: Optional[gspread.Worksheet] = None
         self.user_roles_ws: Optional[gspread.Worksheet] = None
         self.groups_ws: Optional[gspread.Worksheet] = None
         
-        self.user_roles: Dict[str, str] = {}
+        # Роли с индексом роль -> user_id и отложенной записью изменений в лист
+        self.roles = RoleService(self.backend)
         self.responsible_groups: Dict[str, str] = {}
         self.group_ids: Dict[str, int] = {}
-        self.pending_requests: Dict[str, Dict[str, Any]] = {}
+        self.groups_version = 0  # Растет при изменении списка групп (ключ кэша клавиатур)
+        # Хэши последних загруженных листов ролей и групп: неизменившийся лист не разбирается заново
+        self._reference_fingerprints: Dict[str, str] = {}
+        # Открытые заявки и активные простои хранятся в SQLite и переживают перезапуск
+        self.state_db = StateDB()
+        self.pending_requests: PendingRequests = PendingRequests(self.state_db)
 
-        self.downtime_cache: Dict[str, Any] = {"timestamp": None, "headers": None, "data_rows": None, "error": None}
-        
-        # <<<< ИСПРАВЛЕНИЕ: Добавлена недостающая строка >>>>
-        self.active_downtimes: Dict[tuple, str] = {}
+        # synced_rows — сколько строк кэша подтверждено чтением из таблицы; строки после них добавлены локально
+        self.downtime_cache: Dict[str, Any] = {"timestamp": None, "headers": None, "data_rows": None,
+                                               "synced_rows": 0, "error": None}
+        # Типизированное представление того же кэша для отчетов
+        self.downtime_store: DowntimeStore = DowntimeStore()
+        # Записи, добавленные в кэш, пока новое хранилище строится в фоне: свой список у каждой идущей сборки
+        self._records_during_rebuild: List[List[Dict[str, Any]]] = []
+        self.active_downtimes: ActiveDowntimes = ActiveDowntimes(self.state_db)
+
+    @property
+    def user_roles(self) -> Dict[str, str]:
+        return self.roles.roles
 
     def is_admin(self, user_id: str) -> bool:
         """Проверяет, является ли пользователь администратором."""
-        return self.user_roles.get(str(user_id)) == ADMIN_ROLE
+        return self.roles.has_role(user_id, ADMIN_ROLE)
+
+    def get_users_with_role(self, role: str) -> FrozenSet[str]:
+        return self.roles.get_users_with_role(role)
+
+    def get_admin_ids(self) -> FrozenSet[str]:
+        """ID администраторов для рассылок."""
+        return self.get_users_with_role(ADMIN_ROLE)
 
     async def initialize(self):
         """Инициализирует все соединения и загружает начальные данные."""
         logging.info("--- [STORAGE] Инициализация хранилища... ---")
+        if self.downtime_cache["headers"] is None:
+            await self._load_stored_data()
         if not self.gspread_client:
-            logging.critical("[STORAGE] gspread клиент не создан. Работа с таблицами невозможна.")
+            if self.downtime_cache["headers"] is not None:
+                logging.error("[STORAGE] gspread клиент не создан. Бот работает с локальным хранилищем, "
+                              "выгрузка в Google Таблицу отключена.")
+            else:
+                logging.critical("[STORAGE] gspread клиент не создан. Работа с таблицами невозможна.")
             return
 
-        self.downtime_ws = get_worksheet(self.gspread_client, DOWNTIME_WORKSHEET_NAME, SHEET_HEADERS)
-        self.user_roles_ws = get_worksheet(self.gspread_client, USER_ROLES_WORKSHEET_NAME)
-        self.groups_ws = get_worksheet(self.gspread_client, RESPONSIBLE_GROUPS_WORKSHEET_NAME)
+        # При повторной инициализации во время сбоя API остаются ранее открытые листы
+        self.downtime_ws = await self.sheets.call(self.worksheets.worksheet, DOWNTIME_WORKSHEET_NAME,
+                                                  SHEET_HEADERS) or self.downtime_ws
+        self.user_roles_ws = await self.sheets.call(self.worksheets.worksheet, USER_ROLES_WORKSHEET_NAME,
+                                                    [USER_ID_COLUMN, USER_ROLE_COLUMN]) or self.user_roles_ws
+        self.groups_ws = await self.sheets.call(self.worksheets.worksheet, RESPONSIBLE_GROUPS_WORKSHEET_NAME,
+                                                [GROUP_NAME_COLUMN, GROUP_ID_COLUMN]) or self.groups_ws
 
-        await self.load_user_roles()
-        await self.load_responsible_groups()
-        await self.refresh_downtime_cache()
+        # Данные листов читаются одним запросом values.batchGet; лист простоев — только если
+        # записи берутся из таблицы (с локальным хранилищем — пока не перенесена история)
+        worksheets = {USER_ROLES_WORKSHEET_NAME: self.user_roles_ws, RESPONSIBLE_GROUPS_WORKSHEET_NAME: self.groups_ws}
+        if self.backend.reads_records_from_sheet():
+            worksheets = {DOWNTIME_WORKSHEET_NAME: self.downtime_ws, **worksheets}
+        spreadsheet = await self.sheets.call(self.worksheets.spreadsheet)
+        values = await self.sheets.call(fetch_sheets_values, spreadsheet, list(worksheets))
+        if values is not None and all(worksheets.values()):
+            *downtime_values, roles_values, groups_values = values
+            await self._apply_roles_values(roles_values)
+            self._apply_groups_values(groups_values)
+            if downtime_values:
+                await self._load_sheet_records(downtime_values[0])
+        else:
+            logging.warning("[STORAGE] Пакетное чтение не удалось, загружаю листы по отдельности.")
+            await self._seed_sequence_from_sheet()
+            await self.load_user_roles()
+            await self.load_responsible_groups()
+            await self.refresh_downtime_cache(full=True)
         logging.info("--- [STORAGE] Инициализация хранилища завершена. ---")
 
+    async def _load_stored_data(self):
+        """Загружает роли, группы и простои, сохраненные в хранилище, — без запросов к Google Sheets."""
+        self.roles.load_stored()
+        self._set_responsible_groups(self.backend.load_groups())
+        await self._load_stored_records()
+
+    async def _load_stored_records(self):
+        records = self.backend.load_records()
+        if records is None:
+            return
+        next_seq_num = self.backend.next_sequence_number()
+        if next_seq_num is not None:
+            self.sequence.seed(next_seq_num)
+        headers = list(SHEET_HEADERS)
+        rows = [[str(record_data.get(h, "")) for h in headers] for record_data in records]
+        await self._load_downtime_values([headers] + rows)
+        # Строки взяты из хранилища, а не из листа: догружать лист по ним нельзя
+        self.downtime_cache["synced_rows"] = 0
+
+    async def _load_sheet_records(self, all_values: List[List[str]]):
+        """
+        Загружает записи, прочитанные из листа простоев. Хранилище, которое держит записи у себя
+        (локальное — один раз, при переносе истории), сохраняет их, и кэш строится по нему.
+        """
+        if not self.sequence.seeded:
+            # Счетчик засевается только по реально прочитанному листу; до этого он не считается засеянным
+            self.sequence.seed(next_sequence_number([row[0] if row else "" for row in all_values]))
+        if self.backend.import_sheet_values(all_values):
+            await self._load_stored_records()
+        else:
+            await self._load_downtime_values(all_values)
+
+    async def _ensure_downtime_ws(self) -> bool:
+        """Открывает лист простоев, если он не открылся при инициализации (например, из-за 429)."""
+        if not self.downtime_ws and self.gspread_client:
+            self.downtime_ws = await self.sheets.call(self.worksheets.worksheet, DOWNTIME_WORKSHEET_NAME, SHEET_HEADERS)
+        return self.downtime_ws is not None
+
+    async def _seed_sequence_from_sheet(self):
+        """Засевает счетчик номеров по столбцу A листа простоев, если он еще не засеян."""
+        if self.sequence.seeded or not await self._ensure_downtime_ws():
+            return
+        next_seq_num = await self.sheets.call(get_next_sequence_number, self.downtime_ws)
+        if next_seq_num is not None:
+            self.sequence.seed(next_seq_num)
+
+    async def allocate_sequence_number(self) -> Optional[int]:
+        """
+        Выдает номер для новой заявки. Если при старте лист простоев прочитать не удалось,
+        счетчик сначала засевается по таблице; пока это не удалось, возвращает None —
+        иначе нумерация началась бы с 1 и совпала бы с уже существующими заявками.
+        """
+        await self._seed_sequence_from_sheet()
+        if not self.sequence.seeded:
+            logging.error("[STORAGE] Порядковые номера еще не сверены с таблицей, номер заявки не выдан.")
+            return None
+        return self.sequence.allocate()
+
     async def load_user_roles(self):
         """Загружает или перезагружает роли пользователей."""
-        if self.gspread_client:
-            self.user_roles = load_user_roles(self.gspread_client)
+        values = await self.sheets.call(fetch_all_rows, self.user_roles_ws)
+        # None означает ошибку или таймаут: оставляем ранее загруженные роли
+        if values is not None:
+            await self._apply_roles_values(values)
 
     async def load_responsible_groups(self):
         """Загружает или перезагружает ответственные группы."""
-        if self.gspread_client:
-            self.responsible_groups, self.group_ids = load_responsible_groups(self.gspread_client)
+        values = await self.sheets.call(fetch_all_rows, self.groups_ws)
+        if values is not None:
+            self._apply_groups_values(values)
+
+    async def reload_reference_data(self):
+        """
+        Частая проверка ролей и групп: оба листа читаются одним batchGet,
+        а разбор и сброс кэшей выполняются только для изменившегося листа.
+        """
+        if not (self.user_roles_ws and self.groups_ws):
+            return
+        spreadsheet = await self.sheets.call(self.worksheets.spreadsheet)
+        values = await self.sheets.call(fetch_sheets_values, spreadsheet,
+                                        [USER_ROLES_WORKSHEET_NAME, RESPONSIBLE_GROUPS_WORKSHEET_NAME])
+        if values is None:
+            return
+        roles_values, groups_values = values
+        await self._apply_roles_values(roles_values)
+        self._apply_groups_values(groups_values)
+
+    def _reference_changed(self, worksheet_name: str, values: List[List[str]]) -> bool:
+        fingerprint = _values_fingerprint(values)
+        if self._reference_fingerprints.get(worksheet_name) == fingerprint:
+            return False
+        self._reference_fingerprints[worksheet_name] = fingerprint
+        return True
 
-    async def refresh_downtime_cache(self, bot: Optional[Bot] = None):
-        """Обновляет кэш данных о простоях из Google Таблицы."""
+    async def _apply_roles_values(self, values: List[List[str]]):
+        if self._reference_changed(USER_ROLES_WORKSHEET_NAME, values):
+            await self.roles.load_parsed(parse_user_roles(values))
+
+    def _apply_groups_values(self, values: List[List[str]]):
+        if self._reference_changed(RESPONSIBLE_GROUPS_WORKSHEET_NAME, values):
+            self._set_responsible_groups(parse_responsible_groups(values))
+            self.backend.replace_groups(self.responsible_groups, self.group_ids)
+
+    def _set_responsible_groups(self, result: tuple):
+        if result != (self.responsible_groups, self.group_ids):
+            self.responsible_groups, self.group_ids = result
+            self.groups_version += 1
+
+    async def refresh_downtime_cache(self, outbox: Optional[MessageDispatcher] = None, full: bool = False):
+        """
+        Обновляет кэш данных о простоях из Google Таблицы.
+        По умолчанию догружает только строки после последней известной; весь лист
+        перечитывается при full=True, пустом кэше или обнаруженном расхождении.
+        Если записи хранятся в самом хранилище (локальное после переноса истории), кэш — его копия,
+        все записи проходят через него, и лист не читается.
+        """
+        if not self.backend.reads_records_from_sheet():
+            self.downtime_cache["timestamp"] = datetime.now()
+            self.downtime_cache["error"] = None
+            await self._announce_breaker_trip(outbox)
+            return
         logging.info("Обновление кэша данных о простоях...")
-        if not self.downtime_ws:
+        if not await self._ensure_downtime_ws():
             self.downtime_cache["error"] = "Worksheet not available"
             logging.error("Лист простоев не доступен для обновления кэша.")
             return
+        if self.sheets.breaker.is_open():
+            # Отчеты работают по имеющемуся кэшу; администраторов предупреждаем один раз на каждое размыкание
+            logging.info("Обновление кэша пропущено: запросы к Google Sheets приостановлены.")
+            await self._announce_breaker_trip(outbox)
+            return
 
         try:
-            all_values = fetch_all_rows(self.downtime_ws)
-            current_time = datetime.now()
-            if all_values is not None:
-                self.downtime_cache["headers"] = all_values[0] if all_values else []
-                self.downtime_cache["data_rows"] = all_values[1:] if len(all_values) > 1 else []
-                self.downtime_cache["timestamp"] = current_time
-                self.downtime_cache["error"] = None
-                logging.info(f"Кэш обновлен: {len(self.downtime_cache['data_rows'])} строк.")
-            else:
-                self.downtime_cache["error"] = "Failed to fetch data"
-                logging.error("Не удалось получить данные для кэша (fetch_all_rows вернул None).")
+            if full or not self.downtime_cache["headers"] or not self.downtime_cache["synced_rows"]:
+                await self._full_cache_refresh()
+            elif not await self._incremental_cache_refresh():
+                logging.warning("Кэш расходится с таблицей. Выполняю полное перечитывание листа.")
+                await self._full_cache_refresh()
 
         except gspread.exceptions.APIError as e:
             self.downtime_cache["error"] = f"API Error: {e.response.status_code}"
             logging.error(f"API ошибка при обновлении кэша: {e}")
-            if e.response.status_code == 429 and bot:
-                admin_ids = [uid for uid, role in self.user_roles.items() if role == ADMIN_ROLE]
-                for admin_id in admin_ids:
-                    try:
-                        await bot.send_message(int(admin_id), "⚠️ Внимание: Достигнут лимит запросов к Google Sheets.")
-                    except Exception as e_notify:
-                        logging.error(f"Не удалось отправить уведомление админу {admin_id}: {e_notify}")
+            if e.response.status_code in (400, 404):
+                # Лист могли удалить или переименовать: при следующей инициализации таблица откроется заново
+                self.worksheets.invalidate()
         except Exception as e:
             self.downtime_cache["error"] = f"Unexpected error: {str(e)}"
             logging.error(f"Неожиданная ошибка при обновлении кэша: {e}", exc_info=True)
-            
+
+    async def _announce_breaker_trip(self, outbox: Optional[MessageDispatcher]):
+        """Предупреждает администраторов о паузе запросов к Google Sheets — один раз на каждое размыкание."""
+        if outbox and self.sheets.breaker.is_open() and self.sheets.breaker.trips > self._announced_breaker_trips:
+            self._announced_breaker_trips = self.sheets.breaker.trips
+            await outbox.broadcast(self.get_admin_ids(), f"⚠️ Внимание: {self.sheets.breaker.describe()}.")
+
+    async def _full_cache_refresh(self):
+        """Перечитывает весь лист простоев."""
+        all_values = await self.sheets.call(fetch_all_rows, self.downtime_ws)
+        if all_values is None:
+            self.downtime_cache["error"] = "Failed to fetch data"
+            logging.error("Не удалось получить данные для кэша (fetch_all_rows вернул None).")
+            return
+        await self._load_sheet_records(all_values)
+
+    async def _load_downtime_values(self, all_values: List[List[str]]):
+        """
+        Пересобирает кэш простоев по всем значениям листа (вместе со строкой заголовков).
+        Хранилище для отчетов строится в пуле потоков (на 100 тыс. строк это секунды),
+        а подменяется целиком, когда готово; до этого отчеты работают по старому.
+        """
+        headers = all_values[0] if all_values else []
+        data_rows = all_values[1:] if len(all_values) > 1 else []
+        added_records: List[Dict[str, Any]] = []
+        self._records_during_rebuild.append(added_records)
+        try:
+            store = await asyncio.get_running_loop().run_in_executor(None, DowntimeStore.from_rows, headers, data_rows)
+        finally:
+            # Сравнение по identity: пустые списки двух одновременных сборок равны между собой
+            self._records_during_rebuild = [records for records in self._records_during_rebuild
+                                            if records is not added_records]
+
+        self.downtime_cache["headers"] = headers
+        self.downtime_cache["data_rows"] = data_rows
+        self.downtime_cache["synced_rows"] = len(data_rows)
+        self.downtime_cache["timestamp"] = datetime.now()
+        self.downtime_cache["error"] = None
+        self.downtime_store = store
+        # Записи из очереди выгрузки и сохраненные во время сборки могли не попасть в прочитанные данные
+        seq_idx = headers.index(SEQUENCE_COLUMN) if SEQUENCE_COLUMN in headers else 0
+        loaded_seq = {row[seq_idx] for row in data_rows if len(row) > seq_idx}
+        for record_data in self.write_queue.pending + added_records:
+            seq_num = str(record_data.get(SEQUENCE_COLUMN, ""))
+            if seq_num not in loaded_seq:
+                loaded_seq.add(seq_num)
+                self.append_to_downtime_cache(record_data)
+        logging.info(f"Кэш обновлен: {len(data_rows)} строк.")
+
+    async def _incremental_cache_refresh(self) -> bool:
+        """
+        Догружает строки, появившиеся после последней синхронизированной.
+        Запрос начинается с последней известной строки: если она не совпадает с кэшем
+        (строки удалены, отсортированы или отредактированы), возвращает False.
+        """
+        headers = self.downtime_cache["headers"]
+        data_rows = self.downtime_cache["data_rows"]
+        synced_rows = self.downtime_cache["synced_rows"]
+
+        # Строка 1 — заголовки, поэтому последняя синхронизированная строка данных лежит в строке synced_rows + 1
+        values = await self.sheets.call(fetch_rows_from, self.downtime_ws, synced_rows + 1, len(headers))
+        if values is None:
+            self.downtime_cache["error"] = "Failed to fetch data"
+            logging.error("Не удалось получить новые строки для кэша (fetch_rows_from вернул None).")
+            return True
+        if not values or _row_fingerprint(values[0]) != _row_fingerprint(data_rows[synced_rows - 1]):
+            return False
+
+        new_rows = [_pad_row(row, len(headers)) for row in values[1:]]
+        # Локально добавленные строки, которых еще нет в таблице, сохраняем в конце кэша
+        local_rows = data_rows[synced_rows:]
+        foreign_rows = new_rows
+        if local_rows and SEQUENCE_COLUMN in headers:
+            seq_idx = headers.index(SEQUENCE_COLUMN)
+            local_seq = {row[seq_idx] for row in local_rows}
+            synced_seq = {row[seq_idx] for row in new_rows}
+            local_rows = [row for row in local_rows if row[seq_idx] not in synced_seq]
+            foreign_rows = [row for row in new_rows if row[seq_idx] not in local_seq]
+        # Локальные строки в хранилище уже есть, добавляем только чужие (например, внесенные вручную)
+        for row in foreign_rows:
+            self.downtime_store.add_row(row)
+
+        self.downtime_cache["data_rows"] = data_rows[:synced_rows] + new_rows + local_rows
+        self.downtime_cache["synced_rows"] = synced_rows + len(new_rows)
+        self.downtime_cache["timestamp"] = datetime.now()
+        self.downtime_cache["error"] = None
+        logging.info(f"Кэш обновлен инкрементально: +{len(new_rows)} строк, всего {len(self.downtime_cache['data_rows'])}.")
+        return True
+
+    def append_to_downtime_cache(self, record_data: Dict[str, Any]):
+        """Добавляет только что записанную заявку в кэш без повторного чтения листа."""
+        for added_records in self._records_during_rebuild:
+            added_records.append(record_data)
+        headers = self.downtime_cache["headers"]
+        if not headers or self.downtime_cache["data_rows"] is None:
+            return
+        row = [str(record_data.get(h, "")) for h in headers]
+        self.downtime_cache["data_rows"].append(row)
+        self.downtime_store.add_row(row)
+
+    def queue_downtime_record(self, record_data: Dict[str, Any]) -> bool:
+        """
+        Сохраняет запись о простое (в локальное хранилище или журнал), ставит ее в очередь
+        на запись в таблицу и сразу добавляет в кэш.
+        """
+        if not self.sequence.seeded:
+            # Номер мог совпасть с уже существующей в таблице заявкой — запись отклоняется, как при сбое журнала
+            logging.error("[STORAGE] Порядковые номера еще не сверены с таблицей, запись о простое не принята.")
+            return False
+        if not self.write_queue.enqueue(record_data):
+            return False
+        self.append_to_downtime_cache(record_data)
+        return True
+
+    async def flush_write_queue(self, force: bool = False):
+        """
+        Отправляет накопленные записи о простоях в Google Таблицу. Если лист не открылся
+        при инициализации, он открывается здесь — с той же задержкой после ошибок, что и отправка.
+        """
+        if self.write_queue.is_due(self.sheets, force):
+            await self._ensure_downtime_ws()
+        await self.write_queue.flush(self.sheets, self.downtime_ws, force=force)
+
+    async def flush_role_changes(self):
+        """Отправляет накопленные изменения ролей в лист ролей."""
+        await self.roles.flush(self.sheets, self.user_roles_ws)
+
+    def cache_age_seconds(self) -> Optional[float]:
+        """Сколько секунд прошло с последнего обновления кэша (None — кэш еще не загружен)."""
+        if not self.downtime_cache["timestamp"]:
+            return None
+        return (datetime.now() - self.downtime_cache["timestamp"]).total_seconds()
+
     def is_cache_stale(self) -> bool:
         """Проверяет, не устарел ли кэш."""
-        if not self.downtime_cache["timestamp"]:
-            return True
-        return (datetime.now() - self.downtime_cache["timestamp"]).total_seconds() > CACHE_MAX_AGE_SECONDS
\ No newline at end of file
+        age = self.cache_age_seconds()
+        return age is None or age > CACHE_MAX_AGE_SECONDS
\ No newline at end of file
@@ -0,0 +1,106 @@
+# tests/test_breaker.py
+import asyncio
+import time
+
+import gspread
+import pytest
+
+from benchmarks.fakes import FakeResponse
+from g_sheets.breaker import CLOSED, HALF_OPEN, OPEN, SheetsCircuitBreaker
+from g_sheets.gateway import SheetsGateway
+
+
+def make_breaker(**kwargs) -> SheetsCircuitBreaker:
+    options = dict(requests_per_minute=60, failure_threshold=3, base_delay=10.0, max_delay=40.0)
+    options.update(kwargs)
+    return SheetsCircuitBreaker(**options)
+
+
+def expire(breaker: SheetsCircuitBreaker):
+    """Пауза после размыкания истекла."""
+    breaker.open_until = time.monotonic() - 1
+
+
+def test_429_trips_immediately():
+    breaker = make_breaker()
+    breaker._on_response(FakeResponse(429))
+    assert breaker.state == OPEN and breaker.is_open()
+    assert breaker.throttled_total == 1
+    assert not breaker.allow() and breaker.rejected_total == 1
+    assert breaker.describe() is not None
+
+
+def test_server_errors_trip_after_threshold():
+    breaker = make_breaker()
+    for _ in range(2):
+        breaker._on_response(FakeResponse(503))
+    assert breaker.state == CLOSED
+    breaker._on_response(FakeResponse(200))
+    breaker._on_response(FakeResponse(503))
+    breaker._on_response(FakeResponse(503))
+    # Успешный ответ сбросил серию ошибок
+    assert breaker.state == CLOSED
+    breaker._on_response(FakeResponse(503))
+    assert breaker.state == OPEN
+
+
+def test_half_open_allows_single_probe():
+    breaker = make_breaker()
+    breaker.record_failure("HTTP 429", trip_now=True)
+    expire(breaker)
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()
+
+
+def test_successful_probe_closes():
+    breaker = make_breaker()
+    breaker.record_failure("HTTP 429", trip_now=True)
+    expire(breaker)
+    breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED and breaker.consecutive_trips == 0
+    assert breaker.describe() is None
+
+
+def test_failed_probe_reopens_with_longer_delay():
+    breaker = make_breaker()
+    breaker.record_failure("HTTP 429", trip_now=True)
+    expire(breaker)
+    breaker.allow()
+    breaker.record_failure("HTTP 503")
+    assert breaker.state == OPEN and breaker.consecutive_trips == 2
+    # Вторая пауза — от base_delay до 2 * base_delay (с разбросом)
+    assert 10.0 - 1 <= breaker.open_until - time.monotonic() <= 20.0
+
+
+def test_delay_is_capped_and_honours_retry_after():
+    breaker = make_breaker()
+    for _ in range(10):
+        breaker.record_failure("HTTP 429", trip_now=True)
+    assert breaker.open_until - time.monotonic() <= 40.0
+    breaker.record_failure("HTTP 429", retry_after=100.0, trip_now=True)
+    assert breaker.open_until - time.monotonic() > 99.0
+
+
+def test_budget_spreads_requests_over_window():
+    breaker = make_breaker(requests_per_minute=2)
+    assert breaker.reserve() == 0 and breaker.reserve() == 0
+    assert breaker.reserve() == pytest.approx(60, abs=1)
+    assert breaker.metrics()["budget_used"] == 2
+
+
+def test_gateway_does_not_call_api_while_open():
+    gateway = SheetsGateway()
+    calls = []
+
+    def read():
+        calls.append(1)
+        raise gspread.exceptions.APIError(FakeResponse(429))
+
+    try:
+        gateway.breaker.record_failure("HTTP 429", trip_now=True)
+        assert asyncio.run(gateway.call(read, default="cached")) == "cached"
+        assert calls == []
+    finally:
+        gateway.shutdown()
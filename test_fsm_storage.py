@@ -0,0 +1,62 @@
+# tests/test_fsm_storage.py
+import asyncio
+import time
+from datetime import datetime
+
+from utils.fsm_storage import SQLiteStorage
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_state_and_data_survive_restart(tmp_path):
+    path = str(tmp_path / "fsm.sqlite3")
+    storage = SQLiteStorage(path)
+    started = datetime(2025, 6, 1, 8, 30)
+    run(storage.set_state(chat=1, user=2, state="DowntimeForm:reason"))
+    run(storage.update_data(chat=1, user=2, data={"site": "П1"}, start_time=started))
+    run(storage.close())
+
+    restored = SQLiteStorage(path)
+    assert run(restored.get_state(chat=1, user=2)) == "DowntimeForm:reason"
+    assert run(restored.get_data(chat=1, user=2)) == {"site": "П1", "start_time": started}
+
+
+def test_get_data_returns_copy(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "fsm.sqlite3"))
+    run(storage.set_data(chat=1, user=2, data={"items": [1]}))
+    data = run(storage.get_data(chat=1, user=2))
+    data["items"].append(2)
+    assert run(storage.get_data(chat=1, user=2)) == {"items": [1]}
+
+
+def test_reset_removes_record(tmp_path):
+    path = str(tmp_path / "fsm.sqlite3")
+    storage = SQLiteStorage(path)
+    run(storage.set_state(chat=1, user=2, state="Form:step"))
+    run(storage.update_data(chat=1, user=2, value=1))
+    run(storage.reset_state(chat=1, user=2))
+    assert run(storage.get_state(chat=1, user=2)) is None
+    assert storage.data == {}
+    assert SQLiteStorage(path).data == {}
+
+
+def test_reset_state_can_keep_data(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "fsm.sqlite3"))
+    run(storage.set_state(chat=1, user=2, state="Form:step"))
+    run(storage.update_data(chat=1, user=2, value=1))
+    run(storage.reset_state(chat=1, user=2, with_data=False))
+    assert run(storage.get_data(chat=1, user=2)) == {"value": 1}
+
+
+def test_cleanup_expired_drops_abandoned_forms(tmp_path):
+    path = str(tmp_path / "fsm.sqlite3")
+    storage = SQLiteStorage(path)
+    run(storage.set_state(chat=1, user=1, state="Form:old"))
+    run(storage.set_state(chat=2, user=2, state="Form:new"))
+    storage.conn.execute("UPDATE fsm_states SET updated_at = ? WHERE chat = '1'", (time.time() - 48 * 3600,))
+    storage.conn.commit()
+    run(storage.cleanup_expired(ttl_hours=24))
+    assert list(storage.data) == [("2", "2")]
+    assert list(SQLiteStorage(path).data) == [("2", "2")]
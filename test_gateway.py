@@ -0,0 +1,53 @@
+# tests/test_gateway.py
+import asyncio
+import threading
+import time
+
+import pytest
+
+from g_sheets.gateway import SheetsGateway
+
+
+@pytest.fixture
+def sheets():
+    gateway = SheetsGateway(max_workers=2, timeout=5.0)
+    yield gateway
+    gateway.shutdown()
+
+
+def test_call_runs_in_worker_thread(sheets):
+    result = asyncio.run(sheets.call(lambda value: (value, threading.current_thread().name), 42))
+    assert result[0] == 42 and result[1].startswith("sheets")
+    assert sheets.metrics()["calls_total"] == 1
+
+
+def test_exceptions_are_propagated(sheets):
+    def failing():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        asyncio.run(sheets.call(failing))
+    assert sheets.metrics()["errors_total"] == 1
+
+
+def test_timeout_returns_default(sheets):
+    result = asyncio.run(sheets.call(time.sleep, 0.5, timeout=0.05, default="cached"))
+    assert result == "cached"
+    assert sheets.metrics()["timeouts_total"] == 1
+    assert sheets.breaker.failures == 1
+
+
+def test_calls_do_not_block_event_loop(sheets):
+    async def scenario():
+        ticks = []
+
+        async def ticker():
+            for _ in range(5):
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(sheets.call(time.sleep, 0.1), ticker())
+        return ticks
+
+    ticks = asyncio.run(scenario())
+    assert len(ticks) == 5 and ticks[-1] - ticks[0] < 0.1
@@ -0,0 +1,34 @@
+# tests/test_keyboards.py
+from types import SimpleNamespace
+
+import pytest
+
+from keyboards import inline
+
+
+@pytest.fixture(autouse=True)
+def keyboard_cache(monkeypatch):
+    monkeypatch.setattr(inline, "_keyboard_cache", {})
+
+
+def button_texts(kb) -> list:
+    return [button.text for row in kb.inline_keyboard for button in row]
+
+
+def test_groups_keyboard_is_reused_until_groups_change():
+    storage = SimpleNamespace(groups_version=1, responsible_groups={"kip": "КИП"})
+    kb = inline.get_responsible_groups_keyboard(storage)
+    assert inline.get_responsible_groups_keyboard(storage) is kb
+
+    storage.responsible_groups = {"kip": "КИП", "el": "Электрики"}
+    storage.groups_version = 2
+    rebuilt = inline.get_responsible_groups_keyboard(storage)
+    assert rebuilt is not kb
+    assert "👥 Электрики" in button_texts(rebuilt)
+    # Клавиатура прежней версии из кэша удалена
+    assert [key for key in inline._keyboard_cache if key[0] == "responsible_groups"] == [("responsible_groups", 2)]
+
+
+def test_static_keyboards_are_built_once():
+    assert inline.get_sites_keyboard() is inline.get_sites_keyboard()
+    assert inline.get_downtime_reasons_keyboard() is inline.get_downtime_reasons_keyboard()
@@ -0,0 +1,224 @@
+# tests/test_local_store.py
+import asyncio
+import json
+import sqlite3
+
+import pytest
+
+from benchmarks.fakes import FakeSheetsBackend, FakeSheetsClient
+from config import (DOWNTIME_WORKSHEET_NAME, GROUP_ID_COLUMN, GROUP_NAME_COLUMN, RESPONSIBLE_GROUPS_WORKSHEET_NAME,
+                    SEQUENCE_COLUMN, SHEET_HEADERS, USER_ID_COLUMN, USER_ROLE_COLUMN, USER_ROLES_WORKSHEET_NAME)
+import utils.storage
+from utils.local_store import LocalStore
+from utils.storage import DataStorage
+from utils.write_queue import LocalStoreWriteQueue
+
+
+def record(number: int) -> dict:
+    return {SEQUENCE_COLUMN: str(number), "Причина_простоя_описание": f"причина {number}"}
+
+
+def sheet_row(number: int) -> list:
+    return [str(number) if header == SEQUENCE_COLUMN else "" for header in SHEET_HEADERS]
+
+
+@pytest.fixture
+def store(tmp_path):
+    local_store = LocalStore(str(tmp_path / "records.sqlite3"))
+    yield local_store
+    local_store.close()
+
+
+def test_import_is_idempotent(store):
+    assert store.needs_initial_import()
+    assert store.import_records([record(1), record(2)]) == 2
+    assert not store.needs_initial_import()
+    assert store.import_records([record(1), record(2), record(3)]) == 1
+    assert [r[SEQUENCE_COLUMN] for r in store.load_records()] == ["1", "2", "3"]
+    assert store.unexported_records() == []
+
+
+def test_import_skips_records_exported_before_import(store):
+    # Первый перенос не удался, бот успел выгрузить новую запись, затем перенос повторился
+    assert store.add_record(record(7))
+    store.mark_exported(1)
+    assert store.import_records([record(6), record(7)]) == 1
+    assert store.max_sequence_number() == 7
+    assert len(store.load_records()) == 2
+
+
+def test_duplicate_sequence_number_is_rejected(store):
+    assert store.add_record(record(1))
+    assert not store.add_record(record(1))
+    assert store.add_records([record(1), record(2)])
+    assert [r[SEQUENCE_COLUMN] for r in store.unexported_records()] == ["1", "2"]
+
+
+def test_mark_exported_in_insertion_order(store):
+    for number in (3, 1, 2):
+        store.add_record(record(number))
+    store.mark_exported(2)
+    assert store.unexported_records() == [record(2)]
+
+
+def test_duplicates_in_old_database_are_dropped(tmp_path):
+    path = str(tmp_path / "records.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE downtime_records (id INTEGER PRIMARY KEY AUTOINCREMENT, seq_number INTEGER, "
+                 "data TEXT NOT NULL, exported INTEGER NOT NULL DEFAULT 0)")
+    conn.executemany("INSERT INTO downtime_records (seq_number, data, exported) VALUES (?, ?, 1)",
+                     [(n, json.dumps(record(n))) for n in (1, 2, 1, 2, 3)])
+    conn.commit()
+    conn.close()
+    store = LocalStore(path)
+    assert [r[SEQUENCE_COLUMN] for r in store.load_records()] == ["1", "2", "3"]
+    assert not store.add_record(record(3))
+    store.close()
+
+
+def test_pending_roles_are_persisted_until_cleared(store):
+    store.save_role("1", "Оператор")
+    store.save_role("2", None)
+    assert store.load_pending_roles() == {"1": "Оператор", "2": None}
+    # Роль успели изменить еще раз, пока шла запись: более новое изменение остается
+    store.save_role("1", "Админ")
+    store.clear_pending_role("1", "Оператор")
+    store.clear_pending_role("2", None)
+    assert store.load_pending_roles() == {"1": "Админ"}
+
+
+def test_journal_migration_is_idempotent(tmp_path, store):
+    journal = tmp_path / "queue.jsonl"
+    lines = "".join(json.dumps(record(n), ensure_ascii=False) + "\n" for n in (1, 2, 3))
+    journal.write_text(lines, encoding="utf-8")
+    queue = LocalStoreWriteQueue(store, str(journal))
+    assert not journal.exists()
+    assert queue.pending == [record(1), record(2), record(3)] and queue.uncertain
+    # Журнал не успели удалить до перезапуска
+    journal.write_text(lines, encoding="utf-8")
+    queue = LocalStoreWriteQueue(store, str(journal))
+    assert len(queue.pending) == 3 and len(store.load_records()) == 3
+
+
+def make_client(downtime_numbers=(1, 2, 3)) -> FakeSheetsClient:
+    client = FakeSheetsClient(FakeSheetsBackend())
+    spreadsheet = client.open_by_key("test")
+    spreadsheet.add_sheet(DOWNTIME_WORKSHEET_NAME, [SHEET_HEADERS] + [sheet_row(n) for n in downtime_numbers])
+    spreadsheet.add_sheet(USER_ROLES_WORKSHEET_NAME, [[USER_ID_COLUMN, USER_ROLE_COLUMN], ["1", "Админ"]])
+    spreadsheet.add_sheet(RESPONSIBLE_GROUPS_WORKSHEET_NAME, [[GROUP_NAME_COLUMN, GROUP_ID_COLUMN], ["КИП", "-100"]])
+    return client
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    # Пути хранилищ в config относительные (data/...), поэтому каждый тест работает в своем каталоге
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def test_first_start_imports_history_with_reference_data(data_dir):
+    client = make_client()
+    storage = DataStorage(client, use_local_store=True)
+    asyncio.run(storage.initialize())
+    assert client.backend.calls["values_batch_get"] == 1 and client.backend.calls["get_all_values"] == 0
+    assert [r[SEQUENCE_COLUMN] for r in storage.local_store.load_records()] == ["1", "2", "3"]
+    assert storage.user_roles == {"1": "Админ"} and storage.sequence.allocate() == 4
+
+    # После переноса лист простоев больше не читается
+    asyncio.run(storage.refresh_downtime_cache(full=True))
+    asyncio.run(storage.initialize())
+    assert client.backend.calls["values_batch_get"] == 2 and client.backend.calls["get_all_values"] == 0
+    storage.local_store.close()
+
+
+def test_failed_import_blocks_writes_until_sequence_is_seeded(data_dir, monkeypatch):
+    client = make_client()
+    # История простоев читается при старте вместе с ролями и группами, а при повторе — отдельно
+    monkeypatch.setattr(utils.storage, "fetch_sheets_values", lambda spreadsheet, names: None)
+    monkeypatch.setattr(utils.storage, "fetch_all_rows", lambda worksheet: None)
+    monkeypatch.setattr(utils.storage, "get_next_sequence_number", lambda worksheet: None)
+    storage = DataStorage(client, use_local_store=True)
+    asyncio.run(storage.initialize())
+    assert storage.local_store.needs_initial_import()
+    assert not storage.sequence.seeded
+    assert not storage.queue_downtime_record(record(0))
+    storage.local_store.close()
+
+
+def test_failed_import_seeds_sequence_from_sheet(data_dir, monkeypatch):
+    client = make_client()
+    fetch_all_rows = utils.storage.fetch_all_rows
+    monkeypatch.setattr(utils.storage, "fetch_sheets_values", lambda spreadsheet, names: None)
+    monkeypatch.setattr(utils.storage, "fetch_all_rows", lambda worksheet: None)
+    storage = DataStorage(client, use_local_store=True)
+    asyncio.run(storage.initialize())
+    assert storage.local_store.needs_initial_import()
+    assert storage.sequence.allocate() == 4
+
+    # Следующее обновление кэша повторяет перенос
+    monkeypatch.setattr(utils.storage, "fetch_all_rows", fetch_all_rows)
+    asyncio.run(storage.refresh_downtime_cache())
+    assert not storage.local_store.needs_initial_import()
+    assert [r[SEQUENCE_COLUMN] for r in storage.local_store.load_records()] == ["1", "2", "3"]
+    storage.local_store.close()
+
+    restarted = DataStorage(client, use_local_store=True)
+    asyncio.run(restarted.initialize())
+    assert len(restarted.local_store.load_records()) == 3
+    assert restarted.sequence.allocate() == 5
+    restarted.local_store.close()
+
+
+def test_unflushed_role_changes_survive_restart(data_dir):
+    client = make_client()
+    storage = DataStorage(client, use_local_store=True)
+    asyncio.run(storage.initialize())
+    storage.roles.set_role("1", "Оператор")
+    storage.roles.set_role("2", "Оператор")
+    storage.local_store.close()
+
+    restarted = DataStorage(client, use_local_store=True)
+    asyncio.run(restarted.initialize())
+    assert restarted.user_roles == {"1": "Оператор", "2": "Оператор"}
+    asyncio.run(restarted.flush_role_changes())
+    assert restarted.local_store.load_pending_roles() == {}
+    assert client.spreadsheet.worksheet(USER_ROLES_WORKSHEET_NAME).rows[1:] == [["1", "Оператор"], ["2", "Оператор"]]
+    restarted.local_store.close()
+
+
+def test_import_retry_opens_worksheet_missed_at_startup(data_dir, monkeypatch):
+    client = make_client()
+    storage = DataStorage(client, use_local_store=True)
+    worksheet = storage.worksheets.worksheet
+    monkeypatch.setattr(storage.worksheets, "worksheet", lambda *args: None)
+    asyncio.run(storage.initialize())
+    assert storage.downtime_ws is None and not storage.sequence.seeded
+
+    monkeypatch.setattr(storage.worksheets, "worksheet", worksheet)
+    asyncio.run(storage.refresh_downtime_cache())
+    assert not storage.local_store.needs_initial_import()
+    assert storage.sequence.allocate() == 4
+    storage.local_store.close()
+
+
+def test_flush_opens_worksheet_missed_at_startup(data_dir, monkeypatch):
+    client = make_client()
+    storage = DataStorage(client, use_local_store=True)
+    asyncio.run(storage.initialize())
+    storage.local_store.close()
+
+    restarted = DataStorage(client, use_local_store=True)
+    worksheet = restarted.worksheets.worksheet
+    monkeypatch.setattr(restarted.worksheets, "worksheet", lambda *args: None)
+    asyncio.run(restarted.initialize())
+    assert restarted.downtime_ws is None
+    assert restarted.queue_downtime_record(record(asyncio.run(restarted.allocate_sequence_number())))
+    # Лист все еще не открывается: попытка считается неудачной и откладывается
+    asyncio.run(restarted.flush_write_queue())
+    assert restarted.write_queue.failures == 1 and len(restarted.write_queue.pending) == 1
+
+    monkeypatch.setattr(restarted.worksheets, "worksheet", worksheet)
+    asyncio.run(restarted.flush_write_queue(force=True))
+    assert restarted.write_queue.pending == []
+    assert client.spreadsheet.worksheet(DOWNTIME_WORKSHEET_NAME).rows[-1][0] == "4"
+    restarted.local_store.close()
@@ -0,0 +1,66 @@
+# tests/test_metrics.py
+import asyncio
+
+import aiohttp
+
+from utils.metrics import Histogram, MetricsRegistry, start_metrics_server
+
+
+def make_registry() -> MetricsRegistry:
+    registry = MetricsRegistry()
+    registry.counter("sheets_throttled_total", "Ответы 429 от Google Sheets", lambda: 3)
+    registry.gauge("cache_age_seconds", "Возраст кэша простоев", lambda: 1.5)
+    histogram = registry.histogram("handler_seconds", "Время обработчика", "handler")
+    histogram.buckets = (0.1, 1)
+    histogram.observe('say "hi"\\\n', 0.05)
+    histogram.observe('say "hi"\\\n', 0.5)
+    histogram.observe('say "hi"\\\n', 2)
+    return registry
+
+
+def test_render_prometheus_text():
+    assert make_registry().render().splitlines() == [
+        "# HELP sheets_throttled_total Ответы 429 от Google Sheets",
+        "# TYPE sheets_throttled_total counter",
+        "sheets_throttled_total 3",
+        "# HELP cache_age_seconds Возраст кэша простоев",
+        "# TYPE cache_age_seconds gauge",
+        "cache_age_seconds 1.5",
+        "# HELP handler_seconds Время обработчика",
+        "# TYPE handler_seconds histogram",
+        'handler_seconds_bucket{handler="say \\"hi\\"\\\\\\n",le="0.1"} 1',
+        'handler_seconds_bucket{handler="say \\"hi\\"\\\\\\n",le="1"} 2',
+        'handler_seconds_bucket{handler="say \\"hi\\"\\\\\\n",le="+Inf"} 3',
+        'handler_seconds_sum{handler="say \\"hi\\"\\\\\\n"} 2.55',
+        'handler_seconds_count{handler="say \\"hi\\"\\\\\\n"} 3',
+    ]
+
+
+def test_failing_value_is_rendered_as_nan():
+    registry = MetricsRegistry()
+    registry.gauge("broken", "Ошибка вычисления", lambda: 1 / 0)
+    assert registry.render().splitlines()[-1] == "broken NaN"
+
+
+def test_histogram_series_are_sorted_by_label():
+    histogram = Histogram("sheets_call_seconds", "Вызовы", "func", buckets=(1,))
+    histogram.observe("b", 0.5)
+    histogram.observe("a", 0.5)
+    counts = [line for line in histogram.render() if line.startswith("sheets_call_seconds_count")]
+    assert counts == ['sheets_call_seconds_count{func="a"} 1', 'sheets_call_seconds_count{func="b"} 1']
+
+
+def test_metrics_endpoint_serves_registry():
+    async def scenario():
+        runner = await start_metrics_server("127.0.0.1", 0, make_registry())
+        port = runner.addresses[0][1]
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.get(f"http://127.0.0.1:{port}/metrics") as response:
+                    return response.status, response.content_type, await response.text()
+        finally:
+            await runner.cleanup()
+
+    status, content_type, text = asyncio.run(scenario())
+    assert status == 200 and content_type == "text/plain"
+    assert text == make_registry().render()
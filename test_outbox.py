@@ -0,0 +1,70 @@
+# tests/test_outbox.py
+import asyncio
+import time
+
+from aiogram.utils.exceptions import RetryAfter
+
+from utils.outbox import MessageDispatcher, TokenBucket
+
+
+class FakeBot:
+    def __init__(self, retry_after: int = 0, fail_chats=()):
+        self.retry_after = retry_after
+        self.fail_chats = set(fail_chats)
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        if self.retry_after:
+            self.retry_after -= 1
+            raise RetryAfter(0)
+        if chat_id in self.fail_chats:
+            raise RuntimeError("chat not found")
+        self.sent.append((chat_id, text, time.monotonic()))
+        return {"chat_id": chat_id, "text": text}
+
+
+def test_token_bucket_reserves_delays():
+    bucket = TokenBucket(rate=10, capacity=1)
+    assert bucket.reserve() == 0
+    assert 0.09 <= bucket.reserve() <= 0.1
+    assert 0.19 <= bucket.reserve() <= 0.2
+
+
+def test_pause_postpones_next_send():
+    bucket = TokenBucket(rate=10, capacity=1)
+    bucket.pause(2)
+    assert bucket.reserve() >= 2
+
+
+def test_per_chat_rate_is_respected():
+    bot = FakeBot()
+    outbox = MessageDispatcher(bot, global_rate=100, per_chat_rate=20)
+
+    async def scenario():
+        await asyncio.gather(*(outbox.send_message(1, f"m{i}") for i in range(4)))
+
+    asyncio.run(scenario())
+    moments = [moment for _, _, moment in bot.sent]
+    assert [text for _, text, _ in bot.sent] == ["m0", "m1", "m2", "m3"]
+    assert moments[-1] - moments[0] >= 3 / 20 - 0.01
+
+
+def test_retry_after_is_retried():
+    bot = FakeBot(retry_after=2)
+    outbox = MessageDispatcher(bot, global_rate=100, per_chat_rate=100, max_retries=3)
+    assert asyncio.run(outbox.send_message(1, "hi")) is not None
+    assert outbox.metrics()["retry_after_total"] == 2 and outbox.sent_total == 1
+
+
+def test_retries_are_bounded():
+    bot = FakeBot(retry_after=10)
+    outbox = MessageDispatcher(bot, global_rate=100, per_chat_rate=100, max_retries=1)
+    assert asyncio.run(outbox.send_message(1, "hi")) is None
+    assert outbox.failed_total == 1 and bot.sent == []
+
+
+def test_broadcast_counts_delivered():
+    bot = FakeBot(fail_chats={2})
+    outbox = MessageDispatcher(bot, global_rate=100, per_chat_rate=100)
+    assert asyncio.run(outbox.broadcast(["1", "2", "3"], "hi")) == 2
+    assert outbox.failed_total == 1
@@ -0,0 +1,49 @@
+# tests/test_registry.py
+from benchmarks.fakes import FakeSheetsBackend, FakeSheetsClient
+from g_sheets.registry import WorksheetRegistry
+
+
+def make_client() -> FakeSheetsClient:
+    client = FakeSheetsClient(FakeSheetsBackend())
+    client.spreadsheet.add_sheet("Простои", [["№"]])
+    client.spreadsheet.add_sheet("Роли", [["ID", "Роль"]])
+    return client
+
+
+def test_worksheets_are_opened_once():
+    client = make_client()
+    registry = WorksheetRegistry(client)
+    downtime = registry.worksheet("Простои")
+    assert registry.worksheet("Простои") is downtime
+    assert registry.worksheet("Роли") is client.spreadsheet.sheets["Роли"]
+    assert registry.spreadsheet() is client.spreadsheet
+    # Таблица открывается и список листов запрашивается один раз на все листы
+    assert client.backend.calls["open_by_key"] == 1 and client.backend.calls["worksheets"] == 1
+    assert client.backend.calls["worksheet"] == 0
+
+
+def test_missing_worksheet_is_created_with_headers():
+    client = make_client()
+    registry = WorksheetRegistry(client)
+    groups = registry.worksheet("Группы", ["Название", "ID"])
+    assert groups.rows == [["Название", "ID"]]
+    assert registry.worksheet("Группы") is groups
+    assert client.backend.calls["add_worksheet"] == 1
+
+
+def test_invalidate_reopens_spreadsheet():
+    client = make_client()
+    registry = WorksheetRegistry(client)
+    registry.worksheet("Простои")
+    registry.invalidate()
+    # Лист переименовали, пока реестр был сброшен
+    client.spreadsheet.sheets["Простои (архив)"] = client.spreadsheet.sheets.pop("Простои")
+    client.spreadsheet.add_sheet("Простои", [["№"]])
+    assert registry.worksheet("Простои") is client.spreadsheet.sheets["Простои"]
+    assert client.backend.calls["open_by_key"] == 2 and client.backend.calls["worksheets"] == 2
+
+
+def test_registry_without_client():
+    registry = WorksheetRegistry(None)
+    assert registry.worksheet("Простои") is None
+    assert registry.spreadsheet() is None
@@ -0,0 +1,84 @@
+# tests/test_reminders.py
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from apscheduler.jobstores.base import JobLookupError
+
+from utils.reminders import (GROUP_REMINDER_DELAY_MINUTES, REMINDER_RETRY_MINUTES, schedule_request_reminder,
+                             send_request_reminder)
+from utils.state_db import PendingRequests, StateDB
+
+
+class FakeScheduler:
+    def __init__(self):
+        self.jobs = {}
+
+    def add_job(self, func, trigger, run_date, args, id, **kwargs):
+        self.jobs[id] = (trigger, run_date, args)
+
+    def remove_job(self, job_id):
+        if job_id not in self.jobs:
+            raise JobLookupError(job_id)
+        del self.jobs[job_id]
+
+
+class FakeOutbox:
+    def __init__(self, delivered: bool = True):
+        self.delivered = delivered
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append(chat_id)
+        return {"chat_id": chat_id} if self.delivered else None
+
+
+def make_storage(tmp_path, **request) -> SimpleNamespace:
+    pending_requests = PendingRequests(StateDB(str(tmp_path / "state.sqlite3")))
+    pending_requests["r1"] = {"status": "pending_acceptance", "creation_time": datetime.now().isoformat(),
+                              "responsible_group_id": -100, "group_notification_message_id": 7, **request}
+    return SimpleNamespace(pending_requests=pending_requests)
+
+
+def test_reminder_is_scheduled_after_delay(tmp_path):
+    scheduler = FakeScheduler()
+    storage = make_storage(tmp_path)
+    schedule_request_reminder(scheduler, FakeOutbox(), storage, "r1")
+    trigger, run_date, _ = scheduler.jobs["reminder_r1"]
+    expected = datetime.now().astimezone() + timedelta(minutes=GROUP_REMINDER_DELAY_MINUTES)
+    assert trigger == "date" and abs((run_date - expected).total_seconds()) < 5
+
+
+def test_status_without_reminder_cancels_job(tmp_path):
+    scheduler = FakeScheduler()
+    storage = make_storage(tmp_path)
+    schedule_request_reminder(scheduler, FakeOutbox(), storage, "r1")
+    storage.pending_requests["r1"]["status"] = "in_progress"
+    schedule_request_reminder(scheduler, FakeOutbox(), storage, "r1")
+    assert scheduler.jobs == {}
+
+
+def test_delivered_reminder_is_marked_sent(tmp_path):
+    storage = make_storage(tmp_path)
+    outbox = FakeOutbox()
+    asyncio.run(send_request_reminder(outbox, storage, "r1", FakeScheduler()))
+    assert outbox.sent == [-100]
+    assert storage.pending_requests["r1"]["reminders_sent_group"] == 1
+
+
+def test_failed_reminder_is_rescheduled(tmp_path):
+    scheduler = FakeScheduler()
+    storage = make_storage(tmp_path)
+    asyncio.run(send_request_reminder(FakeOutbox(delivered=False), storage, "r1", scheduler))
+    assert storage.pending_requests["r1"].get("reminders_sent_group", 0) == 0
+    _, run_date, _ = scheduler.jobs["reminder_r1"]
+    expected = datetime.now().astimezone() + timedelta(minutes=REMINDER_RETRY_MINUTES)
+    assert abs((run_date - expected).total_seconds()) < 5
+
+
+def test_broken_request_is_rescheduled(tmp_path):
+    scheduler = FakeScheduler()
+    storage = make_storage(tmp_path)
+    del storage.pending_requests["r1"]["responsible_group_id"]
+    asyncio.run(send_request_reminder(FakeOutbox(), storage, "r1", scheduler))
+    assert "reminder_r1" in scheduler.jobs
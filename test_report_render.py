@@ -0,0 +1,100 @@
+# tests/test_report_render.py
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from pytz import timezone
+
+from config import SCHEDULER_TIMEZONE, SHEET_HEADERS
+from g_sheets.breaker import SheetsCircuitBreaker
+from utils.downtime_store import DowntimeStore
+from utils.report_render import paginate, paginate_text
+from utils.reports import get_downtime_report_pages
+
+
+def pieces_of(count: int, size: int = 30):
+    return [("", "H" * size)] + [("\n", f"{i:03d}" + "x" * (size - 3)) for i in range(count)]
+
+
+def test_single_page_is_plain_concatenation():
+    pieces = pieces_of(5)
+    assert paginate(pieces) == ["".join(separator + text for separator, text in pieces)]
+
+
+def test_pages_respect_limit_and_keep_pieces_whole():
+    pieces = pieces_of(40)
+    pages = paginate(pieces, limit=100)
+    assert len(pages) > 1
+    assert all(len(page) <= 100 for page in pages)
+    # Склейка страниц с разделителями на местах разрыва дает исходный текст
+    texts = [text for _, text in pieces]
+    assert [text for page in pages for text in page.split("\n")] == texts
+
+
+def test_break_drops_separator():
+    pages = paginate([("", "a" * 6), ("\n\n", "b" * 6)], limit=10)
+    assert pages == ["a" * 6, "b" * 6]
+
+
+def test_oversized_piece_is_split_by_lines():
+    long_piece = "\n".join(["y" * 8] * 5)
+    pages = paginate([("", "head"), ("\n", long_piece), ("\n", "tail")], limit=20)
+    assert all(len(page) <= 20 for page in pages)
+    assert "\n".join(pages).replace("\n", "") == "head" + "y" * 40 + "tail"
+
+
+def test_paginate_text_short_and_long():
+    assert paginate_text("short") == ["short"]
+    text = "\n".join(f"line {i}" for i in range(100))
+    pages = paginate_text(text, limit=50)
+    assert all(len(page) <= 50 for page in pages)
+    assert "\n".join(pages) == text
+
+
+def make_storage(records: int) -> tuple:
+    tz = timezone(SCHEDULER_TIMEZONE)
+    start = datetime(2025, 6, 2, 8, 0)
+    rows = []
+    for i in range(records):
+        record = dict.fromkeys(SHEET_HEADERS, "")
+        record.update({
+            "Порядковый номер заявки": str(i + 1),
+            "Timestamp_записи": (start + timedelta(minutes=i)).strftime("%Y-%m-%d %H:%M:%S"),
+            "Площадка": f"Площадка {i % 3}",
+            "Линия_Секция": "Линия_1",
+            "Направление_простоя": "Механика",
+            "Время_простоя_минут": "5",
+            "Ответственная_группа": "КИП",
+            "Причина_простоя_описание": f"описание {i} " + "*" * 20,
+            "Дополнительный_комментарий_инициатора": "Без доп. комментария",
+        })
+        rows.append([record[h] for h in SHEET_HEADERS])
+    return SimpleNamespace(
+        downtime_cache={"headers": SHEET_HEADERS, "data_rows": rows, "error": None},
+        downtime_store=DowntimeStore.from_rows(SHEET_HEADERS, rows),
+        is_cache_stale=lambda: False,
+        sheets=SimpleNamespace(breaker=SheetsCircuitBreaker()),
+        write_queue=SimpleNamespace(pending=[]),
+    ), tz.localize(start), tz.localize(start + timedelta(hours=12))
+
+
+def test_report_pages_split_on_record_boundaries():
+    storage, start_dt, end_dt = make_storage(300)
+    pages = asyncio.run(get_downtime_report_pages(start_dt, end_dt, storage))
+    assert len(pages) > 1
+    assert all(len(page) <= 4096 for page in pages)
+    # Разметка не рвется между страницами
+    for page in pages:
+        markup = page.replace("\\*", "").replace("\\_", "")
+        assert markup.count("**") % 2 == 0 and markup.count("_") % 2 == 0
+    text = "\n".join(pages)
+    assert all(f"описание {i} " in text for i in range(300))
+    assert "Общее время простоя: 1500 минут" in pages[-1]
+
+
+def test_report_pages_are_cached_per_store_version():
+    storage, start_dt, end_dt = make_storage(10)
+    pages = asyncio.run(get_downtime_report_pages(start_dt, end_dt, storage))
+    assert asyncio.run(get_downtime_report_pages(start_dt, end_dt, storage)) is pages
+    storage.downtime_store = DowntimeStore.from_rows(SHEET_HEADERS, storage.downtime_cache["data_rows"])
+    assert asyncio.run(get_downtime_report_pages(start_dt, end_dt, storage)) is not pages
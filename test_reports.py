@@ -0,0 +1,49 @@
+# tests/test_reports.py
+import asyncio
+from datetime import date
+from types import SimpleNamespace
+
+from config import SHEET_HEADERS
+from utils.downtime_store import DowntimeStore
+from utils.reports import _line_label, get_analytics_report
+
+
+def make_storage(records) -> SimpleNamespace:
+    rows = []
+    for number, (site, line, minutes) in enumerate(records, start=1):
+        values = {"Порядковый номер заявки": str(number), "Timestamp_записи": f"2025-06-02 10:{number:02d}:00",
+                  "Площадка": site, "Линия_Секция": line, "Направление_простоя": "Механика",
+                  "Время_простоя_минут": str(minutes), "Ответственная_группа": "КИП"}
+        rows.append([values.get(header, "") for header in SHEET_HEADERS])
+    return SimpleNamespace(downtime_cache={"headers": SHEET_HEADERS},
+                           downtime_store=DowntimeStore.from_rows(SHEET_HEADERS, rows))
+
+
+def analytics(storage, group_by: str) -> str:
+    return asyncio.run(get_analytics_report(date(2025, 6, 1), date(2025, 6, 3), group_by, storage))
+
+
+def test_line_label_fallback_per_part():
+    assert _line_label("П1", "Линия 1") == "П1 / Линия 1"
+    assert _line_label("П1", "") == "П1 / Не указана"
+    assert _line_label("", "Линия 1") == "Не указана / Линия 1"
+    assert _line_label("", "") == ""
+
+
+def test_analytics_by_line_uses_fallback_labels():
+    storage = make_storage([("П1", "Линия 1", 30), ("П1", "", 20), ("", "", 10)])
+    report = analytics(storage, "line")
+    assert "П1 / Линия 1: 30 мин." in report
+    assert "П1 / Не указана: 20 мин." in report
+    assert "- Не указана: 10 мин." in report
+    assert "Общий простой: **1 ч 0 мин.** (3 простоев" in report
+
+
+def test_analytics_unknown_grouping():
+    assert analytics(make_storage([("П1", "Линия 1", 5)]), "month").startswith("Неизвестная группировка")
+
+
+def test_analytics_empty_period():
+    storage = make_storage([("П1", "Линия 1", 5)])
+    report = asyncio.run(get_analytics_report(date(2024, 1, 1), date(2024, 1, 2), "site", storage))
+    assert "простоев не зафиксировано" in report
@@ -0,0 +1,113 @@
+# tests/test_roles.py
+import asyncio
+
+import pytest
+
+from benchmarks.fakes import FakeSheetsBackend, FakeWorksheet
+from config import USER_ID_COLUMN, USER_ROLE_COLUMN
+from g_sheets.api import parse_user_roles
+from g_sheets.gateway import SheetsGateway
+from utils.roles import RoleService
+
+
+@pytest.fixture
+def sheets():
+    gateway = SheetsGateway()
+    yield gateway
+    gateway.shutdown()
+
+
+def make_sheet(rows, header=(USER_ID_COLUMN, USER_ROLE_COLUMN), error_rate=0.0) -> FakeWorksheet:
+    return FakeWorksheet(FakeSheetsBackend(error_rate=error_rate), "Роли", [list(header)] + [list(row) for row in rows])
+
+
+def service_for(worksheet: FakeWorksheet) -> RoleService:
+    service = RoleService()
+    service.replace(*parse_user_roles(worksheet.get_all_values()))
+    return service
+
+
+def sheet_roles(worksheet: FakeWorksheet) -> dict:
+    roles, _, _, _ = parse_user_roles(worksheet.get_all_values())
+    return roles
+
+
+def test_parse_user_roles_maps_rows_and_columns():
+    worksheet = make_sheet([["Админ", "1"], ["", ""], ["Оператор", "3"]], header=(USER_ROLE_COLUMN, USER_ID_COLUMN))
+    roles, row_by_user, role_column, id_column = parse_user_roles(worksheet.get_all_values())
+    assert roles == {"1": "Админ", "3": "Оператор"}
+    assert row_by_user == {"1": 2, "3": 4}
+    assert (role_column, id_column) == (1, 2)
+
+
+def test_flush_updates_appends_and_deletes(sheets):
+    worksheet = make_sheet([["1", "Админ"], ["2", "Оператор"], ["3", "Оператор"]])
+    service = service_for(worksheet)
+    service.set_role("2", "Админ")
+    service.set_role("4", "Оператор")
+    service.delete_role("1")
+    assert asyncio.run(service.flush(sheets, worksheet))
+    assert sheet_roles(worksheet) == {"2": "Админ", "3": "Оператор", "4": "Оператор"}
+    # Индекс строк после удаления и добавления совпадает с листом
+    assert service.row_by_user == parse_user_roles(worksheet.get_all_values())[1]
+    assert worksheet.backend.calls["batch_update"] == 1 and worksheet.backend.calls["append_rows"] == 1
+
+
+def test_changes_of_one_user_collapse_to_last(sheets):
+    worksheet = make_sheet([["1", "Админ"]])
+    service = service_for(worksheet)
+    service.set_role("1", "Оператор")
+    service.set_role("1", "Мастер")
+    assert asyncio.run(service.flush(sheets, worksheet))
+    assert sheet_roles(worksheet) == {"1": "Мастер"}
+    assert worksheet.backend.calls["batch_update"] == 1
+
+
+def test_sorted_sheet_is_reindexed_before_write(sheets):
+    worksheet = make_sheet([["1", "Админ"], ["2", "Оператор"], ["3", "Оператор"]])
+    service = service_for(worksheet)
+    # Лист отсортировали вручную: строки пользователей сдвинулись
+    worksheet.rows[1:] = [["3", "Оператор"], ["2", "Оператор"], ["1", "Админ"]]
+    service.set_role("3", "Мастер")
+    service.delete_role("1")
+    assert asyncio.run(service.flush(sheets, worksheet))
+    assert sheet_roles(worksheet) == {"2": "Оператор", "3": "Мастер"}
+
+
+def test_failed_write_keeps_pending(sheets):
+    worksheet = make_sheet([["1", "Админ"]], error_rate=1.0)
+    service = RoleService()
+    service.replace({"1": "Админ"}, {"1": 2}, 2)
+    service.set_role("1", "Оператор")
+    assert not asyncio.run(service.flush(sheets, worksheet))
+    assert service._pending == {"1": "Оператор"}
+    assert service.has_role("1", "Оператор")
+
+
+def test_reload_keeps_unwritten_changes():
+    service = RoleService()
+    service.replace({"1": "Админ"}, {"1": 2}, 2)
+    service.set_role("1", "Оператор")
+    service.set_role("5", "Оператор")
+    service.replace({"1": "Админ", "2": "Админ"}, {"1": 2, "2": 3}, 2)
+    assert service.roles == {"1": "Оператор", "2": "Админ", "5": "Оператор"}
+    assert service.get_users_with_role("Админ") == frozenset({"2"})
+
+
+def test_role_change_is_read_from_memory_and_written_by_row_index(sheets):
+    worksheet = make_sheet([["1", "Админ"], ["2", "Оператор"], ["3", "Оператор"]])
+    service = service_for(worksheet)
+    reads = worksheet.backend.calls["get_all_values"]
+    service.set_role("3", "Админ")
+    # Изменение сразу видно боту, а лист до flush не трогается
+    assert service.has_role("3", "Админ") and not service.has_role("3", "Оператор")
+    assert service.get_users_with_role("Админ") == frozenset({"1", "3"})
+    assert service.users_by_role["Оператор"] == {"2"}
+    assert sum(worksheet.backend.calls.values()) == reads
+
+    assert asyncio.run(service.flush(sheets, worksheet))
+    assert worksheet.rows[3] == ["3", "Админ"]
+    # Ячейка найдена по индексу строк: одна проверка строк, одна пакетная запись, без чтения листа
+    assert worksheet.backend.calls["batch_get"] == 1 and worksheet.backend.calls["batch_update"] == 1
+    assert worksheet.backend.calls["get_all_values"] == reads
+    assert service.row_by_user == {"1": 2, "2": 3, "3": 4}
@@ -0,0 +1,84 @@
+# tests/test_rollups.py
+import random
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+from pytz import timezone
+
+from config import SCHEDULER_TIMEZONE, SHEET_HEADERS
+from utils.downtime_store import DowntimeStore
+from utils.rollups import ShiftRollup
+from utils.shifts import calculate_shift_bounds
+
+TZ = timezone(SCHEDULER_TIMEZONE)
+START = datetime(2025, 6, 1, 0, 0)
+
+
+def make_rows(count: int, seed: int = 1) -> list:
+    rng = random.Random(seed)
+    rows = []
+    for i in range(count):
+        record = dict.fromkeys(SHEET_HEADERS, "")
+        record.update({
+            "Порядковый номер заявки": str(i + 1),
+            "Timestamp_записи": (START + timedelta(minutes=rng.randint(0, 60 * 24 * 10))).strftime("%Y-%m-%d %H:%M:%S"),
+            "Площадка": rng.choice(["Площадка 1", "Площадка 2"]),
+            "Линия_Секция": rng.choice(["Линия 1", "Линия 2", "Резка"]),
+            "Направление_простоя": rng.choice(["Механика", "Электрика", "Сырье"]),
+            "Время_простоя_минут": str(rng.randint(1, 90)),
+            "Ответственная_группа": rng.choice(["КИП", "Механики"]),
+        })
+        rows.append([record[h] for h in SHEET_HEADERS])
+    return rows
+
+
+def naive_rollup(store: DowntimeStore) -> dict:
+    """Агрегаты проходом по всем записям — как считались отчеты до предагрегации."""
+    result = defaultdict(lambda: [0, 0])
+    for i in range(len(store)):
+        shift_start = calculate_shift_bounds(store.timestamps[i])[0]
+        cell = result[(shift_start, (store.sites[i], store.lines[i], store.reasons[i], store.groups[i]))]
+        cell[0] += store.minutes[i]
+        cell[1] += 1
+    return dict(result)
+
+
+def rollup_cells(rollup: ShiftRollup) -> dict:
+    return {(shift_start, key): list(cell) for shift_start, key, cell in rollup.items(TZ.localize(START - timedelta(days=1)),
+                                                                                     TZ.localize(START + timedelta(days=30)))}
+
+
+def test_rollup_matches_full_scan():
+    store = DowntimeStore.from_rows(SHEET_HEADERS, make_rows(2000))
+    assert rollup_cells(store.rollup) == naive_rollup(store)
+
+
+def test_add_row_keeps_rollup_in_sync_with_rebuild():
+    rows = make_rows(500)
+    store = DowntimeStore.from_rows(SHEET_HEADERS, rows[:400])
+    for row in rows[400:]:
+        assert store.add_row(row)
+    rebuilt = DowntimeStore.from_rows(SHEET_HEADERS, rows)
+    assert rollup_cells(store.rollup) == rollup_cells(rebuilt.rollup)
+    assert store.timestamps == rebuilt.timestamps
+
+
+def test_shift_boundaries():
+    rollup = ShiftRollup()
+    for hour, minutes in ((7, 5), (8, 10), (19, 20), (20, 40)):
+        rollup.add(TZ.localize(START.replace(hour=hour, minute=59)), "П", "Л", "Механика", "КИП", minutes)
+    day_start = TZ.localize(START.replace(hour=8))
+    night_start = TZ.localize(START.replace(hour=20))
+    assert rollup.shifts_between(day_start, night_start) == [day_start]
+    assert rollup.totals_by_shift(day_start - timedelta(hours=12), night_start + timedelta(hours=1)) == [
+        (day_start - timedelta(hours=12), 5, 1), (day_start, 30, 2), (night_start, 40, 1)]
+
+
+def test_minutes_by_reason_over_range():
+    store = DowntimeStore.from_rows(SHEET_HEADERS, make_rows(1000))
+    start_dt = TZ.localize(START + timedelta(days=2, hours=8))
+    end_dt = TZ.localize(START + timedelta(days=5, hours=8))
+    expected = Counter()
+    for i in store.window(start_dt, end_dt):
+        expected[store.reasons[i]] += store.minutes[i]
+    assert store.rollup.minutes_by_reason(start_dt, end_dt) == expected
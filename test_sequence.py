@@ -0,0 +1,49 @@
+# tests/test_sequence.py
+import json
+
+from benchmarks.fakes import FakeSheetsBackend, FakeWorksheet
+from g_sheets.api import get_next_sequence_number
+from utils.sequence import SequenceAllocator
+
+
+def test_allocate_persists_last_value(tmp_path):
+    path = str(tmp_path / "sequence.json")
+    sequence = SequenceAllocator(path)
+    assert [sequence.allocate() for _ in range(3)] == [1, 2, 3]
+    with open(path, encoding="utf-8") as f:
+        assert json.load(f) == {"last_value": 3}
+    assert SequenceAllocator(path).allocate() == 4
+
+
+def test_seed_never_moves_counter_back(tmp_path):
+    sequence = SequenceAllocator(str(tmp_path / "sequence.json"))
+    sequence.seed(10)
+    assert sequence.seeded
+    assert sequence.allocate() == 10
+    # Таблица отстает от локального счетчика (записи еще в очереди) — выдаем дальше по счетчику
+    sequence.seed(5)
+    assert sequence.allocate() == 11
+
+
+def test_restart_is_not_seeded(tmp_path):
+    path = str(tmp_path / "sequence.json")
+    SequenceAllocator(path).seed(7)
+    restarted = SequenceAllocator(path)
+    assert restarted.last_value == 6
+    assert not restarted.seeded
+
+
+def test_broken_state_file_starts_from_zero(tmp_path):
+    path = tmp_path / "sequence.json"
+    path.write_text("{not json", encoding="utf-8")
+    assert SequenceAllocator(str(path)).last_value == 0
+
+
+def test_next_sequence_number_from_sheet():
+    worksheet = FakeWorksheet(FakeSheetsBackend(), "Простои", [["№"], ["1"], ["2"], ["5"]])
+    assert get_next_sequence_number(worksheet) == 6
+
+
+def test_next_sequence_number_is_none_on_api_error():
+    worksheet = FakeWorksheet(FakeSheetsBackend(error_rate=1.0), "Простои", [["№"], ["1"]])
+    assert get_next_sequence_number(worksheet) is None
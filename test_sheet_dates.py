@@ -0,0 +1,81 @@
+# tests/test_sheet_dates.py
+from datetime import datetime
+
+import pytest
+from pytz import timezone
+
+from utils.sheet_dates import SheetDatetimeParser, SHEET_DATETIME_FORMATS
+
+# Переход на летнее/зимнее время есть в Берлине, но не в Москве — проверяем по нему
+TZ = timezone("Europe/Berlin")
+
+SAMPLES = [
+    "2024-01-05 10:00:00",
+    "05.01.2024 10:00:00",
+    "2024/01/05 10:00:00",
+    "2024-1-5 10:00:00",      # Без ведущих нулей — только через strptime
+    "2024-03-31 02:30:00",    # Несуществующий час (переход на летнее время)
+    "2024-10-27 02:30:00",    # Повторяющийся час (переход на зимнее время)
+    "2024-10-27 01:59:59",
+    "2024-10-27 03:00:00",
+    "2024-02-29 23:59:59",
+    "2023-02-29 10:00:00",    # Несуществующая дата
+    "2024-01-05 10:00:00 ",
+    "2024-01-0510:00:00",
+    "2024-01/05 10:00:00",
+    "+024-01-05 10:00:00",
+    " 024-01-05 10:00:00",
+    "2024-01-05 1 :00:00",
+    "2024-01-05 10:-0:00",
+    "+1.01.2024 10:00:00",
+    "2024-01-05 24:00:00",
+    "",
+    "bad",
+]
+
+
+def baseline_parse(dt_string: str, tz=None):
+    """Разбор до оптимизации: перебор форматов strptime и tz.localize для каждой строки."""
+    for fmt in SHEET_DATETIME_FORMATS:
+        try:
+            result = datetime.strptime(dt_string, fmt)
+        except ValueError:
+            continue
+        return tz.localize(result) if tz else result
+    return None
+
+
+def same(a, b) -> bool:
+    return a == b and (a is None or (a.replace(tzinfo=None) == b.replace(tzinfo=None) and a.utcoffset() == b.utcoffset()))
+
+
+@pytest.mark.parametrize("dt_string", SAMPLES)
+def test_matches_baseline_with_timezone(dt_string):
+    assert same(SheetDatetimeParser(TZ).parse(dt_string), baseline_parse(dt_string, TZ))
+
+
+@pytest.mark.parametrize("dt_string", SAMPLES)
+def test_matches_baseline_without_timezone(dt_string):
+    assert same(SheetDatetimeParser().parse(dt_string), baseline_parse(dt_string))
+
+
+def test_shared_parser_matches_baseline_in_any_order():
+    # Кэш и запомненный формат не должны влиять на результат
+    parser = SheetDatetimeParser(TZ)
+    for dt_string in SAMPLES + SAMPLES[::-1]:
+        assert same(parser.parse(dt_string), baseline_parse(dt_string, TZ)), dt_string
+
+
+def test_every_hour_across_dst_day():
+    parser = SheetDatetimeParser(TZ)
+    for day in ("2024-03-31", "2024-10-27"):
+        for hour in range(24):
+            dt_string = f"{day} {hour:02d}:15:00"
+            assert same(parser.parse(dt_string), baseline_parse(dt_string, TZ)), dt_string
+
+
+def test_cache_is_bounded():
+    parser = SheetDatetimeParser(cache_size=2)
+    for second in range(5):
+        parser.parse(f"2024-01-05 10:00:0{second}")
+    assert len(parser._cache) <= 2
@@ -0,0 +1,51 @@
+# tests/test_state_db.py
+import pytest
+
+from utils.state_db import ActiveDowntimes, PendingRequests, StateDB
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "state.sqlite3")
+
+
+def test_pending_requests_survive_restart(db_path):
+    db = StateDB(db_path)
+    requests = PendingRequests(db)
+    requests["r1"] = {"status": "pending", "creation_time": "2025-06-01T08:00:00", "site": "П1"}
+    requests["r2"] = {"status": "accepted", "creation_time": "2025-06-01T07:00:00"}
+    requests["r1"]["status"] = "accepted"
+    requests.save("r1")
+    del requests["r2"]
+    db.close()
+
+    restored = PendingRequests(StateDB(db_path))
+    assert dict(restored) == {"r1": {"status": "accepted", "creation_time": "2025-06-01T08:00:00", "site": "П1"}}
+
+
+def test_ids_by_status_in_creation_order(db_path):
+    requests = PendingRequests(StateDB(db_path))
+    requests["late"] = {"status": "pending", "creation_time": "2025-06-01T09:00:00"}
+    requests["early"] = {"status": "pending", "creation_time": "2025-06-01T08:00:00"}
+    requests["done"] = {"status": "accepted", "creation_time": "2025-06-01T07:00:00"}
+    assert requests.ids_by_status("pending") == ["early", "late"]
+
+
+def test_in_place_change_without_save_is_not_persisted(db_path):
+    db = StateDB(db_path)
+    requests = PendingRequests(db)
+    requests["r1"] = {"status": "pending", "creation_time": "2025-06-01T08:00:00"}
+    requests["r1"]["status"] = "accepted"
+    assert PendingRequests(db)["r1"]["status"] == "pending"
+
+
+def test_active_downtimes_survive_restart(db_path):
+    db = StateDB(db_path)
+    downtimes = ActiveDowntimes(db)
+    downtimes[("П1", "Линия 1")] = "Механика"
+    downtimes[("П1", "Линия 2")] = "Электрика"
+    downtimes[("П1", "Линия 1")] = "Сырье"
+    del downtimes[("П1", "Линия 2")]
+    db.close()
+
+    assert dict(ActiveDowntimes(StateDB(db_path))) == {("П1", "Линия 1"): "Сырье"}
@@ -0,0 +1,196 @@
+# tests/test_storage.py
+import asyncio
+import time
+
+import pytest
+
+from benchmarks.fakes import FakeSheetsBackend, FakeSheetsClient
+from config import (DOWNTIME_WORKSHEET_NAME, GROUP_ID_COLUMN, GROUP_NAME_COLUMN, RESPONSIBLE_GROUPS_WORKSHEET_NAME,
+                    SEQUENCE_COLUMN, SHEET_HEADERS, USER_ID_COLUMN, USER_ROLE_COLUMN, USER_ROLES_WORKSHEET_NAME)
+import utils.storage
+from utils.downtime_store import DowntimeStore
+from utils.storage import DataStorage
+
+
+def sheet_row(number: int) -> list:
+    values = {SEQUENCE_COLUMN: str(number), "Timestamp_записи": f"2025-06-01 10:{number % 60:02d}:00",
+              "Время_простоя_минут": "5"}
+    return [values.get(header, "") for header in SHEET_HEADERS]
+
+
+def make_client(numbers=range(1, 6)) -> FakeSheetsClient:
+    client = FakeSheetsClient(FakeSheetsBackend())
+    spreadsheet = client.open_by_key("test")
+    spreadsheet.add_sheet(DOWNTIME_WORKSHEET_NAME, [SHEET_HEADERS] + [sheet_row(n) for n in numbers])
+    spreadsheet.add_sheet(USER_ROLES_WORKSHEET_NAME, [[USER_ID_COLUMN, USER_ROLE_COLUMN], ["1", "Админ"]])
+    spreadsheet.add_sheet(RESPONSIBLE_GROUPS_WORKSHEET_NAME, [[GROUP_NAME_COLUMN, GROUP_ID_COLUMN], ["КИП", "-100"]])
+    return client
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    # Пути хранилищ в config относительные (data/...), поэтому каждый тест работает в своем каталоге
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def cached_numbers(storage: DataStorage) -> list:
+    return [row[0] for row in storage.downtime_cache["data_rows"]]
+
+
+def test_refresh_reads_only_new_rows(data_dir):
+    client = make_client()
+    storage = DataStorage(client)
+    asyncio.run(storage.initialize())
+    worksheet = client.spreadsheet.worksheet(DOWNTIME_WORKSHEET_NAME)
+    worksheet.rows.extend([sheet_row(6), sheet_row(7)])
+    full_reads = client.backend.calls["get_all_values"]
+    asyncio.run(storage.refresh_downtime_cache())
+    assert cached_numbers(storage) == [str(n) for n in range(1, 8)]
+    assert client.backend.calls["get_all_values"] == full_reads
+    assert len(storage.downtime_store) == 7
+
+
+def test_changed_sheet_triggers_full_reread(data_dir):
+    client = make_client()
+    storage = DataStorage(client)
+    asyncio.run(storage.initialize())
+    worksheet = client.spreadsheet.worksheet(DOWNTIME_WORKSHEET_NAME)
+    del worksheet.rows[2]
+    asyncio.run(storage.refresh_downtime_cache())
+    assert cached_numbers(storage) == ["1", "3", "4", "5"]
+    assert len(storage.downtime_store) == 4
+
+
+def test_queued_record_is_not_duplicated_after_flush(data_dir):
+    client = make_client()
+    storage = DataStorage(client)
+    asyncio.run(storage.initialize())
+    record = dict(zip(SHEET_HEADERS, sheet_row(storage.sequence.allocate())))
+    assert storage.queue_downtime_record(record)
+    assert cached_numbers(storage)[-1] == "6"
+    # Строку, внесенную вручную, и выгруженную запись кэш получает по одному разу
+    client.spreadsheet.worksheet(DOWNTIME_WORKSHEET_NAME).rows.append(sheet_row(100))
+    asyncio.run(storage.flush_write_queue(force=True))
+    asyncio.run(storage.refresh_downtime_cache())
+    assert sorted(cached_numbers(storage), key=int) == ["1", "2", "3", "4", "5", "6", "100"]
+    assert len(storage.downtime_store) == 7
+
+
+def test_record_added_during_rebuild_is_kept(data_dir, monkeypatch):
+    client = make_client()
+    storage = DataStorage(client)
+    asyncio.run(storage.initialize())
+    record = dict(zip(SHEET_HEADERS, sheet_row(storage.sequence.allocate())))
+    build = DowntimeStore.from_rows
+
+    def slow_build(headers, rows):
+        time.sleep(0.1)
+        return build(headers, rows)
+
+    monkeypatch.setattr(DowntimeStore, "from_rows", slow_build)
+
+    async def scenario():
+        refresh = asyncio.ensure_future(storage.refresh_downtime_cache(full=True))
+        await asyncio.sleep(0.02)
+        # Сборка хранилища идет в пуле потоков, event loop в это время принимает новые записи
+        assert storage.queue_downtime_record(record)
+        await refresh
+
+    asyncio.run(scenario())
+    assert cached_numbers(storage).count("6") == 1
+    assert len(storage.downtime_store) == 6
+
+
+def test_record_added_during_overlapping_rebuilds_is_kept(data_dir, monkeypatch):
+    client = make_client()
+    storage = DataStorage(client)
+    asyncio.run(storage.initialize())
+    record = dict(zip(SHEET_HEADERS, sheet_row(storage.sequence.allocate())))
+    build = DowntimeStore.from_rows
+
+    def slow_build(headers, rows):
+        time.sleep(0.1)
+        return build(headers, rows)
+
+    monkeypatch.setattr(DowntimeStore, "from_rows", slow_build)
+
+    async def scenario():
+        # Полное обновление по расписанию и перечитывание после расхождения пересекаются
+        first = asyncio.ensure_future(storage.refresh_downtime_cache(full=True))
+        await asyncio.sleep(0.02)
+        second = asyncio.ensure_future(storage.refresh_downtime_cache(full=True))
+        await asyncio.sleep(0.02)
+        assert storage.queue_downtime_record(record)
+        await asyncio.gather(first, second)
+
+    asyncio.run(scenario())
+    assert storage.downtime_cache["error"] is None
+    assert cached_numbers(storage).count("6") == 1
+    assert len(storage.downtime_store) == 6
+
+
+def test_unseeded_sequence_is_reseeded_before_save(data_dir, monkeypatch):
+    client = make_client()
+    get_next_sequence_number = utils.storage.get_next_sequence_number
+    # Чтение листа простоев при старте не удалось: номер нельзя выдавать, пока счетчик не сверен с таблицей
+    monkeypatch.setattr(utils.storage, "fetch_sheets_values", lambda spreadsheet, names: None)
+    monkeypatch.setattr(utils.storage, "fetch_all_rows", lambda worksheet: None)
+    monkeypatch.setattr(utils.storage, "get_next_sequence_number", lambda worksheet: None)
+    storage = DataStorage(client)
+    asyncio.run(storage.initialize())
+    assert not storage.sequence.seeded
+    assert asyncio.run(storage.allocate_sequence_number()) is None
+    assert not storage.queue_downtime_record(dict(zip(SHEET_HEADERS, sheet_row(1))))
+    assert storage.write_queue.pending == []
+
+    monkeypatch.setattr(utils.storage, "get_next_sequence_number", get_next_sequence_number)
+    assert asyncio.run(storage.allocate_sequence_number()) == 6
+
+
+def test_unchanged_reference_sheets_are_not_rebuilt(data_dir, monkeypatch):
+    client = make_client()
+    storage = DataStorage(client)
+    asyncio.run(storage.initialize())
+    version = storage.groups_version
+    parsed = []
+    for name in ("parse_user_roles", "parse_responsible_groups"):
+        parse = getattr(utils.storage, name)
+        monkeypatch.setattr(utils.storage, name, lambda values, parse=parse, name=name: parsed.append(name) or parse(values))
+
+    asyncio.run(storage.reload_reference_data())
+    assert parsed == [] and storage.groups_version == version
+
+    groups = client.spreadsheet.worksheet(RESPONSIBLE_GROUPS_WORKSHEET_NAME)
+    groups.rows.append(["Электрики", "-200"])
+    asyncio.run(storage.reload_reference_data())
+    assert parsed == ["parse_responsible_groups"]
+    assert storage.groups_version == version + 1
+    assert storage.group_ids == {"КИП": -100, "Электрики": -200}
+
+
+def test_startup_reads_all_sheets_with_one_batch_get(data_dir):
+    client = make_client()
+    storage = DataStorage(client)
+    asyncio.run(storage.initialize())
+    assert client.backend.calls["values_batch_get"] == 1
+    assert client.backend.calls["get_all_values"] == 0 and client.backend.calls["col_values"] == 0
+    assert cached_numbers(storage) == ["1", "2", "3", "4", "5"]
+    assert storage.user_roles == {"1": "Админ"} and storage.group_ids == {"КИП": -100}
+    assert storage.sequence.allocate() == 6
+
+
+def test_startup_falls_back_to_per_sheet_reads(data_dir, monkeypatch):
+    client = make_client()
+    spreadsheet = client.spreadsheet
+    batch_get = spreadsheet.values_batch_get
+    # Ответ без диапазонов fetch_sheets_values считает ошибкой
+    monkeypatch.setattr(spreadsheet, "values_batch_get", lambda ranges: batch_get(ranges[:0]))
+    storage = DataStorage(client)
+    asyncio.run(storage.initialize())
+    assert client.backend.calls["values_batch_get"] == 1
+    # Роли, группы и простои читаются по отдельности, счетчик засевается по столбцу A
+    assert client.backend.calls["get_all_values"] == 3 and client.backend.calls["col_values"] == 1
+    assert cached_numbers(storage) == ["1", "2", "3", "4", "5"]
+    assert storage.user_roles == {"1": "Админ"} and storage.group_ids == {"КИП": -100}
+    assert storage.sequence.allocate() == 6
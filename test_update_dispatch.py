@@ -0,0 +1,64 @@
+# tests/test_update_dispatch.py
+import asyncio
+
+from aiogram import Bot, types
+
+from utils.update_dispatch import ChatOrderedDispatcher, HandlerLatencyMiddleware, update_chat_id
+
+
+def message_update(update_id: int, chat_id: int) -> types.Update:
+    return types.Update.to_object({
+        "update_id": update_id,
+        "message": {"message_id": update_id, "date": 0, "text": "x",
+                    "chat": {"id": chat_id, "type": "private"}, "from": {"id": chat_id, "is_bot": False, "first_name": "u"}},
+    })
+
+
+def run_updates(updates, max_concurrency: int = 4, delay: float = 0.02):
+    async def scenario():
+        dispatcher = ChatOrderedDispatcher(Bot("123456:TEST"), max_concurrency=max_concurrency)
+        events = []
+        running = [0, 0]  # сейчас, максимум
+
+        async def process(update):
+            running[0] += 1
+            running[1] = max(running[1], running[0])
+            events.append(("start", update.update_id))
+            await asyncio.sleep(delay)
+            events.append(("end", update.update_id))
+            running[0] -= 1
+
+        await asyncio.gather(*(dispatcher.run_in_chat_order(update, lambda u=update: process(u)) for update in updates))
+        return dispatcher, events, running[1]
+
+    return asyncio.run(scenario())
+
+
+def test_update_chat_id():
+    assert update_chat_id(message_update(1, 42)) == 42
+    assert update_chat_id(types.Update.to_object({"update_id": 2})) is None
+
+
+def test_same_chat_is_processed_in_order():
+    dispatcher, events, _ = run_updates([message_update(i, 1) for i in range(5)])
+    assert events == [(kind, i) for i in range(5) for kind in ("start", "end")]
+    assert dispatcher.update_metrics()["processed_total"] == 5
+
+
+def test_different_chats_run_concurrently_within_limit():
+    dispatcher, _, max_running = run_updates([message_update(i, i) for i in range(10)], max_concurrency=3)
+    assert max_running == 3
+    metrics = dispatcher.update_metrics()
+    assert metrics["backlog"] == 0 and metrics["in_progress"] == 0 and metrics["chats_in_queue"] == 0
+
+
+def test_lambda_handlers_get_distinct_labels():
+    first = lambda message: None  # noqa: E731
+    second = lambda message: None  # noqa: E731
+
+    async def named_handler(message):
+        pass
+
+    labels = {HandlerLatencyMiddleware._handler_label(handler) for handler in (first, second)}
+    assert len(labels) == 2 and all(label.startswith(f"{__name__}:") for label in labels)
+    assert HandlerLatencyMiddleware._handler_label(named_handler) == "named_handler"
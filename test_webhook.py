@@ -0,0 +1,90 @@
+# tests/test_webhook.py
+import asyncio
+
+from aiogram import Bot, Dispatcher, types
+from aiogram.dispatcher.webhook import BOT_DISPATCHER_KEY
+from aiohttp.test_utils import TestClient, TestServer
+
+from utils.webhook import IN_FLIGHT_KEY, SECRET_TOKEN_HEADER, create_webhook_app
+
+PATH = "/telegram/webhook"
+SECRET = "secret-token"
+
+
+def message_update(update_id: int) -> dict:
+    return {"update_id": update_id,
+            "message": {"message_id": update_id, "date": 0, "text": "x",
+                        "chat": {"id": 1, "type": "private"}, "from": {"id": 1, "is_bot": False, "first_name": "u"}}}
+
+
+def run_webhook(scenario):
+    """Запускает сценарий с тестовым клиентом вебхука; обработчик сообщений ждет события release."""
+    async def run():
+        dp = Dispatcher(Bot("123456:TEST"))
+        release = asyncio.Event()
+        handled = []
+
+        async def handler(message: types.Message):
+            await release.wait()
+            handled.append(message.message_id)
+
+        dp.register_message_handler(handler)
+        app = create_webhook_app(dp, PATH, SECRET)
+        app[BOT_DISPATCHER_KEY] = dp
+        async with TestClient(TestServer(app)) as client:
+            return await scenario(client, dp, release, handled)
+
+    return asyncio.run(run())
+
+
+def post(client: TestClient, update_id: int, token: str = SECRET):
+    return client.post(PATH, json=message_update(update_id), headers={SECRET_TOKEN_HEADER: token})
+
+
+def test_wrong_or_missing_token_is_rejected():
+    async def scenario(client, dp, release, handled):
+        release.set()
+        wrong = await post(client, 1, token="wrong")
+        missing = await client.post(PATH, json=message_update(2))
+        return wrong.status, missing.status, handled
+
+    assert run_webhook(scenario) == (401, 401, [])
+
+
+def test_update_with_token_is_processed():
+    async def scenario(client, dp, release, handled):
+        release.set()
+        response = await post(client, 1)
+        return response.status, await response.text(), handled, dp[IN_FLIGHT_KEY].in_flight
+
+    assert run_webhook(scenario) == (200, "ok", [1], 0)
+
+
+def test_shutdown_waits_for_in_flight_and_rejects_new_updates():
+    async def scenario(client, dp, release, handled):
+        tracker = dp[IN_FLIGHT_KEY]
+        first = asyncio.ensure_future(post(client, 1))
+        while not tracker.in_flight:
+            await asyncio.sleep(0.01)
+        idle = asyncio.ensure_future(tracker.wait_idle(timeout=5))
+        await asyncio.sleep(0.01)
+        # Остановка началась: новый апдейт не принимается, Telegram повторит его после перезапуска
+        rejected = await post(client, 2)
+        assert not idle.done()
+        release.set()
+        return (await first).status, rejected.status, await idle, handled
+
+    assert run_webhook(scenario) == (200, 503, True, [1])
+
+
+def test_wait_idle_gives_up_after_timeout():
+    async def scenario(client, dp, release, handled):
+        tracker = dp[IN_FLIGHT_KEY]
+        first = asyncio.ensure_future(post(client, 1))
+        while not tracker.in_flight:
+            await asyncio.sleep(0.01)
+        drained = await tracker.wait_idle(timeout=0.05)
+        release.set()
+        return drained, (await first).status
+
+    assert run_webhook(scenario) == (False, 200)
@@ -0,0 +1,102 @@
+# tests/test_write_queue.py
+import asyncio
+
+import pytest
+import requests
+
+from benchmarks.fakes import FakeSheetsBackend, FakeWorksheet
+from config import SEQUENCE_COLUMN, SHEET_HEADERS
+from g_sheets.gateway import SheetsGateway
+from utils.write_queue import DowntimeWriteQueue
+
+
+class TimeoutAfterWriteWorksheet(FakeWorksheet):
+    """append_rows доходит до таблицы, но ответ теряется (таймаут) — один раз."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.timeouts_left = 1
+
+    def append_rows(self, values, value_input_option=None):
+        result = super().append_rows(values, value_input_option)
+        if self.timeouts_left:
+            self.timeouts_left -= 1
+            raise requests.Timeout("read timeout")
+        return result
+
+
+@pytest.fixture
+def sheets():
+    gateway = SheetsGateway()
+    yield gateway
+    gateway.shutdown()
+
+
+def record(number: int) -> dict:
+    return {SEQUENCE_COLUMN: str(number), "Причина_простоя_описание": f"причина {number}"}
+
+
+def sheet_numbers(worksheet: FakeWorksheet) -> list:
+    return [row[0] for row in worksheet.rows[1:]]
+
+
+def test_journal_survives_restart(tmp_path):
+    path = str(tmp_path / "queue.jsonl")
+    queue = DowntimeWriteQueue(path)
+    assert not queue.uncertain
+    assert queue.enqueue(record(1)) and queue.enqueue(record(2))
+    restored = DowntimeWriteQueue(path)
+    assert restored.pending == [record(1), record(2)]
+    assert restored.uncertain
+
+
+def test_truncated_journal_line_is_skipped(tmp_path):
+    path = tmp_path / "queue.jsonl"
+    path.write_text('{"Порядковый номер заявки": "1"}\n{"Порядковый', encoding="utf-8")
+    assert DowntimeWriteQueue(str(path)).pending == [{SEQUENCE_COLUMN: "1"}]
+
+
+def test_flush_appends_and_clears_journal(tmp_path, sheets):
+    path = str(tmp_path / "queue.jsonl")
+    worksheet = FakeWorksheet(FakeSheetsBackend(), "Простои", [SHEET_HEADERS])
+    queue = DowntimeWriteQueue(path)
+    for number in (1, 2, 3):
+        queue.enqueue(record(number))
+    assert asyncio.run(queue.flush(sheets, worksheet)) == 3
+    assert sheet_numbers(worksheet) == ["1", "2", "3"]
+    assert DowntimeWriteQueue(path).pending == []
+
+
+def test_retry_after_timeout_does_not_duplicate(tmp_path, sheets):
+    worksheet = TimeoutAfterWriteWorksheet(FakeSheetsBackend(), "Простои", [SHEET_HEADERS])
+    queue = DowntimeWriteQueue(str(tmp_path / "queue.jsonl"))
+    for number in (1, 2):
+        queue.enqueue(record(number))
+    assert asyncio.run(queue.flush(sheets, worksheet)) == 0
+    assert queue.uncertain and len(queue.pending) == 2
+    queue.enqueue(record(3))
+    assert asyncio.run(queue.flush(sheets, worksheet, force=True)) == 1
+    assert sheet_numbers(worksheet) == ["1", "2", "3"]
+    assert queue.pending == []
+
+
+def test_replayed_journal_skips_rows_already_in_sheet(tmp_path, sheets):
+    path = str(tmp_path / "queue.jsonl")
+    queue = DowntimeWriteQueue(path)
+    for number in (4, 5, 6):
+        queue.enqueue(record(number))
+    # Бот остановился после append_rows, но до перезаписи журнала
+    worksheet = FakeWorksheet(FakeSheetsBackend(), "Простои", [SHEET_HEADERS, ["4"], ["5"]])
+    restored = DowntimeWriteQueue(path)
+    assert asyncio.run(restored.flush(sheets, worksheet)) == 1
+    assert sheet_numbers(worksheet) == ["4", "5", "6"]
+
+
+def test_failed_sheet_check_keeps_records(tmp_path, sheets):
+    path = str(tmp_path / "queue.jsonl")
+    DowntimeWriteQueue(path).enqueue(record(1))
+    worksheet = FakeWorksheet(FakeSheetsBackend(error_rate=1.0), "Простои", [SHEET_HEADERS])
+    restored = DowntimeWriteQueue(path)
+    assert asyncio.run(restored.flush(sheets, worksheet)) == 0
+    assert restored.pending == [record(1)] and restored.uncertain
+    assert restored.failures == 1
@@ -0,0 +1,162 @@
+# utils/update_dispatch.py
+import asyncio
+import functools
+import time
+from typing import Any, Dict, Optional
+
+from aiogram import Dispatcher, types
+from aiogram.dispatcher.handler import Handler, current_handler
+from aiogram.dispatcher.middlewares import BaseMiddleware
+
+from utils.metrics import HANDLER_SECONDS
+from config import UPDATE_WORKERS
+
+
+def update_chat_id(update: types.Update) -> Optional[int]:
+    """Чат, к которому относится апдейт (для нажатий кнопок — чат сообщения с кнопкой)."""
+    message = update.message or update.edited_message or update.channel_post or update.edited_channel_post
+    if message:
+        return message.chat.id
+    if update.callback_query:
+        if update.callback_query.message:
+            return update.callback_query.message.chat.id
+        return update.callback_query.from_user.id
+    if update.my_chat_member:
+        return update.my_chat_member.chat.id
+    return None
+
+
+class HandlerLatencyMiddleware(BaseMiddleware):
+    """
+    Замеряет время работы каждого обработчика сообщений и нажатий кнопок
+    (все, что зарегистрировано в register_*_handlers) в гистограмму bot_handler_seconds.
+    """
+
+    @staticmethod
+    def _handler_label(handler) -> str:
+        name = getattr(handler, "__name__", repr(handler))
+        code = getattr(handler, "__code__", None)
+        if name == "<lambda>" and code:
+            # Безымянные обработчики различаем по месту регистрации, иначе все они сольются в одну серию
+            return f"{handler.__module__}:{code.co_firstlineno}"
+        return name
+
+    @classmethod
+    def _start(cls, data: dict):
+        data["_handler_name"] = cls._handler_label(current_handler.get())
+        data["_handler_started"] = time.monotonic()
+
+    @staticmethod
+    def _finish(data: dict):
+        name = data.get("_handler_name")
+        if name is None:
+            return  # Ни один обработчик не подошел
+        HANDLER_SECONDS.observe(name, time.monotonic() - data["_handler_started"])
+
+    async def on_process_message(self, message: types.Message, data: dict):
+        self._start(data)
+
+    async def on_post_process_message(self, message: types.Message, results: list, data: dict):
+        self._finish(data)
+
+    async def on_process_callback_query(self, call: types.CallbackQuery, data: dict):
+        self._start(data)
+
+    async def on_post_process_callback_query(self, call: types.CallbackQuery, results: list, data: dict):
+        self._finish(data)
+
+
+class _OrderedUpdatesHandler(Handler):
+    """Обработчик апдейтов, пропускающий каждый апдейт через очередь его чата."""
+
+    async def notify(self, update: types.Update):
+        return await self.dispatcher.run_in_chat_order(update, functools.partial(super().notify, update))
+
+
+class ChatOrderedDispatcher(Dispatcher):
+    """
+    Dispatcher, который обрабатывает апдейты разных чатов параллельно, но не больше max_concurrency
+    одновременно, а апдейты одного чата — строго по очереди поступления.
+    Так медленный обработчик (например, запись в таблицу) не задерживает другие чаты,
+    а переходы FSM внутри одного чата не перемешиваются.
+    Работает и при long polling, и с вебхуком: оба пути вызывают updates_handler.notify.
+    """
+
+    def __init__(self, *args, max_concurrency: int = UPDATE_WORKERS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.updates_handler = _OrderedUpdatesHandler(self, middleware_key='update')
+        self.updates_handler.register(self.process_update)
+
+        self.max_concurrency = max_concurrency
+        self._slots = asyncio.Semaphore(max_concurrency)
+        # Блокировка чата живет, пока у чата есть апдейты в работе или в очереди
+        self._chat_locks: Dict[int, asyncio.Lock] = {}
+        self._chat_pending: Dict[int, int] = {}
+
+        # Метрики
+        self.backlog = 0            # Апдейты, ждущие своей очереди в чате или свободного слота
+        self.max_backlog = 0
+        self.in_progress = 0
+        self.processed_total = 0
+        self.update_latency_total_seconds = 0.0  # От получения апдейта до конца обработки
+        self.update_latency_max_seconds = 0.0
+        self.middleware.setup(HandlerLatencyMiddleware())
+
+    async def run_in_chat_order(self, update: types.Update, process) -> Any:
+        """
+        Выполняет process() в очереди чата апдейта. До захвата блокировки нет ни одного await,
+        поэтому очередь повторяет порядок, в котором апдейты были переданы диспетчеру.
+        """
+        received = time.monotonic()
+        chat_id = update_chat_id(update)
+        self.backlog += 1
+        self.max_backlog = max(self.max_backlog, self.backlog)
+        lock = None
+        if chat_id is not None:
+            lock = self._chat_locks.get(chat_id)
+            if lock is None:
+                lock = self._chat_locks[chat_id] = asyncio.Lock()
+            self._chat_pending[chat_id] = self._chat_pending.get(chat_id, 0) + 1
+        waiting = True
+        try:
+            if lock:
+                await lock.acquire()
+            try:
+                # Слот пула берется только когда подошла очередь чата
+                async with self._slots:
+                    waiting = False
+                    self.backlog -= 1
+                    self.in_progress += 1
+                    try:
+                        return await process()
+                    finally:
+                        self.in_progress -= 1
+            finally:
+                if lock:
+                    lock.release()
+        finally:
+            if waiting:
+                self.backlog -= 1  # Отменен, не дождавшись очереди
+            latency = time.monotonic() - received
+            self.processed_total += 1
+            self.update_latency_total_seconds += latency
+            self.update_latency_max_seconds = max(self.update_latency_max_seconds, latency)
+            if chat_id is not None:
+                self._chat_pending[chat_id] -= 1
+                if not self._chat_pending[chat_id]:
+                    del self._chat_pending[chat_id]
+                    del self._chat_locks[chat_id]
+
+    def update_metrics(self) -> dict:
+        """Глубина очереди, загрузка пула и задержка апдейтов (по обработчикам — в HANDLER_SECONDS)."""
+        return {
+            "backlog": self.backlog,
+            "max_backlog": self.max_backlog,
+            "in_progress": self.in_progress,
+            "max_concurrency": self.max_concurrency,
+            "chats_in_queue": len(self._chat_pending),
+            "processed_total": self.processed_total,
+            "avg_update_latency_seconds": (self.update_latency_total_seconds / self.processed_total
+                                           if self.processed_total else 0.0),
+            "max_update_latency_seconds": self.update_latency_max_seconds,
+        }
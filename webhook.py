@@ -0,0 +1,84 @@
+# utils/webhook.py
+import asyncio
+import hmac
+import logging
+import secrets
+
+from aiogram import Dispatcher
+from aiogram.dispatcher.webhook import WebhookRequestHandler
+from aiohttp import web
+
+SECRET_TOKEN_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+WEBHOOK_SECRET_KEY = "WEBHOOK_SECRET_TOKEN"
+IN_FLIGHT_KEY = "in_flight"
+
+
+class InFlightTracker:
+    """
+    Счетчик апдейтов, которые сейчас обрабатываются.
+    При остановке бота wait_idle() дожидается их завершения, а новые апдейты
+    после начала остановки отклоняются — Telegram доставит их повторно после перезапуска.
+    """
+
+    def __init__(self):
+        self.in_flight = 0
+        self.closing = False
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    def __enter__(self):
+        self.in_flight += 1
+        self._idle.clear()
+        return self
+
+    def __exit__(self, *exc):
+        self.in_flight -= 1
+        if not self.in_flight:
+            self._idle.set()
+
+    async def wait_idle(self, timeout: float) -> bool:
+        """Запрещает прием новых апдейтов и ждет текущие. Возвращает False, если не дождались."""
+        self.closing = True
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            logging.warning(f"[WEBHOOK] За {timeout} с не завершились апдейты: {self.in_flight}.")
+            return False
+
+
+class SecretTokenRequestHandler(WebhookRequestHandler):
+    """
+    Обработчик вебхука: принимает только запросы с секретным токеном,
+    заданным при setWebhook, и учитывает апдейты в InFlightTracker.
+    """
+
+    async def post(self):
+        expected = self.request.app[WEBHOOK_SECRET_KEY].encode()
+        received = self.request.headers.get(SECRET_TOKEN_HEADER, "").encode()
+        if not hmac.compare_digest(received, expected):
+            logging.warning(f"[WEBHOOK] Запрос без верного секретного токена от {self.request.remote}.")
+            raise web.HTTPUnauthorized()
+
+        tracker: InFlightTracker = self.request.app[IN_FLIGHT_KEY]
+        if tracker.closing:
+            # Не 200: Telegram оставит апдейт в очереди и повторит его после перезапуска
+            raise web.HTTPServiceUnavailable()
+        with tracker:
+            return await super().post()
+
+
+def create_webhook_app(dp: Dispatcher, path: str, secret_token: str) -> web.Application:
+    """Создает aiohttp-приложение с маршрутом вебхука; трекер апдейтов доступен как dp['in_flight']."""
+    app = web.Application()
+    tracker = InFlightTracker()
+    app[WEBHOOK_SECRET_KEY] = secret_token
+    app[IN_FLIGHT_KEY] = tracker
+    dp[IN_FLIGHT_KEY] = tracker
+    app.router.add_route("*", path, SecretTokenRequestHandler, name="webhook_handler")
+    return app
+
+
+def generate_secret_token() -> str:
+    """Случайный токен из символов, допустимых для secret_token в setWebhook (A-Z, a-z, 0-9, _ и -)."""
+    return secrets.token_urlsafe(32)
@@ -0,0 +1,181 @@
+# utils/write_queue.py
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+import gspread
+
+from g_sheets.api import append_downtime_records, fetch_sequence_numbers
+from g_sheets.gateway import SheetsGateway
+from utils.local_store import LocalStore
+from config import (SEQUENCE_COLUMN, WRITE_QUEUE_JOURNAL_PATH, WRITE_QUEUE_BATCH_SIZE,
+                    WRITE_QUEUE_FLUSH_INTERVAL_SECONDS, WRITE_QUEUE_MAX_BACKOFF_SECONDS)
+
+
+class DowntimeWriteQueue:
+    """
+    Очередь отложенной записи простоев в Google Таблицу.
+    Запись сначала попадает в журнал на диске, а в таблицу уходит пачкой через append_rows.
+    Журнал переживает перезапуск бота: неотправленные записи дозаписываются после старта.
+    Неудачная отправка (особенно таймаут) могла все же дойти до таблицы, поэтому перед
+    повторной отправкой порядковые номера сверяются с листом и уже записанные строки не дублируются.
+    """
+
+    def __init__(self, path: str = WRITE_QUEUE_JOURNAL_PATH):
+        self.path = path
+        self.pending: List[Dict[str, Any]] = self._load()
+        self.failures = 0
+        self.next_attempt_at = 0.0
+        self._lock = asyncio.Lock()
+        # Результат последней отправки неизвестен: записи из журнала после перезапуска тоже могли уже дойти
+        self.uncertain = bool(self.pending)
+        if self.pending:
+            logging.warning(f"[QUEUE] Из журнала восстановлено {len(self.pending)} неотправленных записей.")
+
+    def _load(self) -> List[Dict[str, Any]]:
+        records = []
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        # Обрезанная последняя строка после аварийной остановки
+                        logging.error(f"[QUEUE] Пропущена поврежденная строка журнала: {line[:100]}")
+        except FileNotFoundError:
+            pass
+        return records
+
+    def _rewrite(self):
+        """Перезаписывает журнал оставшимися записями."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for record in self.pending:
+                f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def enqueue(self, record_data: Dict[str, Any]) -> bool:
+        """Сохраняет запись в журнал. Возвращает False, если запись на диск не удалась."""
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record_data, ensure_ascii=False, default=str) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+        except OSError as e:
+            logging.error(f"[QUEUE] Не удалось записать простой в журнал: {e}")
+            return False
+        self.pending.append(record_data)
+        return True
+
+    def _sent(self, count: int):
+        """Убирает из очереди count первых записей, уже записанных в таблицу."""
+        del self.pending[:count]
+        self._rewrite()
+
+    def is_due(self, sheets: SheetsGateway, force: bool = False) -> bool:
+        """Есть ли что отправлять и не действует ли задержка после ошибки или пауза запросов."""
+        if not self.pending or (not force and time.monotonic() < self.next_attempt_at):
+            return False
+        # Пауза после 429/5xx: записи ждут в журнале, неудачной попыткой это не считается
+        return not sheets.breaker.is_open()
+
+    async def flush(self, sheets: SheetsGateway, worksheet: Optional[gspread.Worksheet], force: bool = False) -> int:
+        """
+        Отправляет накопленные записи пачками. После ошибки (в том числе если лист
+        так и не открылся, worksheet=None) следующая попытка откладывается
+        с экспоненциальной задержкой (force=True игнорирует задержку).
+        Возвращает количество записанных строк.
+        """
+        if not self.is_due(sheets, force):
+            return 0
+        if worksheet is None:
+            self._failed(len(self.pending))
+            return 0
+
+        written = 0
+        async with self._lock:
+            if self.uncertain and not await self._drop_already_written(sheets, worksheet):
+                self._failed(len(self.pending))
+                return 0
+            while self.pending:
+                batch = self.pending[:WRITE_QUEUE_BATCH_SIZE]
+                if not await sheets.call(append_downtime_records, worksheet, batch, default=False):
+                    self.uncertain = True
+                    self._failed(len(batch))
+                    break
+                self._sent(len(batch))
+                written += len(batch)
+                self.failures = 0
+                self.next_attempt_at = 0.0
+        return written
+
+    def _failed(self, count: int):
+        self.failures += 1
+        delay = min(WRITE_QUEUE_MAX_BACKOFF_SECONDS, WRITE_QUEUE_FLUSH_INTERVAL_SECONDS * 2 ** (self.failures - 1))
+        self.next_attempt_at = time.monotonic() + delay
+        logging.error(f"[QUEUE] Не удалось записать {count} простоев (попытка {self.failures}). "
+                      f"Повтор через {delay} с, в очереди {len(self.pending)}.")
+
+    async def _drop_already_written(self, sheets: SheetsGateway, worksheet: gspread.Worksheet) -> bool:
+        """
+        Убирает из начала очереди записи, чьи порядковые номера уже есть в листе
+        (append_rows выполняется целиком, поэтому дошедшие записи всегда идут первыми).
+        Возвращает False, если лист прочитать не удалось.
+        """
+        present = await sheets.call(fetch_sequence_numbers, worksheet)
+        if present is None:
+            return False
+        count = 0
+        for record_data in self.pending:
+            if str(record_data.get(SEQUENCE_COLUMN, "")).strip() not in present:
+                break
+            count += 1
+        if count:
+            logging.warning(f"[QUEUE] Записи уже были в таблице после неудачной отправки: {count}, повторно не отправляются.")
+            self._sent(count)
+        self.uncertain = False
+        return True
+
+
+class LocalStoreWriteQueue(DowntimeWriteQueue):
+    """
+    Очередь выгрузки в Google Таблицу при локальном хранилище LocalStore.
+    Журналом служит само хранилище: запись сначала сохраняется в нем, а после
+    успешного append_rows отмечается выгруженной. Порядок и повторы — как у DowntimeWriteQueue.
+    """
+
+    def __init__(self, local_store: LocalStore, path: str = WRITE_QUEUE_JOURNAL_PATH):
+        self.local_store = local_store
+        super().__init__(path)
+        # Записи, оставшиеся в журнале после работы без локального хранилища, переносятся в хранилище
+        # одной транзакцией; если удалить журнал не успели, повторный перенос пропустит уже сохраненные номера
+        journal = super()._load()
+        if journal and self.local_store.add_records(journal):
+            os.remove(self.path)
+            self.pending = self._load()
+            # Часть записей журнала могла уже попасть в таблицу до перезапуска
+            self.uncertain = True
+            logging.warning(f"[QUEUE] Записи из журнала перенесены в локальное хранилище: {len(journal)}.")
+
+    def _load(self) -> List[Dict[str, Any]]:
+        return self.local_store.unexported_records()
+
+    def enqueue(self, record_data: Dict[str, Any]) -> bool:
+        if not self.local_store.add_record(record_data):
+            return False
+        self.pending.append(record_data)
+        return True
+
+    def _sent(self, count: int):
+        del self.pending[:count]
+        self.local_store.mark_exported(count)